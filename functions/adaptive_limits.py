@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+APEX Adaptive Limits
+Raise or lower the per-iteration circuit-breaker budget from observed progress.
+
+Every APEX_ADAPT_EVERY tool calls the metrics hook runs `update`, which
+compares the state with the snapshot taken at the previous update:
+
+- indicator flips: completion indicators (the ones exit_gate reads) that
+  turned true, minus any that turned back to false
+- new files touched: files edited for the first time this iteration
+- error rate: errors per tool call in the window
+
+A productive window raises the tool-call budget by one step, an
+unproductive one lowers it (and the error budget too when errors
+dominate), always within the configured bounds. The decision is written to
+circuit_breakers.adaptive.limits, and the PreToolUse hook only looks it up.
+"""
+
+import argparse
+import fcntl
+import json
+import math
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from hook_replay import MODES
+
+APEX_STATE_DIR = Path(os.environ.get("APEX_STATE_DIR", Path.home() / ".config" / "opencode" / "apex" / "state"))
+APEX_STATE = Path(os.environ.get("APEX_STATE", APEX_STATE_DIR / "apex-state.json"))
+
+STEP = 0.25              # share of the mode's base budget moved per decision
+PRODUCTIVE_ERROR_RATE = 0.25
+UNPRODUCTIVE_ERROR_RATE = 0.5
+MIN_WINDOW = 5           # calls before a window says anything
+
+
+def base_limits(mode: str) -> dict:
+    limits = MODES.get(mode, MODES["default"])
+    return {"tool_calls": limits["iteration_tools"], "errors": limits["iteration_errors"]}
+
+
+def default_bounds(base: dict) -> dict:
+    return {
+        "tool_calls": [max(1, base["tool_calls"] // 2), base["tool_calls"] * 2],
+        "errors": [max(2, base["errors"] // 2), base["errors"] * 2],
+    }
+
+
+def indicators(state: dict) -> dict:
+    """Completion indicators from the loop and the completion cycle, namespaced."""
+    flags = {}
+    for prefix, section in (("loop", state.get("loop_mode") or {}), ("cycle", state.get("completion_cycle") or {})):
+        for name, value in (section.get("completion_indicators") or {}).items():
+            flags[f"{prefix}.{name}"] = bool(value)
+    return flags
+
+
+def counters(state: dict) -> dict:
+    breakers = state.get("circuit_breakers", {})
+    return {
+        "tool_calls": breakers.get("tool_calls", {}).get("iteration_current", 0),
+        "errors": breakers.get("errors", {}).get("iteration_current", 0),
+        "files": sorted(breakers.get("same_file_edits", {}).get("files", {})),
+        "indicators": indicators(state),
+    }
+
+
+def window_signals(current: dict, snapshot: dict) -> dict:
+    """Progress since the snapshot; counters that went backwards mean a new iteration."""
+    if current["tool_calls"] < snapshot.get("tool_calls", 0):
+        snapshot = {"indicators": snapshot.get("indicators", {})}
+    snapshot = {"tool_calls": 0, "errors": 0, "files": [], "indicators": {}, **snapshot}
+    calls = current["tool_calls"] - snapshot["tool_calls"]
+    errors = max(0, current["errors"] - snapshot["errors"])
+    before = snapshot.get("indicators", {})
+    flips = sum(1 for name, value in current["indicators"].items() if value and not before.get(name, False))
+    regressions = sum(1 for name, value in current["indicators"].items() if not value and before.get(name, False))
+    new_files = len(set(current["files"]) - set(snapshot.get("files", [])))
+    return {
+        "calls": calls,
+        "errors": errors,
+        "error_rate": round(errors / calls, 3) if calls else 0.0,
+        "indicator_flips": flips - regressions,
+        "new_files": new_files,
+    }
+
+
+def decide(limits: dict, base: dict, bounds: dict, signals: dict) -> tuple[dict, str]:
+    """New limits and a verdict (raise/lower/hold) for one window."""
+    if signals["calls"] < MIN_WINDOW:
+        return dict(limits), "hold"
+    progress = signals["indicator_flips"] >= 0 and (signals["indicator_flips"] > 0 or signals["new_files"] > 0)
+    tool_step = max(1, math.ceil(base["tool_calls"] * STEP))
+    clamp = lambda value, key: max(bounds[key][0], min(bounds[key][1], value))
+    new = dict(limits)
+
+    if progress and signals["error_rate"] < PRODUCTIVE_ERROR_RATE:
+        new["tool_calls"] = clamp(limits["tool_calls"] + tool_step, "tool_calls")
+        # Errors budget drifts back to the mode's default once things work
+        if limits["errors"] < base["errors"]:
+            new["errors"] = clamp(limits["errors"] + 1, "errors")
+        verdict = "raise"
+    elif not progress or signals["error_rate"] >= UNPRODUCTIVE_ERROR_RATE:
+        new["tool_calls"] = clamp(limits["tool_calls"] - tool_step, "tool_calls")
+        if signals["error_rate"] >= UNPRODUCTIVE_ERROR_RATE:
+            new["errors"] = clamp(limits["errors"] - 1, "errors")
+        verdict = "lower"
+    else:
+        verdict = "hold"
+    return new, verdict
+
+
+def write_state(state: dict, state_path: Path):
+    tmp_path = state_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def locked_update(state_path: Path, mutate) -> dict:
+    with open(f"{state_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with open(state_path) as f:
+            state = json.load(f)
+        result = mutate(state)
+        write_state(state, state_path)
+    return result
+
+
+def enable(state_path: Path = None, tool_bounds: list[int] = None, error_bounds: list[int] = None) -> dict:
+    def mutate(state):
+        base = base_limits(state.get("mode", "default"))
+        bounds = default_bounds(base)
+        if tool_bounds:
+            bounds["tool_calls"] = sorted(tool_bounds)
+        if error_bounds:
+            bounds["errors"] = sorted(error_bounds)
+        adaptive = state.setdefault("circuit_breakers", {}).setdefault("adaptive", {})
+        adaptive.update({"enabled": True, "base": base, "bounds": bounds,
+                         "limits": adaptive.get("limits") or dict(base),
+                         "snapshot": counters(state), "history": adaptive.get("history", [])})
+        return {"success": True, "adaptive": {k: adaptive[k] for k in ("enabled", "base", "bounds", "limits")}}
+
+    return locked_update(state_path or APEX_STATE, mutate)
+
+
+def disable(state_path: Path = None) -> dict:
+    def mutate(state):
+        adaptive = state.setdefault("circuit_breakers", {}).setdefault("adaptive", {})
+        adaptive["enabled"] = False
+        return {"success": True, "enabled": False}
+
+    return locked_update(state_path or APEX_STATE, mutate)
+
+
+def update(state_path: Path = None) -> dict:
+    """One controller step: signals since the last step -> new limits in state."""
+    def mutate(state):
+        adaptive = state.get("circuit_breakers", {}).get("adaptive") or {}
+        if not adaptive.get("enabled"):
+            return {"success": True, "enabled": False}
+        base = base_limits(state.get("mode", "default"))
+        if adaptive.get("base") != base:
+            # Mode changed since enable: rebase the limits and bounds on it
+            adaptive.update({"base": base, "bounds": default_bounds(base), "limits": dict(base)})
+        current = counters(state)
+        signals = window_signals(current, adaptive.get("snapshot") or {})
+        limits, verdict = decide(adaptive.get("limits") or dict(base), base, adaptive["bounds"], signals)
+        adaptive["limits"] = limits
+        adaptive["snapshot"] = current
+        adaptive["updated_at"] = datetime.utcnow().isoformat() + "Z"
+        adaptive["history"] = (adaptive.get("history", []) + [
+            {"verdict": verdict, "tool_limit": limits["tool_calls"], "error_limit": limits["errors"], **signals}])[-20:]
+        return {"success": True, "enabled": True, "verdict": verdict, "limits": limits, "signals": signals}
+
+    return locked_update(state_path or APEX_STATE, mutate)
+
+
+def parse_bounds(spec: str) -> list[int]:
+    low, _, high = spec.partition(":")
+    return [int(low), int(high)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Adaptive Limits")
+    parser.add_argument("--state", help="apex-state.json path (default: APEX_STATE)")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    enable_parser = subparsers.add_parser("enable", help="Turn on adaptive iteration budgets")
+    enable_parser.add_argument("--tool-bounds", type=parse_bounds, help="MIN:MAX tool calls per iteration")
+    enable_parser.add_argument("--error-bounds", type=parse_bounds, help="MIN:MAX errors per iteration")
+
+    subparsers.add_parser("disable", help="Back to the fixed mode limits")
+    subparsers.add_parser("update", help="Run one controller step (the metrics hook does this)")
+    subparsers.add_parser("show", help="Current adaptive limits and recent decisions")
+
+    args = parser.parse_args()
+    state_path = Path(args.state) if args.state else APEX_STATE
+
+    if not state_path.exists():
+        print(json.dumps({"success": False, "error": f"No state at {state_path}"}, indent=2))
+        sys.exit(1)
+
+    if args.action == "enable":
+        result = enable(state_path, args.tool_bounds, args.error_bounds)
+    elif args.action == "disable":
+        result = disable(state_path)
+    elif args.action == "update":
+        result = update(state_path)
+    else:
+        with open(state_path) as f:
+            adaptive = json.load(f).get("circuit_breakers", {}).get("adaptive") or {"enabled": False}
+        adaptive.pop("snapshot", None)
+        result = {"success": True, **adaptive}
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success") else 1)
+
+
+if __name__ == "__main__":
+    main()
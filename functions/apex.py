@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+APEX CLI
+Single entry point for all APEX functions with lazily imported subcommands.
+
+    python functions/apex.py <command> [args...]
+    python functions/apex.py serve --daemon     # start the fork-server
+    python functions/apex.py stop
+    python functions/apex.py latency            # cold vs warm invocation timing
+
+When the server socket exists, invocations are forwarded to it: the server
+forks a child that already has the interpreter and imports loaded, hands it
+the caller's stdin/stdout/stderr, and returns the exit code.
+"""
+
+import os
+import sys
+
+FUNCTIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+COMMANDS = {
+    "checkpoint": "checkpoint",
+    "complexity": "complexity_analyzer",
+    "conflicts": "conflict_detector",
+    "context": "context_budget",
+    "decompose": "task_decomposer",
+    "duplicates": "duplicate_detector",
+    "exit-gate": "exit_gate",
+    "graph": "graph_manager",
+    "index": "code_index",
+    "install": "installer",
+    "limits": "adaptive_limits",
+    "merge-train": "merge_train",
+    "profile": "profile_engine",
+    "reads": "read_cache",
+    "replay": "hook_replay",
+    "sessions": "session_archive",
+    "signal-bus": "signal_bus",
+    "signals": "signal_parser",
+    "stagnation": "stagnation_detector",
+    "status": "status_generator",
+    "swarm": "swarm_monitor",
+    "swarm-state": "swarm_state",
+    "worktree": "worktree_manager",
+}
+
+IDLE_TIMEOUT = 600
+
+
+def socket_path() -> str:
+    if os.environ.get("APEX_SERVER_SOCKET"):
+        return os.environ["APEX_SERVER_SOCKET"]
+    state_dir = os.environ.get("APEX_STATE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".config", "opencode", "apex", "state")
+    return os.path.join(state_dir, "apex.sock")
+
+
+def usage() -> str:
+    names = ", ".join(sorted(COMMANDS))
+    return (
+        "usage: apex.py <command> [args...]\n"
+        f"commands: {names}\n"
+        "server: serve [--daemon] [--idle SECONDS], stop, latency [--runs N]"
+    )
+
+
+def normalize_exit(code) -> int:
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def run_local(command: str, args: list[str]) -> int:
+    """Import only the requested module and run its main()."""
+    if FUNCTIONS_DIR not in sys.path:
+        sys.path.insert(0, FUNCTIONS_DIR)
+    import importlib
+
+    module_name = COMMANDS[command]
+    module = importlib.import_module(module_name)
+    sys.argv = [os.path.join(FUNCTIONS_DIR, module_name + ".py")] + args
+    try:
+        return normalize_exit(module.main())
+    except SystemExit as e:
+        return normalize_exit(e.code)
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+def run_remote(command: str, args: list[str]):
+    """
+    Forward to the fork-server. Returns None if no server is reachable.
+
+    Uses _socket/array/marshal rather than socket/json: those C modules load
+    in well under a millisecond, keeping the client close to bare startup.
+    """
+    path = socket_path()
+    if os.environ.get("APEX_NO_SERVER") or not os.path.exists(path):
+        return None
+
+    import _socket
+    import array
+    import marshal
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    request = marshal.dumps({
+        "command": command,
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+    })
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        # Until the whole request is out the server cannot have started the
+        # command, so a closed stdio fd or a vanished peer still falls back
+        sock.sendmsg([b"APEX"], [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, array.array("i", [0, 1, 2]))])
+        sock.sendall(len(request).to_bytes(4, "big") + request)
+    except OSError:
+        sock.close()
+        return None
+
+    try:
+        reply = b""
+        while True:
+            chunk = sock.recv(64)
+            if not chunk:
+                break
+            reply += chunk
+    finally:
+        sock.close()
+    try:
+        return int(reply.strip() or 1)
+    except ValueError:
+        return 1
+
+
+# ---------------------------------------------------------------------------
+# Fork-server
+# ---------------------------------------------------------------------------
+
+def recv_exact(conn, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("client closed connection")
+        data += chunk
+    return data
+
+
+def preload():
+    """Import every command module so children inherit warm imports."""
+    import importlib
+
+    if FUNCTIONS_DIR not in sys.path:
+        sys.path.insert(0, FUNCTIONS_DIR)
+    for module_name in COMMANDS.values():
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"apex serve: could not preload {module_name}: {e}", file=sys.stderr)
+
+
+def apex_modules() -> list[str]:
+    names = []
+    for name, module in list(sys.modules.items()):
+        origin = getattr(module, "__file__", None) or ""
+        if origin and os.path.dirname(os.path.abspath(origin)) == FUNCTIONS_DIR and name != "__main__":
+            names.append(name)
+    return names
+
+
+def apex_env(environ) -> dict:
+    return {k: v for k, v in environ.items() if k.startswith("APEX_") or k == "HOME"}
+
+
+def handle_child(conn) -> int:
+    """Runs in the forked child: adopt the client's stdio, env and cwd."""
+    import marshal
+    import signal
+    import socket
+
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    _, fds, _, _ = socket.recv_fds(conn, 4, 3)
+    size = int.from_bytes(recv_exact(conn, 4), "big")
+    request = marshal.loads(recv_exact(conn, size))
+
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    preloaded_env = apex_env(os.environ)
+    os.environ.clear()
+    os.environ.update(request["env"])
+    os.chdir(request["cwd"])
+
+    # Module-level constants read env at import time (APEX_DIR, APEX_STATE_DIR),
+    # so re-execute APEX modules if the client's APEX_* env differs. Stdlib stays warm.
+    if apex_env(os.environ) != preloaded_env:
+        for name in apex_modules():
+            del sys.modules[name]
+
+    if request["command"] not in COMMANDS:
+        print(usage(), file=sys.stderr)
+        return 2
+    code = run_local(request["command"], request["args"])
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return code
+
+
+def serve(idle_timeout: int = IDLE_TIMEOUT, daemon: bool = False) -> int:
+    import signal
+    import socket
+
+    path = socket_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            print(f"apex serve: already running on {path}", file=sys.stderr)
+            return 1
+        except OSError:
+            os.unlink(path)
+        finally:
+            probe.close()
+
+    if daemon:
+        if os.fork():
+            return 0
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+
+    preload()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen(64)
+    server.settimeout(idle_timeout)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if os.fork() == 0:
+                server.close()
+                code = 1
+                try:
+                    code = handle_child(conn)
+                except SystemExit as e:
+                    code = normalize_exit(e.code)
+                except BrokenPipeError:
+                    pass
+                except BaseException as e:
+                    print(f"apex: {type(e).__name__}: {e}", file=sys.stderr)
+                finally:
+                    try:
+                        sys.stdout.flush()
+                        sys.stderr.flush()
+                        conn.sendall(f"{code}\n".encode())
+                    except OSError:
+                        pass
+                    os._exit(code & 0xFF)
+            conn.close()
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+    return 0
+
+
+def stop() -> int:
+    """Stop the server (SIGTERM via socket peer credentials) and remove its socket."""
+    import socket
+    import struct
+
+    path = socket_path()
+    if not os.path.exists(path):
+        print("apex: no server running", file=sys.stderr)
+        return 1
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        so_peercred = getattr(socket, "SO_PEERCRED", None)
+        if so_peercred is not None:
+            pid, _, _ = struct.unpack("3i", sock.getsockopt(socket.SOL_SOCKET, so_peercred, 12))
+            os.kill(pid, 15)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+    if os.path.exists(path):
+        os.unlink(path)
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Latency report
+# ---------------------------------------------------------------------------
+
+def latency(runs: int = 10) -> int:
+    """Measure cold (direct script), multiplexed and warm (server) invocation latency."""
+    import json
+    import statistics
+    import subprocess
+    import tempfile
+    import time
+
+    probe = ["--indicators", '["code_complete","tests_passing"]', "--exit-signal", "true"]
+    apex = os.path.abspath(__file__)
+
+    def measure(cmd, env) -> dict:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(cmd, env=env, capture_output=True)
+            samples.append((time.perf_counter() - start) * 1000)
+        return {"median_ms": round(statistics.median(samples), 2), "min_ms": round(min(samples), 2)}
+
+    base_env = dict(os.environ, APEX_NO_SERVER="1")
+    report = {
+        "runs": runs,
+        "cold_direct": measure([sys.executable, os.path.join(FUNCTIONS_DIR, "exit_gate.py")] + probe, base_env),
+        "cold_multiplexed": measure([sys.executable, apex, "exit-gate"] + probe, base_env),
+    }
+
+    with tempfile.TemporaryDirectory(prefix="apex-sock-") as tmp:
+        env = dict(os.environ, APEX_SERVER_SOCKET=os.path.join(tmp, "apex.sock"))
+        env.pop("APEX_NO_SERVER", None)
+        server = subprocess.Popen([sys.executable, apex, "serve", "--idle", "30"], env=env)
+        try:
+            deadline = time.time() + 5
+            while not os.path.exists(env["APEX_SERVER_SOCKET"]) and time.time() < deadline:
+                time.sleep(0.02)
+            report["warm_server"] = measure([sys.executable, "-S", apex, "exit-gate"] + probe, env)
+        finally:
+            server.terminate()
+            server.wait()
+
+    cold = report["cold_direct"]["median_ms"]
+    warm = report["warm_server"]["median_ms"]
+    report["speedup"] = round(cold / warm, 2) if warm else None
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def main() -> int:
+    argv = sys.argv[1:]
+    if not argv or argv[0] in ("-h", "--help", "help"):
+        print(usage())
+        return 0
+
+    command, args = argv[0], argv[1:]
+
+    if command == "serve":
+        import argparse
+        parser = argparse.ArgumentParser(prog="apex.py serve", description="Run the APEX fork-server")
+        parser.add_argument("--daemon", action="store_true", help="Detach into the background")
+        parser.add_argument("--idle", type=int, default=IDLE_TIMEOUT, help="Exit after N idle seconds")
+        opts = parser.parse_args(args)
+        return serve(opts.idle, opts.daemon)
+    if command == "stop":
+        return stop()
+    if command == "latency":
+        import argparse
+        parser = argparse.ArgumentParser(prog="apex.py latency", description="Report cold vs warm latency")
+        parser.add_argument("--runs", type=int, default=10)
+        return latency(parser.parse_args(args).runs)
+
+    if command not in COMMANDS:
+        print(f"apex: unknown command '{command}'\n{usage()}", file=sys.stderr)
+        return 2
+
+    code = run_remote(command, args)
+    if code is None:
+        code = run_local(command, args)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+APEX Checkpoints
+Snapshot the worktree and loop state at iteration boundaries and roll both
+back in one step (`/apex/resume --to <checkpoint>`).
+
+A checkpoint is a commit object under refs/worktree/apex/checkpoints/NNNNNN
+whose tree holds:
+
+    worktree/         the working tree (tracked + untracked, minus ignored),
+                      staged through a temporary index, so the real index
+                      and branch are never touched
+    apex-state.json   the loop-state subset of apex-state.json
+
+Everything lives in the object store: unchanged files are shared between
+checkpoints, and an identical snapshot is not recorded twice. refs/worktree/
+is private to each worktree, so swarm workers in apex-worker-N worktrees
+keep separate checkpoint histories that never number, resolve or prune
+into each other.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+APEX_STATE_DIR = Path(os.environ.get("APEX_STATE_DIR", Path.home() / ".config" / "opencode" / "apex" / "state"))
+APEX_STATE = Path(os.environ.get("APEX_STATE", APEX_STATE_DIR / "apex-state.json"))
+REF_PREFIX = "refs/worktree/apex/checkpoints/"
+CREATE_ATTEMPTS = 3
+DEFAULT_KEEP = int(os.environ.get("APEX_CHECKPOINT_KEEP", "20"))
+
+# Loop state captured in a checkpoint; everything else in state is left alone
+STATE_KEYS = ("mode", "current_session", "circuit_breakers", "completion_cycle", "loop_mode", "context_budget")
+# Cycle totals are a hard safety boundary: a restore never rolls them back
+KEEP_CURRENT = (("tool_calls", "cycle_current"), ("errors", "cycle_current"))
+# Checkpoint commits are internal objects, never the user's commits
+IDENTITY = {"GIT_AUTHOR_NAME": "APEX checkpoint", "GIT_AUTHOR_EMAIL": "apex@localhost",
+            "GIT_COMMITTER_NAME": "APEX checkpoint", "GIT_COMMITTER_EMAIL": "apex@localhost"}
+
+
+class GitError(Exception):
+    pass
+
+
+def git(args: list[str], cwd: str, env: dict = None, input: str = None) -> str:
+    result = subprocess.run(["git"] + args, cwd=cwd, env=env, input=input, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise GitError(result.stderr.strip() or f"git {' '.join(args)} failed")
+    return result.stdout.strip()
+
+
+def repo_root(path: str = ".") -> str:
+    return git(["rev-parse", "--show-toplevel"], cwd=path)
+
+
+def snapshot_tree(root: str) -> str:
+    """Tree of the current working tree, built in a throwaway index."""
+    git_index = git(["rev-parse", "--git-path", "index"], cwd=root)
+    git_index = os.path.join(root, git_index) if not os.path.isabs(git_index) else git_index
+    with tempfile.TemporaryDirectory(prefix="apex-ckpt-") as tmp:
+        index = os.path.join(tmp, "index")
+        if os.path.exists(git_index):
+            # Start from the real index so unchanged files keep their stat cache
+            shutil.copyfile(git_index, index)
+        env = dict(os.environ, GIT_INDEX_FILE=index)
+        git(["add", "-A", "--", "."], cwd=root, env=env)
+        return git(["write-tree"], cwd=root, env=env)
+
+
+def read_state(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def list_checkpoints(root: str) -> list[dict]:
+    out = git(["for-each-ref", "--sort=refname", "--format=%(refname)%09%(objectname)%09%(creatordate:iso-strict)"
+               "%09%(contents:subject)", REF_PREFIX], cwd=root)
+    checkpoints = []
+    for line in out.splitlines():
+        ref, commit, created, subject = line.split("\t", 3)
+        checkpoints.append({"id": ref[len(REF_PREFIX):], "ref": ref, "commit": commit,
+                            "created_at": created, "subject": subject})
+    return checkpoints
+
+
+def resolve(root: str, checkpoint: str) -> dict:
+    """Checkpoint by id (000012 or 12), 'latest', or '~N' (N before latest)."""
+    checkpoints = list_checkpoints(root)
+    if not checkpoints:
+        raise GitError("No checkpoints")
+    if checkpoint == "latest":
+        return checkpoints[-1]
+    if checkpoint.startswith("~") and checkpoint[1:].isdigit():
+        back = int(checkpoint[1:])
+        if back >= len(checkpoints):
+            raise GitError(f"Only {len(checkpoints)} checkpoints")
+        return checkpoints[-1 - back]
+    for entry in checkpoints:
+        if checkpoint.isdigit() and int(entry["id"]) == int(checkpoint):
+            return entry
+    raise GitError(f"Unknown checkpoint: {checkpoint}")
+
+
+def create(root: str, label: str = "", state_path: Path = None, keep: int = DEFAULT_KEEP) -> dict:
+    state_path = state_path or APEX_STATE
+    state = read_state(state_path)
+    snapshot = {key: state[key] for key in STATE_KEYS if key in state}
+    iteration = (state.get("completion_cycle") or {}).get("iteration_count")
+
+    worktree = snapshot_tree(root)
+    state_blob = git(["hash-object", "-w", "--stdin"], cwd=root, input=json.dumps(snapshot, sort_keys=True))
+    tree = git(["mktree"], cwd=root, input=f"100644 blob {state_blob}\tapex-state.json\n"
+                                            f"040000 tree {worktree}\tworktree\n")
+
+    try:
+        parent = ["-p", git(["rev-parse", "--verify", "-q", "HEAD"], cwd=root)]
+    except GitError:
+        parent = []  # unborn branch: parentless checkpoint
+
+    for attempt in range(CREATE_ATTEMPTS):
+        checkpoints = list_checkpoints(root)
+        if checkpoints and git(["rev-parse", f"{checkpoints[-1]['commit']}^{{tree}}"], cwd=root) == tree:
+            return {"success": True, "created": False, "checkpoint": checkpoints[-1]["id"],
+                    "reason": "unchanged since last checkpoint"}
+
+        next_id = int(checkpoints[-1]["id"]) + 1 if checkpoints else 1
+        subject = f"apex checkpoint {next_id}" + (f" (iteration {iteration})" if iteration is not None else "")
+        subject += f": {label}" if label else ""
+        commit = git(["commit-tree", tree] + parent + ["-m", subject], cwd=root, env=dict(os.environ, **IDENTITY))
+        checkpoint_id = f"{next_id:06d}"
+        try:
+            # Zero old value: fail rather than overwrite a checkpoint created concurrently
+            git(["update-ref", REF_PREFIX + checkpoint_id, commit, "0" * len(commit)], cwd=root)
+            break
+        except GitError:
+            if attempt == CREATE_ATTEMPTS - 1:
+                raise
+
+    pruned = prune(root, keep)["pruned"]
+    return {"success": True, "created": True, "checkpoint": checkpoint_id, "commit": commit,
+            "worktree_tree": worktree, "iteration": iteration, "pruned": pruned}
+
+
+def prune(root: str, keep: int = DEFAULT_KEEP) -> dict:
+    checkpoints = list_checkpoints(root)
+    stale = checkpoints[:-keep] if keep > 0 else checkpoints
+    if stale:
+        git(["update-ref", "--stdin"], cwd=root,
+            input="".join(f"delete {entry['ref']}\n" for entry in stale))
+    return {"success": True, "pruned": [entry["id"] for entry in stale], "kept": len(checkpoints) - len(stale)}
+
+
+def restore_worktree(root: str, commit: str) -> dict:
+    """
+    Make the working tree match the checkpoint (index and HEAD untouched).
+    Only paths that differ are written or removed; unchanged files keep
+    their mtime, so watchers and incremental builds see just the real change.
+    """
+    target = git(["rev-parse", f"{commit}:worktree"], cwd=root)
+    current = snapshot_tree(root)
+    diff = git(["diff-tree", "-r", "-z", "--name-status", "--no-renames", target, current], cwd=root)
+    fields = diff.split("\0")
+    added, changed = [], []
+    for status, name in zip(fields[0::2], fields[1::2]):
+        # A: only in the worktree now; anything else exists in the checkpoint
+        (added if status == "A" else changed).append(name)
+    for name in added:
+        path = os.path.join(root, name)
+        if os.path.lexists(path):
+            os.remove(path)
+    if changed:
+        with tempfile.TemporaryDirectory(prefix="apex-ckpt-") as tmp:
+            env = dict(os.environ, GIT_INDEX_FILE=os.path.join(tmp, "index"))
+            git(["read-tree", target], cwd=root, env=env)
+            git(["checkout-index", "-f", "-z", "--stdin"], cwd=root, env=env,
+                input="".join(name + "\0" for name in changed))
+    return {"files_changed": len(changed) + len(added), "files_removed": len(added)}
+
+
+def restore_state(commit: str, root: str, state_path: Path = None) -> dict:
+    """Put the checkpoint's loop state back, keeping cycle totals and the rest of state."""
+    state_path = state_path or APEX_STATE
+    snapshot = json.loads(git(["cat-file", "blob", f"{commit}:apex-state.json"], cwd=root))
+    with open(f"{state_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        state = read_state(state_path)
+        breakers = state.get("circuit_breakers", {})
+        for key, value in snapshot.items():
+            state[key] = value
+        restored = state.setdefault("circuit_breakers", {})
+        for group, counter in KEEP_CURRENT:
+            if counter in breakers.get(group, {}):
+                restored.setdefault(group, {})[counter] = breakers[group][counter]
+        restored["tripped"] = False
+        restored.pop("trip_reason", None)
+        tmp_path = state_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, state_path)
+    return {"keys": sorted(snapshot)}
+
+
+def restore(root: str, checkpoint: str, state_path: Path = None, worktree: bool = True,
+            state: bool = True) -> dict:
+    entry = resolve(root, checkpoint)
+    # Checkpoint the present first so the restore itself can be undone
+    # (one extra slot so the safety checkpoint cannot prune the target)
+    safety = create(root, label=f"before restore to {entry['id']}", state_path=state_path, keep=DEFAULT_KEEP + 1)
+    result = {"success": True, "checkpoint": entry["id"], "undo": safety["checkpoint"]}
+    if worktree:
+        result["worktree"] = restore_worktree(root, entry["commit"])
+    if state and (state_path or APEX_STATE).exists():
+        result["state"] = restore_state(entry["commit"], root, state_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Checkpoints")
+    parser.add_argument("--repo", default=".", help="Repository path")
+    parser.add_argument("--state", help="apex-state.json path (default: APEX_STATE)")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    create_parser = subparsers.add_parser("create", help="Checkpoint worktree + loop state")
+    create_parser.add_argument("--label", default="", help="Short description")
+    create_parser.add_argument("--keep", type=int, default=DEFAULT_KEEP, help="Checkpoints to retain")
+
+    subparsers.add_parser("list", help="List checkpoints")
+
+    restore_parser = subparsers.add_parser("restore", help="Restore a checkpoint")
+    restore_parser.add_argument("checkpoint", help="Checkpoint id, 'latest' or '~N'")
+    restore_parser.add_argument("--worktree-only", action="store_true", help="Leave apex-state.json alone")
+    restore_parser.add_argument("--state-only", action="store_true", help="Leave the working tree alone")
+
+    prune_parser = subparsers.add_parser("prune", help="Drop old checkpoints")
+    prune_parser.add_argument("--keep", type=int, default=DEFAULT_KEEP, help="Checkpoints to retain")
+
+    args = parser.parse_args()
+    state_path = Path(args.state) if args.state else None
+
+    try:
+        root = repo_root(args.repo)
+        if args.action == "create":
+            result = create(root, args.label, state_path, args.keep)
+        elif args.action == "list":
+            result = {"success": True, "checkpoints": list_checkpoints(root)}
+        elif args.action == "restore":
+            result = restore(root, args.checkpoint, state_path,
+                             worktree=not args.state_only, state=not args.worktree_only)
+        else:
+            result = prune(root, args.keep)
+    except GitError as e:
+        result = {"success": False, "error": str(e)}
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success") else 1)
+
+
+if __name__ == "__main__":
+    main()
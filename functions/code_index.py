@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+APEX Code Index
+Offline BM25 search over repository code chunks, a local stand-in for grepai.
+
+Source files are split into function/class chunks (ast for Python, a line
+heuristic elsewhere). Postings are stored as flat binary arrays in CSR
+layout and memory-mapped at query time. NumPy vectorizes scoring when it
+is installed; otherwise a pure-Python accumulator is used. The index
+follows git: updates re-chunk only files changed between the indexed and
+current HEAD, plus files dirty in the working tree.
+"""
+
+import argparse
+import ast
+import fcntl
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+APEX_STATE_DIR = Path(os.environ.get("APEX_STATE_DIR", Path.home() / ".config" / "opencode" / "apex" / "state"))
+INDEX_ROOT = Path(os.environ.get("APEX_INDEX_DIR", APEX_STATE_DIR / "index"))
+APEX_STATE = Path(os.environ.get("APEX_STATE", APEX_STATE_DIR / "apex-state.json"))
+
+INDEX_VERSION = 1
+K1 = 1.5
+B = 0.75
+MAX_FILE_BYTES = 512 * 1024
+MAX_CHUNK_LINES = 200
+WINDOW_LINES = 80
+
+EXTENSIONS = {
+    ".py", ".pyi", ".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".go", ".rs", ".java", ".kt",
+    ".rb", ".php", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".swift", ".scala", ".lua",
+    ".sh", ".bash", ".zsh", ".sql", ".md", ".yaml", ".yml", ".toml",
+}
+
+IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]{2,}")
+PART_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+STOPWORDS = {"a", "an", "and", "as", "at", "be", "by", "for", "if", "in", "is", "it", "of", "on",
+             "or", "the", "this", "to", "with", "self"}
+
+BOUNDARY_RE = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(?:static\s+)?"
+    r"(?:function\*?|class|def|fn|func(?:\s*\([^)]*\))?|interface|struct|enum|trait|impl|module|type)\s+"
+    r"(?P<decl>[A-Za-z_$][\w$]*)"
+    r"|^\s*(?:export\s+)?(?:const|let|var)\s+(?P<assign>[A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:function|\(|[A-Za-z_$][\w$]*\s*=>)"
+    r"|^(?:function\s+)?(?P<shell>[A-Za-z_][\w-]*)\s*\(\)\s*\{"
+    r"|^(?P<heading>#{1,6}\s+.+)"
+)
+
+ARRAY_FILES = {
+    "offsets": ("postings.offsets", "Q"),
+    "docs": ("postings.docs", "I"),
+    "tfs": ("postings.tfs", "I"),
+    "lengths": ("docs.len", "I"),
+}
+
+
+# ---------------------------------------------------------------------------
+# Git helpers
+# ---------------------------------------------------------------------------
+
+def git(args: list[str], cwd: str) -> tuple[bool, str]:
+    result = subprocess.run(["git"] + args, cwd=cwd, capture_output=True, text=True)
+    return result.returncode == 0, result.stdout if result.returncode == 0 else result.stderr.strip()
+
+
+def repo_root(path: str = ".") -> str:
+    ok, out = git(["rev-parse", "--show-toplevel"], cwd=path)
+    if not ok:
+        raise RuntimeError(f"Not a git repository: {path}")
+    return out.strip()
+
+
+def head_commit(root: str) -> Optional[str]:
+    ok, out = git(["rev-parse", "--verify", "-q", "HEAD"], cwd=root)
+    return out.strip() if ok else None
+
+
+def list_files(root: str) -> list[str]:
+    ok, out = git(["ls-files", "-z", "--cached", "--others", "--exclude-standard"], cwd=root)
+    return sorted({p for p in out.split("\0") if p}) if ok else []
+
+
+def dirty_files(root: str) -> list[str]:
+    ok, out = git(["ls-files", "-z", "--modified", "--deleted", "--others", "--exclude-standard"], cwd=root)
+    return sorted({p for p in out.split("\0") if p}) if ok else []
+
+
+def index_dir(root: str) -> Path:
+    return INDEX_ROOT / hashlib.sha1(root.encode()).hexdigest()[:16]
+
+
+# ---------------------------------------------------------------------------
+# Tokenizing and chunking
+# ---------------------------------------------------------------------------
+
+def tokenize(text: str) -> list[str]:
+    """Identifiers lowercased whole and split on snake_case/camelCase boundaries."""
+    tokens = []
+    for ident in IDENT_RE.findall(text):
+        whole = ident.strip("_").lower()
+        if len(whole) > 1 and whole not in STOPWORDS:
+            tokens.append(whole)
+        parts = PART_RE.findall(ident)
+        if len(parts) > 1:
+            tokens.extend(p.lower() for p in parts if len(p) > 1 and p.lower() not in STOPWORDS)
+    return tokens
+
+
+def indexable(root: str, rel: str) -> bool:
+    path = Path(root, rel)
+    if path.suffix.lower() not in EXTENSIONS or not path.is_file():
+        return False
+    return path.stat().st_size <= MAX_FILE_BYTES
+
+
+def chunk_python(lines: list[str]) -> Optional[list[tuple]]:
+    """Functions, methods and classes (minus their methods) plus a module chunk."""
+    try:
+        tree = ast.parse("".join(lines))
+    except (SyntaxError, ValueError):
+        return None
+
+    chunks = []
+    covered = set()
+    defs = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+    def span(node) -> tuple[int, int]:
+        start = min([d.lineno for d in node.decorator_list] + [node.lineno])
+        return start, node.end_lineno
+
+    def visit(nodes, prefix: str, top: bool):
+        for node in nodes:
+            if not isinstance(node, defs):
+                continue
+            start, end = span(node)
+            if top:
+                covered.update(range(start, end + 1))
+            name = prefix + node.name
+            if isinstance(node, ast.ClassDef):
+                inner = set()
+                for child in node.body:
+                    if isinstance(child, defs):
+                        child_start, child_end = span(child)
+                        inner.update(range(child_start, child_end + 1))
+                text = "".join(lines[i - 1] for i in range(start, end + 1) if i not in inner)
+                chunks.append((name, "class", start, end, text))
+                visit(node.body, name + ".", False)
+            else:
+                kind = "method" if prefix else "function"
+                chunks.append((name, kind, start, end, "".join(lines[start - 1:end])))
+
+    visit(tree.body, "", True)
+    rest = "".join(line for i, line in enumerate(lines, 1) if i not in covered)
+    if rest.strip():
+        chunks.insert(0, ("<module>", "module", 1, len(lines), rest))
+    return chunks
+
+
+def chunk_heuristic(lines: list[str], markdown: bool = False) -> list[tuple]:
+    """Split on declaration-looking lines (headings for markdown); window long spans."""
+    bounds = []
+    for i, line in enumerate(lines):
+        match = BOUNDARY_RE.match(line)
+        if match and (markdown or not match.group("heading")):
+            name = next(g for g in match.groups() if g)
+            kind = "section" if match.group("heading") else "block"
+            bounds.append((i, name.lstrip("# ").strip()[:80], kind))
+
+    spans = []
+    if not bounds or bounds[0][0] > 0:
+        spans.append((0, bounds[0][0] if bounds else len(lines), "<module>", "module"))
+    for n, (start, name, kind) in enumerate(bounds):
+        end = bounds[n + 1][0] if n + 1 < len(bounds) else len(lines)
+        spans.append((start, end, name, kind))
+
+    chunks = []
+    for start, end, name, kind in spans:
+        text = "".join(lines[start:end])
+        if not text.strip():
+            continue
+        if end - start <= MAX_CHUNK_LINES:
+            chunks.append((name, kind, start + 1, end, text))
+            continue
+        for window in range(start, end, WINDOW_LINES):
+            stop = min(window + WINDOW_LINES, end)
+            chunks.append((name, kind, window + 1, stop, "".join(lines[window:stop])))
+    return chunks
+
+
+def chunk_file(root: str, rel: str) -> list[dict]:
+    """Chunk one file into {name, kind, start, end, len, tf} records."""
+    raw = Path(root, rel).read_bytes()
+    if b"\0" in raw[:8192]:
+        return []
+    lines = raw.decode("utf-8", "replace").splitlines(keepends=True)
+    chunks = chunk_python(lines) if rel.endswith((".py", ".pyi")) else None
+    if chunks is None:
+        chunks = chunk_heuristic(lines, markdown=rel.endswith(".md"))
+
+    records = []
+    for name, kind, start, end, text in chunks:
+        tokens = tokenize(name + " " + rel + " " + text)
+        if tokens:
+            records.append({
+                "name": name, "kind": kind, "start": start, "end": end,
+                "len": len(tokens), "tf": dict(Counter(tokens)),
+            })
+    return records
+
+
+# ---------------------------------------------------------------------------
+# Building
+# ---------------------------------------------------------------------------
+
+def compile_index(files: dict[str, list[dict]], target: Path) -> dict:
+    """Write docs, vocab and CSR postings arrays for the per-file chunk store."""
+    docs = []
+    lengths = array("I")
+    postings = defaultdict(list)
+    for rel in sorted(files):
+        for chunk in files[rel]:
+            doc = len(docs)
+            docs.append([rel, chunk["name"], chunk["kind"], chunk["start"], chunk["end"]])
+            lengths.append(chunk["len"])
+            for term, tf in chunk["tf"].items():
+                postings[term].append((doc, tf))
+
+    vocab = {}
+    offsets = array("Q", [0])
+    doc_ids = array("I")
+    tfs = array("I")
+    for term in sorted(postings):
+        vocab[term] = len(vocab)
+        for doc, tf in postings[term]:
+            doc_ids.append(doc)
+            tfs.append(tf)
+        offsets.append(len(doc_ids))
+
+    arrays = {"offsets": offsets, "docs": doc_ids, "tfs": tfs, "lengths": lengths}
+    for key, (filename, _) in ARRAY_FILES.items():
+        with open(target / filename, "wb") as f:
+            arrays[key].tofile(f)
+    (target / "docs.json").write_text(json.dumps(docs))
+    (target / "vocab.json").write_text(json.dumps(vocab))
+    (target / "files.json").write_text(json.dumps(files))
+
+    return {
+        "docs": len(docs),
+        "terms": len(vocab),
+        "postings": len(doc_ids),
+        "avgdl": (sum(lengths) / len(lengths)) if lengths else 0.0,
+    }
+
+
+def stat_sig(root: str, rel: str) -> Optional[list[int]]:
+    try:
+        st = os.stat(Path(root, rel))
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def write_index(root: str, files: dict[str, list[dict]], head: Optional[str], dirty: list[str]) -> dict:
+    """Compile into a scratch directory and swap it into place."""
+    final = index_dir(root)
+    final.parent.mkdir(parents=True, exist_ok=True)
+    scratch = final.with_name(final.name + f".tmp-{os.getpid()}")
+    shutil.rmtree(scratch, ignore_errors=True)
+    scratch.mkdir()
+
+    meta = compile_index(files, scratch)
+    meta.update({
+        "version": INDEX_VERSION,
+        "repo": root,
+        "head": head,
+        "files": len(files),
+        "dirty": {rel: stat_sig(root, rel) for rel in dirty},
+        "updated_at": datetime.utcnow().isoformat() + "Z",
+    })
+    (scratch / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    retired = final.with_name(final.name + f".old-{os.getpid()}")
+    if final.exists():
+        final.rename(retired)
+    scratch.rename(final)
+    shutil.rmtree(retired, ignore_errors=True)
+    return meta
+
+
+def index_lock(root: str):
+    path = index_dir(root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock = open(f"{path}.lock", "w")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+
+def build(root: str) -> dict:
+    """Full rebuild from every tracked and untracked-but-not-ignored file."""
+    start = time.perf_counter()
+    with index_lock(root):
+        files = {rel: chunk_file(root, rel) for rel in list_files(root) if indexable(root, rel)}
+        meta = write_index(root, files, head_commit(root), dirty_files(root))
+    register(meta)
+    return summary(meta, "build", start, changed=len(files))
+
+
+def update(root: str) -> dict:
+    """Re-chunk files changed since the indexed HEAD and files dirty in the worktree."""
+    start = time.perf_counter()
+    meta = load_meta(root)
+    if meta is None or meta.get("version") != INDEX_VERSION:
+        return build(root)
+
+    head = head_commit(root)
+    changed = set()
+    if meta.get("head") != head:
+        if not meta.get("head") or not head:
+            return build(root)
+        ok, out = git(["diff", "--name-only", "--no-renames", meta["head"], head], cwd=root)
+        if not ok:
+            return build(root)
+        changed.update(p for p in out.splitlines() if p)
+
+    dirty = dirty_files(root)
+    previous = meta.get("dirty", {})
+    for rel in set(dirty) | set(previous):
+        if stat_sig(root, rel) != previous.get(rel):
+            changed.add(rel)
+
+    if not changed:
+        return summary(meta, "unchanged", start, changed=0)
+
+    with index_lock(root):
+        files = json.loads((index_dir(root) / "files.json").read_text())
+        for rel in changed:
+            if indexable(root, rel):
+                files[rel] = chunk_file(root, rel)
+            else:
+                files.pop(rel, None)
+        meta = write_index(root, files, head, dirty)
+    register(meta)
+    return summary(meta, "update", start, changed=len(changed))
+
+
+def summary(meta: dict, action: str, start: float, changed: int) -> dict:
+    return {
+        "success": True,
+        "action": action,
+        "changed_files": changed,
+        "files": meta["files"],
+        "chunks": meta["docs"],
+        "terms": meta["terms"],
+        "head": meta["head"],
+        "took_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def load_meta(root: str) -> Optional[dict]:
+    path = index_dir(root) / "meta.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def register(meta: dict):
+    """Mark the local index available in apex-state.json so hooks stop falling back to grep."""
+    if not APEX_STATE.exists():
+        return
+    with open(f"{APEX_STATE}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        state = json.loads(APEX_STATE.read_text())
+        semantic = state.setdefault("semantic_tools", {})
+        semantic.setdefault("available", {})["local_index"] = True
+        semantic["local_index"] = {
+            "repo": meta["repo"],
+            "head": meta["head"],
+            "chunks": meta["docs"],
+            "updated_at": meta["updated_at"],
+        }
+        tmp_path = APEX_STATE.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state, indent=2))
+        os.replace(tmp_path, APEX_STATE)
+
+
+# ---------------------------------------------------------------------------
+# Querying
+# ---------------------------------------------------------------------------
+
+class CodeIndex:
+    """Read-only view over a compiled index with memory-mapped postings."""
+
+    def __init__(self, root: str, use_numpy: Optional[bool] = None):
+        self.path = index_dir(root)
+        self.meta = load_meta(root)
+        if self.meta is None:
+            raise FileNotFoundError(f"No index for {root}; run 'code_index.py build'")
+        self.use_numpy = (np is not None) if use_numpy is None else (use_numpy and np is not None)
+        self.vocab = json.loads((self.path / "vocab.json").read_text())
+        self._docs = None
+        self._maps = []
+        self.arrays = {key: self._map(filename, code) for key, (filename, code) in ARRAY_FILES.items()}
+
+    def _map(self, filename: str, code: str):
+        path = self.path / filename
+        if path.stat().st_size == 0:
+            return np.zeros(0, dtype=code) if self.use_numpy else array(code)
+        if self.use_numpy:
+            return np.memmap(path, dtype=np.dtype(code), mode="r")
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped).cast(code)
+
+    @property
+    def docs(self) -> list:
+        if self._docs is None:
+            self._docs = json.loads((self.path / "docs.json").read_text())
+        return self._docs
+
+    def term_ids(self, query: str) -> list[int]:
+        seen = []
+        for token in tokenize(query):
+            term = self.vocab.get(token)
+            if term is not None and term not in seen:
+                seen.append(term)
+        return seen
+
+    def idf(self, df: int) -> float:
+        n = self.meta["docs"]
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def scores(self, terms: list[int]) -> dict[int, float]:
+        offsets, doc_ids, tfs, lengths = (self.arrays[k] for k in ("offsets", "docs", "tfs", "lengths"))
+        avgdl = self.meta["avgdl"] or 1.0
+
+        if self.use_numpy:
+            totals = np.zeros(self.meta["docs"], dtype=np.float32)
+            for term in terms:
+                start, end = int(offsets[term]), int(offsets[term + 1])
+                ids = doc_ids[start:end]
+                tf = tfs[start:end].astype(np.float32)
+                norm = K1 * (1 - B + B * lengths[ids] / avgdl)
+                totals[ids] += self.idf(end - start) * tf * (K1 + 1) / (tf + norm)
+            hits = np.nonzero(totals)[0]
+            return dict(zip(hits.tolist(), totals[hits].tolist()))
+
+        totals = defaultdict(float)
+        for term in terms:
+            start, end = offsets[term], offsets[term + 1]
+            weight = self.idf(end - start) * (K1 + 1)
+            for i in range(start, end):
+                doc = doc_ids[i]
+                tf = tfs[i]
+                totals[doc] += weight * tf / (tf + K1 * (1 - B + B * lengths[doc] / avgdl))
+        return totals
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        totals = self.scores(self.term_ids(query))
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        results = []
+        for doc, score in ranked:
+            path, name, kind, start, end = self.docs[doc]
+            results.append({
+                "path": path, "name": name, "kind": kind,
+                "start_line": start, "end_line": end, "score": round(score, 4),
+            })
+        return results
+
+
+def query(root: str, text: str, limit: int = 10, refresh: bool = True, snippet: int = 0) -> dict:
+    start = time.perf_counter()
+    if refresh:
+        update(root)
+    index = CodeIndex(root)
+    results = index.search(text, limit)
+    if snippet:
+        for result in results:
+            try:
+                with open(Path(root, result["path"]), errors="replace") as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            first = result["start_line"] - 1
+            result["snippet"] = "".join(lines[first:first + snippet])
+    return {
+        "query": text,
+        "results": results,
+        "count": len(results),
+        "engine": "numpy" if index.use_numpy else "python",
+        "took_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Code Index (offline BM25)")
+    parser.add_argument("--repo", default=".", help="Path inside the repository to index")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    subparsers.add_parser("build", help="Rebuild the index from scratch")
+    subparsers.add_parser("update", help="Re-index files changed since the indexed HEAD")
+
+    query_parser = subparsers.add_parser("query", help="Search code chunks")
+    query_parser.add_argument("text", help="Search text")
+    query_parser.add_argument("--limit", type=int, default=10)
+    query_parser.add_argument("--snippet", type=int, default=0, help="Include the first N lines of each hit")
+    query_parser.add_argument("--no-update", action="store_true", help="Skip the incremental update")
+
+    subparsers.add_parser("stats", help="Show index statistics")
+
+    args = parser.parse_args()
+
+    try:
+        root = repo_root(args.repo)
+        if args.action == "build":
+            result = build(root)
+        elif args.action == "update":
+            result = update(root)
+        elif args.action == "query":
+            result = query(root, args.text, args.limit, not args.no_update, args.snippet)
+        else:
+            meta = load_meta(root)
+            result = {"success": meta is not None, "index": str(index_dir(root)), **(meta or {})}
+            result.pop("dirty", None)
+    except (RuntimeError, FileNotFoundError) as e:
+        result = {"success": False, "error": str(e)}
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success", True) else 1)
+
+
+if __name__ == "__main__":
+    main()
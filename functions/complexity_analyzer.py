@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+APEX Complexity Analyzer
+Per-function cyclomatic complexity, length and nesting for /apex/simplify.
+
+Python is analyzed with the ast module; brace languages (TS/JS/Go/...) use a
+lightweight token heuristic. Results are cached per file content hash, so
+only changed files are re-analyzed, and cache misses are spread over a
+process pool. `baseline` + `delta` produce the before/after numbers that go
+into the `simplification` state block.
+"""
+
+import argparse
+import ast
+import fcntl
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+APEX_STATE_DIR = Path(os.environ.get("APEX_STATE_DIR", Path.home() / ".config" / "opencode" / "apex" / "state"))
+APEX_STATE = Path(os.environ.get("APEX_STATE", APEX_STATE_DIR / "apex-state.json"))
+COMPLEXITY_CACHE = APEX_STATE_DIR / "complexity-cache.json"
+CACHE_MAX = 5000
+ENGINE_VERSION = 1
+
+CODE_EXTENSIONS = {".py", ".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs", ".go", ".java", ".c", ".cc",
+                   ".cpp", ".h", ".hpp", ".cs", ".rs", ".swift", ".kt", ".php"}
+POOL_THRESHOLD = 8
+
+# Hotspot thresholds (simplify.md: >50-line functions, >3 nesting levels)
+COMPLEXITY_LIMIT = 10
+LINES_LIMIT = 50
+NESTING_LIMIT = 3
+
+BRANCH_NODES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.Assert)
+NESTING_NODES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try)
+if hasattr(ast, "TryStar"):
+    NESTING_NODES += (ast.TryStar,)
+if hasattr(ast, "Match"):
+    NESTING_NODES += (ast.Match,)
+FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+BRACE_BRANCH_RE = re.compile(r"\b(?:if|for|while|case|catch)\b|&&|\|\||\?\?|\?(?=[^.:?])")
+BRACE_FUNCTION_RE = re.compile(
+    r"(?:\bfunction\s*\*?\s*(?P<fn>[A-Za-z_$][\w$]*)?\s*\("
+    r"|\b(?P<arrow>[A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:\([^()]*\)|[A-Za-z_$][\w$]*)\s*=>"
+    r"|\bfunc\s+(?:\([^)]*\)\s*)?(?P<go>[A-Za-z_]\w*)\s*\("
+    r"|\bfn\s+(?P<rs>[A-Za-z_]\w*)"
+    r"|^[ \t]*(?:(?:public|private|protected|static|async|override|final|virtual)\s+)*"
+    r"(?:[\w<>\[\],]+\s+)?(?P<method>[A-Za-z_]\w*)\s*\([^;{}]*\)\s*(?::\s*[^{;]+)?\{)",
+    re.MULTILINE,
+)
+BRACE_KEYWORDS = {"if", "for", "while", "switch", "catch", "return", "else", "do", "try"}
+STRING_RE = re.compile(r"//[^\n]*|/\*.*?\*/|\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`", re.DOTALL)
+
+
+# ---------------------------------------------------------------------------
+# Python: ast
+# ---------------------------------------------------------------------------
+
+def python_complexity(node: ast.AST) -> int:
+    """McCabe complexity of a function body, not descending into nested defs."""
+    complexity = 1
+    stack = list(ast.iter_child_nodes(node))
+    while stack:
+        child = stack.pop()
+        if isinstance(child, FUNCTION_NODES + (ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(child, BRANCH_NODES):
+            complexity += 1
+        elif isinstance(child, ast.BoolOp):
+            complexity += len(child.values) - 1
+        elif isinstance(child, ast.comprehension):
+            complexity += 1 + len(child.ifs)
+        elif hasattr(ast, "match_case") and isinstance(child, ast.match_case):
+            complexity += 1
+        stack.extend(ast.iter_child_nodes(child))
+    return complexity
+
+
+def python_nesting(node: ast.AST, depth: int = 0) -> int:
+    deepest = depth
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, FUNCTION_NODES + (ast.ClassDef,)):
+            continue
+        child_depth = depth + 1 if isinstance(child, NESTING_NODES) else depth
+        deepest = max(deepest, python_nesting(child, child_depth))
+    return deepest
+
+
+def analyze_python(source: str) -> list[dict]:
+    tree = ast.parse(source)
+    functions = []
+
+    def visit(node: ast.AST, prefix: str):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, FUNCTION_NODES):
+                name = f"{prefix}{child.name}"
+                functions.append({
+                    "name": name,
+                    "line": child.lineno,
+                    "lines": child.end_lineno - child.lineno + 1,
+                    "complexity": python_complexity(child),
+                    "nesting": python_nesting(child),
+                })
+                visit(child, f"{name}.")
+            elif isinstance(child, ast.ClassDef):
+                visit(child, f"{prefix}{child.name}.")
+
+    visit(tree, "")
+    return functions
+
+
+# ---------------------------------------------------------------------------
+# Brace languages: token heuristic
+# ---------------------------------------------------------------------------
+
+def strip_strings(source: str) -> str:
+    """Blank out comments and string literals, keeping newlines and offsets."""
+    return STRING_RE.sub(lambda m: re.sub(r"[^\n]", " ", m.group()), source)
+
+
+def analyze_braces(source: str) -> list[dict]:
+    code = strip_strings(source)
+    functions = []
+    for match in BRACE_FUNCTION_RE.finditer(code):
+        name = next((v for v in match.groupdict().values() if v), None) or "<anonymous>"
+        if name in BRACE_KEYWORDS:
+            continue
+        start = code.find("{", match.end() - 1)
+        signature_tail = code[match.end():start]
+        if start < 0 or ";" in signature_tail or signature_tail.count("\n") > 3 or \
+                (match.group("arrow") and signature_tail.strip()):
+            # Prototype, or an arrow function with an expression body
+            continue
+        depth, deepest, end = 0, 0, None
+        for i in range(start, len(code)):
+            if code[i] == "{":
+                depth += 1
+                deepest = max(deepest, depth)
+            elif code[i] == "}":
+                depth -= 1
+                if depth == 0:
+                    end = i
+                    break
+        if end is None:
+            continue
+        body = code[start:end + 1]
+        functions.append({
+            "name": name,
+            "line": code.count("\n", 0, match.start()) + 1,
+            "lines": code.count("\n", match.start(), end) + 1,
+            "complexity": 1 + len(BRACE_BRANCH_RE.findall(body)),
+            "nesting": max(deepest - 1, 0),
+        })
+    return functions
+
+
+# ---------------------------------------------------------------------------
+# Cache + pool
+# ---------------------------------------------------------------------------
+
+def content_key(suffix: str, data: bytes) -> str:
+    return hashlib.sha1(f"{ENGINE_VERSION}:{suffix}:".encode() + data).hexdigest()
+
+
+def analyze_source(suffix: str, source: str) -> dict:
+    try:
+        if suffix == ".py":
+            functions, engine = analyze_python(source), "ast"
+        else:
+            functions, engine = analyze_braces(source), "heuristic"
+    except (SyntaxError, ValueError, RecursionError) as e:
+        return {"engine": "error", "error": str(e), "functions": [], "lines": source.count("\n") + 1}
+    return {"engine": engine, "functions": functions, "lines": source.count("\n") + 1}
+
+
+def _analyze_file(job: tuple[str, str]) -> tuple[str, dict]:
+    """Pool worker: (key, path) -> (key, analysis)."""
+    key, path = job
+    with open(path, encoding="utf-8", errors="replace") as f:
+        source = f.read()
+    return key, analyze_source(Path(path).suffix.lower(), source)
+
+
+def load_cache() -> dict:
+    if COMPLEXITY_CACHE.exists():
+        try:
+            with open(COMPLEXITY_CACHE) as f:
+                cache = json.load(f)
+            if cache.get("version") == ENGINE_VERSION:
+                return cache
+        except json.JSONDecodeError:
+            pass
+    return {"version": ENGINE_VERSION, "seq": 0, "entries": {}}
+
+
+def save_cache(cache: dict):
+    COMPLEXITY_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    if len(cache["entries"]) > CACHE_MAX:
+        keep = sorted(cache["entries"].items(), key=lambda item: item[1]["seq"])[-CACHE_MAX:]
+        cache["entries"] = dict(keep)
+    tmp_path = COMPLEXITY_CACHE.with_suffix(f".tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, COMPLEXITY_CACHE)
+
+
+def analyze_files(paths: list[str], workers: int = None) -> tuple[dict, dict]:
+    """Analysis per path, re-using cached results for unchanged content."""
+    cache = load_cache()
+    keys, misses = {}, {}
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                key = content_key(Path(path).suffix.lower(), f.read())
+        except OSError:
+            continue
+        keys[path] = key
+        if key not in cache["entries"]:
+            misses.setdefault(key, path)
+
+    jobs = list(misses.items())
+    if len(jobs) >= POOL_THRESHOLD and (workers is None or workers > 1):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_analyze_file, jobs, chunksize=max(1, len(jobs) // 32)))
+    else:
+        results = [_analyze_file(job) for job in jobs]
+
+    if results:
+        # Recency is only refreshed when the cache is written anyway
+        for key, analysis in results:
+            cache["entries"][key] = {"analysis": analysis}
+        for key in set(keys.values()):
+            cache["seq"] += 1
+            cache["entries"][key]["seq"] = cache["seq"]
+        save_cache(cache)
+
+    analyses = {path: cache["entries"][key]["analysis"] for path, key in keys.items()}
+    return analyses, {"files": len(keys), "analyzed": len(jobs), "cached": len(keys) - len(jobs)}
+
+
+# ---------------------------------------------------------------------------
+# File selection
+# ---------------------------------------------------------------------------
+
+def git_lines(args: list[str]) -> list[str]:
+    result = subprocess.run(["git"] + args, capture_output=True, text=True)
+    return [line for line in result.stdout.splitlines() if line] if result.returncode == 0 else []
+
+
+def select_files(paths: list[str], changed: bool = False, base: str = "HEAD",
+                 include_tests: bool = False) -> list[str]:
+    if changed:
+        root = (git_lines(["rev-parse", "--show-toplevel"]) or ["."])[0]
+        names = git_lines(["diff", "--name-only", "--diff-filter=AMR", base]) + \
+            git_lines(["ls-files", "--others", "--exclude-standard"])
+        candidates = [os.path.join(root, name) for name in dict.fromkeys(names)]
+    else:
+        candidates = []
+        for path in paths or ["."]:
+            if os.path.isdir(path):
+                tracked = git_lines(["-C", path, "ls-files"])
+                if tracked:
+                    candidates.extend(os.path.join(path, name) for name in tracked)
+                else:
+                    for dirpath, dirnames, filenames in os.walk(path):
+                        dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "node_modules"]
+                        candidates.extend(os.path.join(dirpath, name) for name in filenames)
+            else:
+                candidates.append(path)
+
+    selected = []
+    for path in candidates:
+        name = os.path.basename(path).lower()
+        if Path(path).suffix.lower() not in CODE_EXTENSIONS or not os.path.isfile(path):
+            continue
+        if not include_tests and (name.startswith("test_") or ".test." in name or ".spec." in name
+                                  or name.endswith("_test.py") or name.endswith("_test.go")):
+            continue
+        selected.append(os.path.abspath(path))
+    return selected
+
+
+# ---------------------------------------------------------------------------
+# Reports
+# ---------------------------------------------------------------------------
+
+def file_totals(analysis: dict) -> dict:
+    functions = analysis["functions"]
+    return {
+        "cyclomatic_complexity": sum(f["complexity"] for f in functions),
+        "max_nesting_depth": max((f["nesting"] for f in functions), default=0),
+        "lines": analysis["lines"],
+        "functions": len(functions),
+    }
+
+
+def hotspots(analyses: dict, limit: int = 20) -> list[dict]:
+    """Functions over any threshold, ranked by how far over they are."""
+    ranked = []
+    for path, analysis in analyses.items():
+        for function in analysis["functions"]:
+            reasons = []
+            if function["complexity"] > COMPLEXITY_LIMIT:
+                reasons.append(f"complexity {function['complexity']} > {COMPLEXITY_LIMIT}")
+            if function["lines"] > LINES_LIMIT:
+                reasons.append(f"{function['lines']} lines > {LINES_LIMIT}")
+            if function["nesting"] > NESTING_LIMIT:
+                reasons.append(f"nesting {function['nesting']} > {NESTING_LIMIT}")
+            if not reasons:
+                continue
+            score = (function["complexity"] / COMPLEXITY_LIMIT + function["lines"] / LINES_LIMIT
+                     + function["nesting"] / NESTING_LIMIT)
+            ranked.append(dict(function, file=path, score=round(score, 2), reasons=reasons))
+    ranked.sort(key=lambda f: -f["score"])
+    return ranked[:limit]
+
+
+def update_state(mutate) -> dict:
+    """Apply mutate(state) under the hooks' state lock."""
+    if not APEX_STATE.exists():
+        return {}
+    with open(f"{APEX_STATE}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with open(APEX_STATE) as f:
+            state = json.load(f)
+        result = mutate(state)
+        tmp_path = APEX_STATE.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, APEX_STATE)
+    return result
+
+
+def load_baseline() -> dict:
+    if not APEX_STATE.exists():
+        return {}
+    with open(APEX_STATE) as f:
+        return (json.load(f).get("simplification") or {}).get("baseline") or {}
+
+
+def record_baseline(analyses: dict) -> dict:
+    baseline = {path: file_totals(analysis) for path, analysis in analyses.items()}
+
+    def mutate(state: dict) -> dict:
+        state.setdefault("simplification", {})["baseline"] = baseline
+        return {"files": len(baseline)}
+
+    return update_state(mutate) or {"files": len(baseline), "state": "not found"}
+
+
+def compute_delta(analyses: dict) -> dict:
+    """Compare against the recorded baseline and credit the reduction to state."""
+
+    def mutate(state: dict) -> dict:
+        simplification = state.setdefault("simplification", {})
+        baseline = simplification.pop("baseline", {}) or {}
+        files, reduced = [], 0
+        for path, before in baseline.items():
+            analysis = analyses.get(path)
+            if analysis is None:
+                continue
+            after = file_totals(analysis)
+            change = before["cyclomatic_complexity"] - after["cyclomatic_complexity"]
+            improvements = []
+            if change > 0 and before["cyclomatic_complexity"]:
+                improvements.append(f"Reduced complexity by {round(100 * change / before['cyclomatic_complexity'])}%")
+            if after["functions"] > before["functions"]:
+                improvements.append(f"Extracted {after['functions'] - before['functions']} helper functions")
+            if after["max_nesting_depth"] < before["max_nesting_depth"]:
+                improvements.append(f"Reduced nesting from {before['max_nesting_depth']} "
+                                    f"to {after['max_nesting_depth']} levels")
+            files.append({"file": path, "before": before, "after": after, "improvements": improvements})
+            reduced += max(change, 0)
+
+        simplification["last_run"] = datetime.utcnow().isoformat() + "Z"
+        simplified = [f["file"] for f in files if f["improvements"]]
+        simplification["files_simplified"] = sorted(set(simplification.get("files_simplified", [])) | set(simplified))
+        simplification["total_complexity_reduced"] = simplification.get("total_complexity_reduced", 0) + reduced
+        return {"files": files, "complexity_reduced": reduced,
+                "total_complexity_reduced": simplification["total_complexity_reduced"]}
+
+    result = update_state(mutate)
+    return result or {"success": False, "error": f"No state at {APEX_STATE}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Complexity Analyzer")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    for name, help_text in (("analyze", "Rank complexity hotspots"),
+                            ("baseline", "Record per-file totals before simplifying"),
+                            ("delta", "Compare with the baseline and update simplification state")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("paths", nargs="*", help="Files or directories (default: current directory)")
+        sub.add_argument("--changed", action="store_true", help="Only files changed against --base (plus untracked)")
+        sub.add_argument("--base", default="HEAD", help="Base ref for --changed")
+        sub.add_argument("--include-tests", action="store_true", help="Also analyze test files")
+        sub.add_argument("--workers", type=int, help="Process pool size for cache misses")
+        if name == "analyze":
+            sub.add_argument("--limit", type=int, default=20, help="Maximum hotspots")
+            sub.add_argument("--functions", action="store_true", help="Include every function per file")
+
+    args = parser.parse_args()
+
+    files = select_files(args.paths, args.changed, args.base, args.include_tests)
+    if args.action == "delta":
+        # Files from the baseline are always re-measured, even if unchanged since
+        files = sorted(set(files) | {p for p in load_baseline() if os.path.isfile(p)})
+    analyses, cache_stats = analyze_files(files, args.workers)
+
+    if args.action == "baseline":
+        result = record_baseline(analyses)
+    elif args.action == "delta":
+        result = compute_delta(analyses)
+    else:
+        result = {
+            "hotspots": hotspots(analyses, args.limit),
+            "totals": {path: file_totals(analysis) for path, analysis in analyses.items()},
+            "errors": {path: a["error"] for path, a in analyses.items() if a["engine"] == "error"},
+        }
+        if args.functions:
+            result["functions"] = {path: a["functions"] for path, a in analyses.items()}
+    result["cache"] = cache_stats
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success", True) else 1)
+
+
+if __name__ == "__main__":
+    main()
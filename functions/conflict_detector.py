@@ -6,40 +6,34 @@ Detects file conflicts between parallel swarm workers.
 
 import argparse
 import json
-import subprocess
 import sys
-from pathlib import Path
+
+import git_helper
 
 
 def run_git(args: list[str], cwd: str = None) -> tuple[bool, str]:
     """Run git command and return (success, output)."""
-    try:
-        result = subprocess.run(
-            ["git"] + args,
-            cwd=cwd,
-            capture_output=True,
-            text=True
-        )
-        return result.returncode == 0, result.stdout.strip()
-    except Exception as e:
-        return False, str(e)
+    return git_helper.run(args, cwd=cwd)
 
 
 def get_repo_root() -> str:
     """Get the root of the current git repository."""
-    success, output = run_git(["rev-parse", "--show-toplevel"])
-    if not success:
+    root = git_helper.repo_root()
+    if root is None:
         print("Error: Not in a git repository", file=sys.stderr)
         sys.exit(1)
-    return output
+    return root
 
 
 def get_changed_files(branch: str, base: str = "HEAD") -> set[str]:
     """Get files changed on a branch compared to base."""
-    success, output = run_git(["diff", "--name-only", f"{base}...{branch}"])
-    if not success:
-        return set()
-    return set(output.split("\n")) if output else set()
+    return git_helper.diff_names(base, branch) or set()
+
+
+def get_changed_files_many(branches: list[str], base: str = "HEAD") -> dict[str, set[str]]:
+    """get_changed_files for several branches, diffing in parallel."""
+    changed = git_helper.diff_names_many(base, branches)
+    return {branch: files or set() for branch, files in changed.items()}
 
 
 def detect_conflicts(workers: list[int], base_branch: str = "main") -> dict:
@@ -47,11 +41,8 @@ def detect_conflicts(workers: list[int], base_branch: str = "main") -> dict:
     repo_root = get_repo_root()
     
     # Get changed files for each worker
-    worker_files = {}
-    for worker_id in workers:
-        branch = f"apex-swarm-{worker_id}"
-        files = get_changed_files(branch, base_branch)
-        worker_files[worker_id] = files
+    changed = get_changed_files_many([f"apex-swarm-{w}" for w in workers], base_branch)
+    worker_files = {w: changed[f"apex-swarm-{w}"] for w in workers}
     
     # Find overlaps
     conflicts = []
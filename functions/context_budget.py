@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+APEX Context Budget
+Keep context_budget in apex-state.json in step with what the session has
+actually pulled into context.
+
+The metrics hook pipes every content-loading tool call (Read, searches,
+graph queries, shell output) to `hook`, which estimates the tokens the
+result added and files it under a breakdown category:
+
+- apex_core: APEX docs and command files (APEX*.md, commands/, skills/)
+- active_context: the planning files (task_plan.md, notes.md, ...)
+- working_memory: source files, search and graph query results, output
+
+Estimates come from a local word/symbol count (no tokenizer) and are cached
+per content hash in token-cache.json next to the state file; a Read of a
+file whose mtime and size are unchanged skips reading it altogether.
+
+When usage crosses warning_threshold or critical_threshold the hook prints
+a warning with the loaded entries that are the cheapest to give up first.
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+APEX_STATE_DIR = Path(os.environ.get("APEX_STATE_DIR", Path.home() / ".config" / "opencode" / "apex" / "state"))
+APEX_STATE = Path(os.environ.get("APEX_STATE", APEX_STATE_DIR / "apex-state.json"))
+
+SYSTEM_TOKENS = 5000       # system/instructions overhead when the state has none
+CACHE_MAX = 2000           # content hashes kept in token-cache.json
+MAX_ENTRIES = 300          # files_loaded entries; older ones fold into .overflow
+MAX_SCAN_CHARS = 2_000_000  # beyond this, estimate from length alone
+CATEGORIES = ("system", "apex_core", "active_context", "working_memory")
+PLANNING_FILES = {"task_plan.md", "notes.md", "deliverable.md", "progress.md", "findings.md"}
+GRAPH_TOOLS = {"query_code_graph", "get_code_snippet", "grepai_search", "grepai_trace"}
+# Order in which categories are suggested for eviction
+EVICT_ORDER = {"working_memory": 0, "active_context": 1, "apex_core": 2}
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate BPE token count: word runs cost one token per ~4 characters,
+    symbol runs one per ~2 (code punctuation rarely merges), each newline one.
+    """
+    if len(text) > MAX_SCAN_CHARS:
+        return math.ceil(len(text) / 4)
+    tokens = text.count("\n")
+    for match in TOKEN_RE.finditer(text):
+        run = match.group()
+        tokens += (len(run) + 3) // 4 if run[0].isalnum() or run[0] == "_" else (len(run) + 1) // 2
+    return tokens
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Token cache
+# ---------------------------------------------------------------------------
+
+def cache_path(state_path: Path) -> Path:
+    return state_path.parent / "token-cache.json"
+
+
+def load_token_cache(path: Path) -> dict:
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"hashes": {}, "files": {}}
+    cache.setdefault("hashes", {})
+    cache.setdefault("files", {})
+    return cache
+
+
+def save_token_cache(cache: dict, path: Path):
+    for key in ("hashes", "files"):
+        excess = len(cache[key]) - CACHE_MAX
+        for old in list(cache[key])[:max(0, excess)]:
+            del cache[key][old]
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def cached_estimate(cache: dict, text: str) -> tuple[str, int, bool]:
+    """(hash, tokens, cache hit) for a piece of content."""
+    digest = content_hash(text)
+    if digest in cache["hashes"]:
+        return digest, cache["hashes"][digest], True
+    tokens = estimate_tokens(text)
+    cache["hashes"][digest] = tokens
+    return digest, tokens, False
+
+
+def read_slice(path: str, offset: int = 0, limit: int = 0) -> str:
+    with open(path, errors="replace") as f:
+        if not offset and not limit:
+            return f.read()
+        lines = f.readlines()
+    start = max(offset - 1, 0) if offset else 0
+    return "".join(lines[start:start + limit] if limit else lines[start:])
+
+
+def estimate_file(cache: dict, path: str, offset: int = 0, limit: int = 0) -> tuple[str, int, bool]:
+    """Like cached_estimate, but an unchanged file (mtime, size) is not even read."""
+    stat = os.stat(path)
+    key = f"{path}:{offset}:{limit}"
+    signature = [stat.st_mtime_ns, stat.st_size]
+    known = cache["files"].get(key)
+    if known and known[:2] == signature and known[2] in cache["hashes"]:
+        return known[2], cache["hashes"][known[2]], True
+    digest, tokens, hit = cached_estimate(cache, read_slice(path, offset, limit))
+    cache["files"].pop(key, None)
+    cache["files"][key] = signature + [digest]
+    return digest, tokens, hit
+
+
+# ---------------------------------------------------------------------------
+# Accounting
+# ---------------------------------------------------------------------------
+
+def categorize(kind: str, key: str) -> str:
+    if kind != "file":
+        return "working_memory"
+    path = Path(key)
+    if path.name in PLANNING_FILES:
+        return "active_context"
+    if path.name.startswith("APEX") and path.suffix == ".md":
+        return "apex_core"
+    parts = path.parts
+    if path.suffix == ".md" and ("apex" in parts or "commands" in parts or "skills" in parts):
+        return "apex_core"
+    return "working_memory"
+
+
+def budget_section(state: dict) -> dict:
+    budget = state.get("context_budget") or {}
+    state["context_budget"] = budget
+    budget.setdefault("total", 200000)
+    budget.setdefault("warning_threshold", 0.70)
+    budget.setdefault("critical_threshold", 0.85)
+    budget.setdefault("files_loaded", [])
+    return budget
+
+
+def level_for(budget: dict, used: int) -> str:
+    ratio = used / budget["total"] if budget["total"] else 0.0
+    if ratio >= budget["critical_threshold"]:
+        return "critical"
+    if ratio >= budget["warning_threshold"]:
+        return "warning"
+    return "ok"
+
+
+def recompute(budget: dict):
+    """used and breakdown from files_loaded (plus overflow and system overhead)."""
+    breakdown = {name: 0 for name in CATEGORIES}
+    breakdown["system"] = (budget.get("breakdown") or {}).get("system") or SYSTEM_TOKENS
+    for name, tokens in (budget.get("overflow") or {}).items():
+        breakdown[name] = breakdown.get(name, 0) + tokens
+    for entry in budget["files_loaded"]:
+        category = entry.get("category") or categorize(entry.get("kind", "file"), entry.get("path", ""))
+        breakdown[category] = breakdown.get(category, 0) + entry.get("tokens", 0)
+    budget["breakdown"] = breakdown
+    estimated = sum(breakdown.values())
+    budget["estimated"] = estimated
+    # The model's own input token count, when the hook payload carries it, is the ground truth
+    budget["used"] = max(estimated, budget.get("observed") or 0)
+
+
+def record_load(budget: dict, kind: str, key: str, digest: str, tokens: int, call: int):
+    """Add one load to files_loaded; a repeat load of the same content counts again."""
+    entries = budget["files_loaded"]
+    entry = next((e for e in entries if e.get("path") == key), None)
+    if entry is None:
+        entry = {"path": key, "kind": kind, "category": categorize(kind, key),
+                 "size": tokens, "tokens": 0, "loads": 0, "hash": digest, "first_call": call}
+        entries.append(entry)
+    else:
+        entries.remove(entry)
+        entries.append(entry)
+    if entry.get("hash") != digest:
+        entry["stale_tokens"] = entry.get("stale_tokens", 0) + entry.get("size", 0)
+    entry.update({"hash": digest, "size": tokens, "last_call": call,
+                  "tokens": entry.get("tokens", 0) + tokens, "loads": entry.get("loads", 0) + 1})
+
+    if len(entries) > MAX_ENTRIES:
+        overflow = budget.setdefault("overflow", {})
+        for old in entries[:len(entries) - MAX_ENTRIES]:
+            category = old.get("category") or categorize(old.get("kind", "file"), old.get("path", ""))
+            overflow[category] = overflow.get(category, 0) + old.get("tokens", 0)
+        del entries[:len(entries) - MAX_ENTRIES]
+
+
+def suggest_evictions(budget: dict, target_ratio: float = None) -> list[dict]:
+    """
+    Entries to unload, cheapest first, until usage is back under target_ratio
+    (default: the warning threshold): repeat copies and stale versions, then
+    working memory before active context before APEX docs, least recently used first.
+    """
+    target_ratio = budget["warning_threshold"] if target_ratio is None else target_ratio
+    needed = budget["used"] - int(budget["total"] * target_ratio)
+    if needed <= 0:
+        return []
+    suggestions = []
+    reclaimed = 0
+    entries = budget["files_loaded"]
+
+    for entry in sorted(entries, key=lambda e: -(e.get("tokens", 0) - e.get("size", e.get("tokens", 0)))):
+        extra = entry.get("tokens", 0) - entry.get("size", entry.get("tokens", 0))
+        if extra <= 0 or reclaimed >= needed:
+            break
+        reason = f"loaded {entry.get('loads', 1)} times"
+        if entry.get("stale_tokens"):
+            reason += ", earlier copies are stale"
+        suggestions.append({"path": entry["path"], "tokens": extra, "category": entry.get("category"),
+                            "action": "drop_copies", "reason": reason})
+        reclaimed += extra
+
+    ranked = sorted(entries, key=lambda e: (EVICT_ORDER.get(e.get("category"), 0),
+                                            e.get("last_call", 0), -e.get("size", e.get("tokens", 0))))
+    for entry in ranked:
+        if reclaimed >= needed:
+            break
+        size = entry.get("size", entry.get("tokens", 0))
+        if size <= 0:
+            continue
+        if entry.get("kind") in ("graph", "output"):
+            reason = "raw results: keep a summary, discard the rest"
+        elif entry.get("category") == "apex_core":
+            reason = "APEX doc: reload when the phase needs it"
+        else:
+            reason = f"last used at call {entry.get('last_call', 0)}"
+        suggestions.append({"path": entry["path"], "tokens": size, "category": entry.get("category"),
+                            "action": "unload", "reason": reason})
+        reclaimed += size
+    return suggestions
+
+
+def apply_load(state: dict, kind: str, key: str, digest: str, tokens: int, observed: int = 0) -> dict:
+    budget = budget_section(state)
+    call = state.get("circuit_breakers", {}).get("tool_calls", {}).get("cycle_current", 0)
+    record_load(budget, kind, key, digest, tokens, call)
+    if observed:
+        budget["observed"] = observed
+    return settle(budget)
+
+
+def settle(budget: dict) -> dict:
+    """Recompute totals, move the level and report a threshold crossing."""
+    previous = budget.get("level", "ok")
+    recompute(budget)
+    level = level_for(budget, budget["used"])
+    budget["level"] = level
+    budget["last_check"] = datetime.utcnow().isoformat() + "Z"
+    rank = {"ok": 0, "warning": 1, "critical": 2}
+    crossed = level if rank[level] > rank.get(previous, 0) else None
+    return {
+        "used": budget["used"],
+        "total": budget["total"],
+        "ratio": round(budget["used"] / budget["total"], 3) if budget["total"] else 0.0,
+        "level": level,
+        "crossed": crossed,
+        "evict": suggest_evictions(budget) if crossed else [],
+    }
+
+
+# ---------------------------------------------------------------------------
+# State I/O
+# ---------------------------------------------------------------------------
+
+def write_state(state: dict, state_path: Path):
+    tmp_path = state_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def locked_update(state_path: Path, mutate) -> dict:
+    with open(f"{state_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with open(state_path) as f:
+            state = json.load(f)
+        result = mutate(state)
+        write_state(state, state_path)
+    return result
+
+
+def response_text(value) -> str:
+    """All string content of a tool response, however it is nested."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return "\n".join(response_text(v) for v in value.values())
+    if isinstance(value, list):
+        return "\n".join(response_text(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def describe_call(tool: str, tool_input: dict) -> str:
+    """Short stable key for a non-file load: tool plus its first string argument."""
+    for name in ("query", "pattern", "command", "url", "symbol", "qualified_name", "path"):
+        if isinstance(tool_input.get(name), str):
+            return f"{tool}:{tool_input[name][:80]}"
+    return f"{tool}:{json.dumps(tool_input, sort_keys=True)[:80]}"
+
+
+def measure_payload(payload: dict, cache: dict):
+    """(kind, key, hash, tokens) for a PostToolUse payload, or None if it loaded nothing."""
+    tool = payload.get("tool_name") or ""
+    tool_input = payload.get("tool_input") if isinstance(payload.get("tool_input"), dict) else {}
+    if payload.get("error") not in (None, "", "null"):
+        return None
+    if tool == "Read" and tool_input.get("file_path"):
+        path = os.path.abspath(tool_input["file_path"])
+        try:
+            digest, tokens, _ = estimate_file(cache, path, int(tool_input.get("offset") or 0),
+                                              int(tool_input.get("limit") or 0))
+            return "file", path, digest, tokens
+        except (OSError, ValueError):
+            pass
+    text = response_text(payload.get("tool_response", payload.get("tool_output")))
+    if not text:
+        return None
+    kind = "graph" if tool in GRAPH_TOOLS else "output"
+    digest, tokens, _ = cached_estimate(cache, text)
+    return kind, describe_call(tool, tool_input), digest, tokens
+
+
+def hook(payload: dict, state_path: Path) -> dict:
+    tokens_cache = cache_path(state_path)
+    cache = load_token_cache(tokens_cache)
+    measured = measure_payload(payload, cache)
+    if measured is None:
+        return {"success": True, "recorded": False}
+    save_token_cache(cache, tokens_cache)
+    usage = payload.get("usage") or {}
+    # Prompt size as the model saw it: cached prefix reads count toward the window too
+    observed = sum(int(usage.get(name) or 0) for name in
+                   ("input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"))
+    result = locked_update(state_path, lambda state: apply_load(state, *measured, observed=observed))
+    return {"success": True, "recorded": True, "path": measured[1], "tokens": measured[3], **result}
+
+
+def record(state_path: Path, kind: str, key: str, text: str = None) -> dict:
+    """Account for content loaded outside the hooked tools (a command doc, a pasted result)."""
+    tokens_cache = cache_path(state_path)
+    cache = load_token_cache(tokens_cache)
+    if text is None:
+        key = os.path.abspath(key)
+        digest, tokens, _ = estimate_file(cache, key)
+    else:
+        digest, tokens, _ = cached_estimate(cache, text)
+    save_token_cache(cache, tokens_cache)
+    result = locked_update(state_path, lambda state: apply_load(state, kind, key, digest, tokens))
+    return {"success": True, "path": key, "tokens": tokens, **result}
+
+
+def evict(state_path: Path, paths: list[str]) -> dict:
+    """Forget entries once their content has been summarized or compacted away."""
+    def mutate(state):
+        budget = budget_section(state)
+        wanted = set(paths) | {os.path.abspath(p) for p in paths}
+        recompute(budget)
+        before = budget["used"]
+        budget["files_loaded"] = [e for e in budget["files_loaded"] if e.get("path") not in wanted]
+        budget["observed"] = 0  # the next payload with usage re-establishes it
+        result = settle(budget)
+        return {"success": True, "freed": max(0, before - result["used"]), **result}
+
+    return locked_update(state_path, mutate)
+
+
+def reset(state_path: Path) -> dict:
+    """Start accounting from scratch (after /compact or a new session)."""
+    def mutate(state):
+        budget = budget_section(state)
+        budget.update({"files_loaded": [], "overflow": {}, "observed": 0, "level": "ok"})
+        return {"success": True, **settle(budget)}
+
+    return locked_update(state_path, mutate)
+
+
+def status(state_path: Path, suggest: bool = False) -> dict:
+    with open(state_path) as f:
+        state = json.load(f)
+    budget = budget_section(state)
+    recompute(budget)
+    entries = sorted(budget["files_loaded"], key=lambda e: -e.get("tokens", 0))
+    result = {
+        "success": True,
+        "used": budget["used"],
+        "total": budget["total"],
+        "ratio": round(budget["used"] / budget["total"], 3) if budget["total"] else 0.0,
+        "level": level_for(budget, budget["used"]),
+        "breakdown": budget["breakdown"],
+        "entries": len(entries),
+        "largest": [{k: e.get(k) for k in ("path", "category", "tokens", "loads")} for e in entries[:10]],
+    }
+    if suggest:
+        result["evict"] = suggest_evictions(budget)
+    return result
+
+
+def format_warning(result: dict) -> str:
+    lines = [f"⚠️  APEX context {result['level'].upper()}: ~{result['used']:,} of "
+             f"{result['total']:,} tokens ({result['ratio']:.0%})"]
+    for item in result["evict"][:5]:
+        lines.append(f"   - {item['action']} {item['path']} (~{item['tokens']:,} tokens): {item['reason']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Context Budget")
+    parser.add_argument("--state", help="apex-state.json path (default: APEX_STATE)")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    subparsers.add_parser("hook", help="Account for a PostToolUse payload on stdin (the metrics hook does this)")
+
+    record_parser = subparsers.add_parser("record", help="Account for a file or text loaded into context")
+    record_parser.add_argument("key", help="File path, or a label with --text/--stdin")
+    record_parser.add_argument("--kind", choices=["file", "graph", "output"], default="file")
+    record_parser.add_argument("--text", help="Content loaded (default: read the file)")
+    record_parser.add_argument("--stdin", action="store_true", help="Read the content from stdin")
+
+    status_parser = subparsers.add_parser("status", help="Usage, breakdown and largest entries")
+    status_parser.add_argument("--suggest", action="store_true", help="Include eviction suggestions")
+
+    evict_parser = subparsers.add_parser("evict", help="Drop entries that were summarized or unloaded")
+    evict_parser.add_argument("paths", nargs="+")
+
+    subparsers.add_parser("reset", help="Clear the accounting (after /compact)")
+
+    estimate_parser = subparsers.add_parser("estimate", help="Token estimate for files (no state)")
+    estimate_parser.add_argument("files", nargs="+")
+
+    args = parser.parse_args()
+    state_path = Path(args.state) if args.state else APEX_STATE
+
+    if args.action == "estimate":
+        estimates = {}
+        for name in args.files:
+            try:
+                estimates[name] = estimate_tokens(read_slice(name))
+            except OSError as e:
+                estimates[name] = None
+                print(f"{name}: {e}", file=sys.stderr)
+        print(json.dumps({"success": True, "tokens": estimates, "total": sum(v or 0 for v in estimates.values())},
+                         indent=2))
+        return
+
+    if not state_path.exists():
+        print(json.dumps({"success": False, "error": f"No state at {state_path}"}, indent=2))
+        sys.exit(1)
+
+    if args.action == "hook":
+        try:
+            payload = json.loads(sys.stdin.read() or "{}")
+        except json.JSONDecodeError:
+            payload = {}
+        result = hook(payload if isinstance(payload, dict) else {}, state_path)
+        if result.get("crossed"):
+            print(format_warning(result), file=sys.stderr)
+    elif args.action == "record":
+        text = sys.stdin.read() if args.stdin else args.text
+        try:
+            result = record(state_path, args.kind, args.key, text)
+        except OSError as e:
+            result = {"success": False, "error": str(e)}
+    elif args.action == "status":
+        result = status(state_path, args.suggest)
+    elif args.action == "evict":
+        result = evict(state_path, args.paths)
+    else:
+        result = reset(state_path)
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success") else 1)
+
+
+if __name__ == "__main__":
+    main()
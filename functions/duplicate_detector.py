@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+APEX Duplicate Detector
+Swarm-wide duplicate-work detection: flags workers whose edits converge.
+
+Each worker's changes since it branched (committed plus uncommitted) are
+reduced to hunk fingerprints: a hash of the file path and the hunk's
+removed/added lines, whitespace-normalized so the same edit at a shifted
+offset still matches. All workers share one inverted index
+(fingerprint -> workers) plus per-worker overlap counters, so refreshing a
+worker touches only its own changed fingerprints and the few workers that
+share them. The index is sharded on disk (per worker, and postings by
+fingerprint prefix), so an update reads and rewrites only those pieces
+rather than the whole swarm's index.
+
+A pair is flagged once it shares at least MIN_SHARED fingerprints and
+that covers `threshold` of the smaller worker's hunks. The smaller worker
+is the suggested one to cancel (least work lost).
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+from collections.abc import MutableMapping
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+import git_helper
+from worktree_manager import APEX_STATE_DIR, load_swarm_queue
+
+DUPLICATE_INDEX = APEX_STATE_DIR / "duplicate-index"
+DEFAULT_THRESHOLD = 0.5
+MIN_SHARED = 3
+MIN_HUNK_CHARS = 16  # hunks smaller than this (a brace, a blank line) say nothing
+
+
+def normalize(line: str) -> str:
+    return " ".join(line.split())
+
+
+def parse_diff(diff: str) -> dict[str, list[str]]:
+    """`git diff -U0` output -> {path: [hunk fingerprint, ...]}."""
+    hunks = {}
+    path = None
+    body = []
+
+    def flush():
+        text = "\n".join(body)
+        if path and len(text.replace("\n", "").replace(" ", "")) >= MIN_HUNK_CHARS:
+            digest = hashlib.sha1(f"{path}\0{text}".encode()).hexdigest()[:16]
+            hunks.setdefault(path, []).append(digest)
+        body.clear()
+
+    for line in diff.split("\n"):
+        if line.startswith("diff --git "):
+            flush()
+            path = None
+        elif line.startswith("+++ "):
+            target = line[4:]
+            path = target[2:] if target.startswith("b/") else None
+        elif line.startswith("--- "):
+            continue
+        elif line.startswith("@@"):
+            flush()
+        elif path and line[:1] in ("+", "-"):
+            body.append(line[0] + normalize(line[1:]))
+    flush()
+    return hunks
+
+
+def untracked_fingerprints(root: str) -> dict[str, list[str]]:
+    """New files not yet added count as one hunk each."""
+    success, output = git_helper.run(["ls-files", "--others", "--exclude-standard", "-z"], cwd=root)
+    hunks = {}
+    for name in output.split("\0") if success else []:
+        if not name:
+            continue
+        try:
+            content = Path(root, name).read_text(errors="replace")
+        except OSError:
+            continue
+        text = "\n".join("+" + normalize(line) for line in content.splitlines())
+        if len(text.replace("\n", "").replace(" ", "")) >= MIN_HUNK_CHARS:
+            hunks[name] = [hashlib.sha1(f"{name}\0{text}".encode()).hexdigest()[:16]]
+    return hunks
+
+
+class BaseError(Exception):
+    pass
+
+
+def main_worktree_branch(root: str):
+    """Branch checked out in the repository's main worktree (where the swarm was started)."""
+    success, output = git_helper.run(["worktree", "list", "--porcelain"], cwd=root)
+    if not success:
+        return None
+    for line in output.split("\n"):
+        if line.startswith("branch "):
+            return line[len("branch "):]
+        if not line:
+            break  # end of the first (main) worktree block
+    return None
+
+
+def resolve_base(root: str, worker: str = None, base: str = None) -> str:
+    """
+    What the worker forked from: an explicit base, else the base recorded in
+    the swarm queue when the worker was created, else origin/HEAD, else the
+    branch of the main worktree. Raises BaseError when nothing resolves.
+    """
+    if base:
+        if git_helper.resolve_ref(base, root) is None:
+            raise BaseError(f"Base {base} does not resolve in {root}")
+        return base
+    info = load_swarm_queue().get("workers", {}).get(str(worker), {}) if worker is not None else {}
+    success, origin_head = git_helper.run(["symbolic-ref", "-q", "refs/remotes/origin/HEAD"], cwd=root)
+    candidates = [info.get("base_commit"), info.get("base"), origin_head if success else None,
+                  main_worktree_branch(root)]
+    for candidate in candidates:
+        if candidate and git_helper.resolve_ref(candidate, root):
+            return candidate
+    raise BaseError(f"Cannot tell what worker {worker} forked from; pass --base")
+
+
+def worktree_fingerprints(path: str, base: str = None, worker: str = None) -> dict[str, list[str]]:
+    """Hunk fingerprints for everything the worktree changed since it left base."""
+    root = git_helper.repo_root(path)
+    if root is None:
+        raise BaseError(f"Not a git worktree: {path}")
+    base = resolve_base(root, worker, base)
+    success, fork_point = git_helper.run(["merge-base", base, "HEAD"], cwd=root)
+    if not success:
+        # Diffing against HEAD instead would silently drop every committed change
+        raise BaseError(f"No merge base between {base} and HEAD in {root}")
+    success, diff = git_helper.run(["diff", "-U0", "--no-color", "--no-ext-diff", fork_point], cwd=root)
+    if not success:
+        raise BaseError(f"git diff failed in {root}")
+    hunks = parse_diff(diff)
+    for name, fingerprints in untracked_fingerprints(root).items():
+        hunks.setdefault(name, []).extend(fingerprints)
+    return hunks
+
+
+class ShardedMap(MutableMapping):
+    """
+    A dict spread over small JSON files in one directory, loaded on first
+    touch and written back only if touched. Any access marks the shard
+    dirty, since callers mutate the lists/dicts they get back in place.
+    """
+
+    def __init__(self, directory: Path, shard_of):
+        self.directory = directory
+        self.shard_of = shard_of
+        self.shards = {}
+        self.dirty = set()
+
+    def _file(self, name: str) -> Path:
+        return self.directory / f"{quote(name, safe='')}.json"
+
+    def _shard(self, key: str) -> dict:
+        name = self.shard_of(key)
+        if name not in self.shards:
+            try:
+                with open(self._file(name)) as f:
+                    self.shards[name] = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self.shards[name] = {}
+        self.dirty.add(name)
+        return self.shards[name]
+
+    def __getitem__(self, key):
+        return self._shard(key)[key]
+
+    def __setitem__(self, key, value):
+        self._shard(key)[key] = value
+
+    def __delitem__(self, key):
+        del self._shard(key)[key]
+
+    def __contains__(self, key):
+        return key in self._shard(key)
+
+    def __iter__(self):
+        names = {unquote(path.stem) for path in self.directory.glob("*.json")} | set(self.shards)
+        for name in sorted(names):
+            # Shard names are keys themselves or prefixes of them; load each once
+            shard = self.shards.get(name)
+            if shard is None:
+                try:
+                    with open(self._file(name)) as f:
+                        shard = self.shards[name] = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    continue
+            yield from list(shard)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def flush(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name in self.dirty:
+            path = self._file(name)
+            shard = self.shards.get(name)
+            if not shard:
+                if path.exists():
+                    path.unlink()
+                continue
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(shard, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        self.dirty.clear()
+
+
+def load_index(path: Path = None) -> dict:
+    """
+    The shared index, sharded on disk so an update reads and writes only
+    the files it touches:
+
+        workers/<worker>.json   that worker's fingerprints and files
+        shared/<worker>.json    hunks it shares with each other worker
+        postings/<xx>.json      fingerprint -> workers, by 2-hex-digit prefix
+    """
+    path = path or DUPLICATE_INDEX
+    return {
+        "workers": ShardedMap(path / "workers", lambda worker: worker),
+        "shared": ShardedMap(path / "shared", lambda worker: worker),
+        "postings": ShardedMap(path / "postings", lambda fp: fp[:2]),
+    }
+
+
+def empty_index() -> dict:
+    return {"workers": {}, "postings": {}, "shared": {}}
+
+
+def save_index(index: dict, path: Path = None):
+    for part in index.values():
+        if isinstance(part, ShardedMap):
+            part.flush()
+
+
+def apply_update(index: dict, worker: str, hunks: dict[str, list[str]]) -> None:
+    """Swap in a worker's fingerprints, adjusting only the postings and counters they touch."""
+    postings = index["postings"]
+    shared = index["shared"]
+    previous = index["workers"].get(worker, {})
+    old = set(previous.get("fingerprints", []))
+    new = {fp for fingerprints in hunks.values() for fp in fingerprints}
+
+    for fp in old - new:
+        holders = postings.get(fp, [])
+        if worker in holders:
+            holders.remove(worker)
+        for other in holders:
+            for a, b in ((worker, other), (other, worker)):
+                count = shared.get(a, {}).get(b, 0) - 1
+                if count > 0:
+                    shared[a][b] = count
+                elif a in shared:
+                    shared[a].pop(b, None)
+                    if not shared[a]:
+                        del shared[a]
+        if not holders:
+            postings.pop(fp, None)
+
+    for fp in new - old:
+        holders = postings.setdefault(fp, [])
+        for other in holders:
+            shared.setdefault(worker, {})[other] = shared.get(worker, {}).get(other, 0) + 1
+            shared.setdefault(other, {})[worker] = shared.get(other, {}).get(worker, 0) + 1
+        holders.append(worker)
+
+    if new:
+        index["workers"][worker] = {
+            "fingerprints": sorted(new),
+            "files": sorted(hunks),
+            "updated_at": datetime.utcnow().isoformat() + "Z",
+        }
+    else:
+        index["workers"].pop(worker, None)
+
+
+def pair_report(index: dict, a: str, b: str, threshold: float) -> dict:
+    workers = index["workers"]
+    size_a = len(workers.get(a, {}).get("fingerprints", []))
+    size_b = len(workers.get(b, {}).get("fingerprints", []))
+    count = index["shared"].get(a, {}).get(b, 0)
+    overlap = count / min(size_a, size_b) if min(size_a, size_b) else 0.0
+    files = sorted(set(workers.get(a, {}).get("files", [])) & set(workers.get(b, {}).get("files", [])))
+    return {
+        "workers": sorted([a, b], key=lambda w: (len(w), w)),
+        "shared_hunks": count,
+        "overlap": round(overlap, 3),
+        "files": files[:10],
+        "duplicate": count >= MIN_SHARED and overlap >= threshold,
+        "suggest_cancel": a if (size_a, a) <= (size_b, b) else b,
+    }
+
+
+def duplicates_for(index: dict, worker: str, threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+    """Flagged pairs involving one worker (only workers it actually shares hunks with)."""
+    reports = [pair_report(index, worker, other, threshold) for other in index["shared"].get(worker, {})]
+    return sorted((r for r in reports if r["duplicate"]), key=lambda r: -r["overlap"])
+
+
+def all_duplicates(index: dict, threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+    reports = []
+    for a, others in index["shared"].items():
+        for b in others:
+            if (len(a), a) < (len(b), b):
+                report = pair_report(index, a, b, threshold)
+                if report["duplicate"]:
+                    reports.append(report)
+    return sorted(reports, key=lambda r: -r["overlap"])
+
+
+def update(worker: str, path: str, base: str = None, threshold: float = DEFAULT_THRESHOLD,
+           index_path: Path = None) -> dict:
+    """Re-fingerprint one worker and return the duplicates it now takes part in."""
+    index_path = index_path or DUPLICATE_INDEX
+    try:
+        hunks = worktree_fingerprints(path, base, worker)
+    except BaseError as e:
+        # Leave the worker's previous fingerprints in the index rather than guess
+        return {"success": False, "worker": worker, "error": str(e)}
+    return record(worker, hunks, threshold, index_path)
+
+
+def record(worker: str, hunks: dict[str, list[str]], threshold: float = DEFAULT_THRESHOLD,
+           index_path: Path = None) -> dict:
+    """Swap a worker's fingerprints into the on-disk index under its lock."""
+    index_path = index_path or DUPLICATE_INDEX
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{index_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        index = load_index(index_path)
+        apply_update(index, worker, hunks)
+        save_index(index, index_path)
+        duplicates = duplicates_for(index, worker, threshold)
+    return {
+        "success": True,
+        "worker": worker,
+        "hunks": sum(len(fps) for fps in hunks.values()),
+        "files": len(hunks),
+        "has_duplicates": bool(duplicates),
+        "duplicates": duplicates,
+    }
+
+
+def worker_paths(workers: list[str] = None) -> dict[str, str]:
+    """Worktree per worker from the swarm queue, else the apex-worker-N convention."""
+    queue = load_swarm_queue()
+    known = queue.get("workers", {})
+    root = git_helper.repo_root()
+    paths = {}
+    for worker in workers or sorted(known):
+        path = known.get(worker, {}).get("path")
+        if not path and root:
+            path = str(Path(root).parent / f"apex-worker-{worker}")
+        if path and os.path.isdir(path):
+            paths[worker] = path
+    return paths
+
+
+def scan(workers: list[str] = None, base: str = None, threshold: float = DEFAULT_THRESHOLD,
+         index_path: Path = None) -> dict:
+    updated = {}
+    errors = {}
+    for worker, path in worker_paths(workers).items():
+        result = update(worker, path, base, threshold, index_path)
+        if result["success"]:
+            updated[worker] = result["hunks"]
+        else:
+            errors[worker] = result["error"]
+    duplicates = all_duplicates(load_index(index_path), threshold)
+    result = {"success": not errors, "scanned": updated, "has_duplicates": bool(duplicates), "duplicates": duplicates}
+    if errors:
+        result["errors"] = errors
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Duplicate Detector")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Share of the smaller worker's hunks that must match")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    update_parser = subparsers.add_parser("update", help="Re-fingerprint one worker's worktree")
+    update_parser.add_argument("--worker", required=True)
+    update_parser.add_argument("--path", default=".", help="Worker worktree (default: cwd)")
+    update_parser.add_argument("--base", help="What the worker forked from (default: recorded in the swarm queue)")
+
+    scan_parser = subparsers.add_parser("scan", help="Re-fingerprint every worker worktree")
+    scan_parser.add_argument("--workers", help="Comma-separated worker IDs (default: swarm queue)")
+    scan_parser.add_argument("--base", help="What the workers forked from (default: recorded in the swarm queue)")
+
+    subparsers.add_parser("check", help="Flagged pairs from the shared index (no git)")
+    subparsers.add_parser("clear", help="Drop the shared index")
+
+    args = parser.parse_args()
+
+    if args.action == "update":
+        result = update(args.worker, args.path, args.base, args.threshold)
+    elif args.action == "scan":
+        workers = [w.strip() for w in args.workers.split(",")] if args.workers else None
+        result = scan(workers, args.base, args.threshold)
+    elif args.action == "check":
+        index = load_index()
+        duplicates = all_duplicates(index, args.threshold)
+        result = {"success": True, "workers": len(index["workers"]),
+                  "has_duplicates": bool(duplicates), "duplicates": duplicates}
+    else:
+        if DUPLICATE_INDEX.is_dir():
+            shutil.rmtree(DUPLICATE_INDEX)
+        # The lock, and the single-file index older versions kept
+        for path in (Path(f"{DUPLICATE_INDEX}.lock"), DUPLICATE_INDEX.with_suffix(".json")):
+            if path.exists():
+                path.unlink()
+        result = {"success": True, "cleared": str(DUPLICATE_INDEX)}
+
+    print(json.dumps(result, indent=2))
+    # Like conflict_detector: nonzero when there is something to act on
+    sys.exit(1 if result.get("has_duplicates") or not result.get("success") else 0)
+
+
+if __name__ == "__main__":
+    main()
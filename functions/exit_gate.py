@@ -6,16 +6,26 @@ Evaluates Navigator/Pilot-style dual-condition completion gates.
 Exit requires:
 1. Enough completion heuristics are true
 2. Explicit EXIT_SIGNAL is true, unless disabled
+
+Batch mode evaluates every swarm worker in one process and adds a
+swarm-level aggregate decision.
 """
 
 import argparse
 import json
+import re
 import sys
-from typing import Any
+from pathlib import Path
+from typing import Any, Iterable
+
+WORKER_RE = re.compile(r"apex-worker-(\d+)")
 
 
 def parse_indicators(raw: str) -> dict[str, bool]:
-    data = json.loads(raw)
+    return normalize_indicators(json.loads(raw))
+
+
+def normalize_indicators(data: Any) -> dict[str, bool]:
     if isinstance(data, list):
         return {str(item): True for item in data}
     if isinstance(data, dict):
@@ -58,19 +68,149 @@ def evaluate(indicators: dict[str, bool], exit_signal: bool, required: int = 2,
     }
 
 
+def parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in {"1", "true", "yes", "y"}
+
+
+def record_from_state(path: str) -> dict[str, Any]:
+    """Build a batch record from a worker's apex-state.json (loop_mode section)."""
+    with open(path) as f:
+        state = json.load(f)
+    loop = state.get("loop_mode", {})
+    exits = loop.get("exit_conditions", {})
+    match = WORKER_RE.search(str(path))
+    return {
+        # Fall back to the full path: stems collide across worktrees
+        # (every worker has an apex-state.json)
+        "worker": match.group(1) if match else str(Path(path)),
+        "indicators": loop.get("completion_indicators", {}),
+        "exit_signal": exits.get("exit_signal", False),
+        "required": exits.get("heuristics_required", 2),
+    }
+
+
+def aggregate(decisions: dict[str, dict[str, Any]]) -> dict[str, Any]:
+    """Swarm-level decision: done only when every worker can exit."""
+    ready = [w for w, d in decisions.items() if d["can_exit"]]
+    blocked = [w for w, d in decisions.items() if d["decision"] == "blocked"]
+    blocking = [w for w, d in decisions.items() if not d["can_exit"]]
+    all_done = bool(decisions) and not blocking
+
+    if all_done:
+        decision = "exit"
+    elif blocked:
+        decision = "blocked"
+    else:
+        decision = "continue"
+
+    return {
+        "all_done": all_done,
+        "decision": decision,
+        "ready": ready,
+        "blocking": blocking,
+        "blocked": blocked,
+        "worker_count": len(decisions),
+    }
+
+
+def evaluate_batch(
+    records: Iterable[dict[str, Any]],
+    required: int = 2,
+    require_explicit: bool = True
+) -> dict[str, Any]:
+    """
+    Evaluate many workers in one pass.
+
+    Records look like {"worker", "indicators", "exit_signal", "required"};
+    missing fields fall back to the given defaults. A repeated worker id
+    is kept under a "<worker>#<n>" key with an "error" decision, so it
+    blocks the swarm instead of overwriting the first record.
+    """
+    decisions = {}
+    for i, record in enumerate(records):
+        worker = str(record.get("worker", i + 1))
+        if worker in decisions:
+            n = 2
+            while f"{worker}#{n}" in decisions:
+                n += 1
+            decisions[f"{worker}#{n}"] = {
+                "can_exit": False,
+                "decision": "error",
+                "reason": f"duplicate worker id {worker!r}",
+            }
+            continue
+        try:
+            indicators = normalize_indicators(record.get("indicators", {}))
+            worker_required = int(record.get("required", required))
+        except (TypeError, ValueError) as e:
+            decisions[worker] = {"can_exit": False, "decision": "error", "reason": str(e)}
+            continue
+        decisions[worker] = evaluate(
+            indicators,
+            parse_bool(record.get("exit_signal", False)),
+            worker_required,
+            require_explicit,
+        )
+    return {"workers": decisions, "swarm": aggregate(decisions)}
+
+
+def read_jsonl(source: str) -> list[dict[str, Any]]:
+    stream = sys.stdin if source == "-" else open(source)
+    try:
+        records = []
+        for lineno, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{source}:{lineno}: invalid JSON: {e}") from None
+            if not isinstance(record, dict):
+                raise ValueError(f"{source}:{lineno}: expected a JSON object")
+            records.append(record)
+        return records
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="APEX dual-condition exit gate")
-    parser.add_argument("--indicators", required=True, help="JSON object/list of completion indicators")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--indicators", help="JSON object/list of completion indicators")
+    source.add_argument("--batch", metavar="JSONL", help="JSONL of {worker, indicators, exit_signal, required} ('-' = stdin)")
+    source.add_argument("--state-files", nargs="+", metavar="PATH", help="Worker apex-state.json files to evaluate")
     parser.add_argument("--exit-signal", default="false", help="true/false explicit completion signal")
     parser.add_argument("--required", type=int, default=2, help="Required heuristic count")
     parser.add_argument("--no-explicit", action="store_true", help="Do not require explicit EXIT_SIGNAL")
     args = parser.parse_args()
 
-    indicators = parse_indicators(args.indicators)
-    exit_signal = str(args.exit_signal).lower() in {"1", "true", "yes", "y"}
-    result = evaluate(indicators, exit_signal, args.required, not args.no_explicit)
+    if args.indicators is not None:
+        indicators = parse_indicators(args.indicators)
+        exit_signal = parse_bool(args.exit_signal)
+        result = evaluate(indicators, exit_signal, args.required, not args.no_explicit)
+        print(json.dumps(result, indent=2))
+        return 0 if result["can_exit"] else 1
+
+    if args.batch:
+        try:
+            records = read_jsonl(args.batch)
+        except (OSError, ValueError) as e:
+            print(json.dumps({"error": str(e)}, indent=2))
+            return 1
+    else:
+        records = []
+        for path in args.state_files:
+            try:
+                records.append(record_from_state(path))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: skipping {path}: {e}", file=sys.stderr)
+
+    result = evaluate_batch(records, args.required, not args.no_explicit)
     print(json.dumps(result, indent=2))
-    return 0 if result["can_exit"] else 1
+    return 0 if result["swarm"]["all_done"] else 1
 
 
 if __name__ == "__main__":
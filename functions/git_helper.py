@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+APEX Git Helper
+Shared git access for the swarm functions.
+
+- repo root and ref lookups are memoized for the life of the process
+- object and ref queries go through long-running `git cat-file --batch-check`
+  and `--batch` processes (one pair per repository) instead of one fork each
+- independent commands run on a bounded thread pool
+- every git process started is counted, so benchmarks can compare forks
+
+APEX_GIT_POOL=0 restores the old behaviour (one fork per query, no memo).
+"""
+
+import argparse
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+POOL = os.environ.get("APEX_GIT_POOL", "1") != "0"
+MAX_JOBS = min(8, os.cpu_count() or 4)
+
+_forks = 0
+_lock = threading.Lock()
+_roots = {}
+_refs = {}
+_batches = {}
+_diffs = {}
+
+
+def _count_fork():
+    global _forks
+    with _lock:
+        _forks += 1
+
+
+def fork_count() -> int:
+    """git processes started by this module so far."""
+    return _forks
+
+
+def reset():
+    """Forget memoized lookups, stop batch processes and zero the fork counter."""
+    global _forks
+    close()
+    with _lock:
+        _roots.clear()
+        _refs.clear()
+        _diffs.clear()
+        _forks = 0
+
+
+def run(args: list[str], cwd: str = None, stderr_fallback: bool = False) -> tuple[bool, str]:
+    """Run one git command and return (success, stdout)."""
+    _count_fork()
+    try:
+        result = subprocess.run(["git"] + args, cwd=cwd, capture_output=True, text=True)
+    except Exception as e:
+        return False, str(e)
+    output = result.stdout.strip()
+    if stderr_fallback and not output:
+        output = result.stderr.strip()
+    return result.returncode == 0, output
+
+
+def run_many(commands: list[list[str]], cwd: str = None, jobs: int = None) -> list[tuple[bool, str]]:
+    """Run independent git commands on a bounded pool; results keep input order."""
+    if not POOL or len(commands) < 2:
+        return [run(args, cwd) for args in commands]
+    with ThreadPoolExecutor(max_workers=min(jobs or MAX_JOBS, len(commands))) as pool:
+        return list(pool.map(lambda args: run(args, cwd), commands))
+
+
+def repo_root(cwd: str = None) -> str:
+    """Top level of the repository containing cwd, or None outside a repo."""
+    key = os.path.realpath(cwd or os.getcwd())
+    if POOL and key in _roots:
+        return _roots[key]
+    success, output = run(["rev-parse", "--show-toplevel"], cwd=key)
+    root = output if success else None
+    if POOL:
+        _roots[key] = root
+    return root
+
+
+class CatFile:
+    """A persistent `git cat-file --batch-check` / `--batch` pair for one repository."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.check_proc = None
+        self.batch_proc = None
+        self.lock = threading.Lock()
+
+    def _start(self, mode: str) -> subprocess.Popen:
+        _count_fork()
+        return subprocess.Popen(["git", "cat-file", mode], cwd=self.root,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def check(self, spec: str):
+        """(sha, type, size) for an object name or rev expression, or None."""
+        if "\n" in spec:
+            return None
+        with self.lock:
+            if self.check_proc is None or self.check_proc.poll() is not None:
+                self.check_proc = self._start("--batch-check")
+            self.check_proc.stdin.write(spec.encode() + b"\n")
+            self.check_proc.stdin.flush()
+            fields = self.check_proc.stdout.readline().decode().split()
+        if len(fields) != 3 or fields[1] in ("missing", "ambiguous"):
+            return None
+        return fields[0], fields[1], int(fields[2])
+
+    def read(self, spec: str):
+        """(type, content bytes) for an object, or None."""
+        if "\n" in spec:
+            return None
+        with self.lock:
+            if self.batch_proc is None or self.batch_proc.poll() is not None:
+                self.batch_proc = self._start("--batch")
+            self.batch_proc.stdin.write(spec.encode() + b"\n")
+            self.batch_proc.stdin.flush()
+            fields = self.batch_proc.stdout.readline().decode().split()
+            if len(fields) != 3 or fields[1] in ("missing", "ambiguous"):
+                return None
+            content = self.batch_proc.stdout.read(int(fields[2]))
+            self.batch_proc.stdout.read(1)  # trailing newline
+        return fields[1], content
+
+    def close(self):
+        for proc in (self.check_proc, self.batch_proc):
+            if proc and proc.poll() is None:
+                proc.stdin.close()
+                proc.wait()
+        self.check_proc = self.batch_proc = None
+
+
+def cat_file(root: str) -> CatFile:
+    with _lock:
+        if root not in _batches:
+            _batches[root] = CatFile(root)
+        return _batches[root]
+
+
+def close():
+    with _lock:
+        batches = list(_batches.values())
+        _batches.clear()
+    for batch in batches:
+        batch.close()
+
+
+atexit.register(close)
+
+
+def object_info(spec: str, cwd: str = None):
+    """(sha, type, size) for spec, or None if it does not resolve."""
+    root = repo_root(cwd)
+    if root is None:
+        return None
+    if POOL:
+        return cat_file(root).check(spec)
+    if "\n" in spec:
+        return None
+    _count_fork()
+    result = subprocess.run(["git", "cat-file", "--batch-check"], cwd=root, input=spec + "\n",
+                            capture_output=True, text=True)
+    fields = result.stdout.split()
+    if len(fields) != 3 or fields[1] in ("missing", "ambiguous"):
+        return None
+    return fields[0], fields[1], int(fields[2])
+
+
+def resolve_ref(ref: str, cwd: str = None):
+    """Commit sha a ref points to (memoized), or None."""
+    root = repo_root(cwd)
+    key = (root, ref)
+    if POOL and key in _refs:
+        return _refs[key]
+    if POOL:
+        info = cat_file(root).check(f"{ref}^{{commit}}") if root else None
+        sha = info[0] if info else None
+    else:
+        success, output = run(["rev-parse", "--verify", "-q", f"{ref}^{{commit}}"], cwd=root)
+        sha = output if success else None
+    if POOL:
+        _refs[key] = sha
+    return sha
+
+
+def forget_ref(ref: str = None, cwd: str = None):
+    """Drop memoized ref lookups after this process moves a ref."""
+    if ref is None:
+        _refs.clear()
+    else:
+        _refs.pop((repo_root(cwd), ref), None)
+
+
+def diff_names(base: str, branch: str, cwd: str = None):
+    """
+    Files changed on branch since it forked from base (`git diff base...branch`),
+    or None if the diff fails. Memoized on the resolved shas, so a moved ref
+    is never served a stale answer.
+    """
+    if not POOL:
+        success, output = run(["diff", "--name-only", f"{base}...{branch}"], cwd=cwd)
+        return (set(output.split("\n")) if output else set()) if success else None
+    key = (resolve_ref(base, cwd), resolve_ref(branch, cwd))
+    if None in key:
+        return None
+    if key not in _diffs:
+        success, output = run(["diff", "--name-only", f"{key[0]}...{key[1]}"], cwd=cwd)
+        _diffs[key] = (frozenset(output.split("\n")) if output else frozenset()) if success else None
+    return set(_diffs[key]) if _diffs[key] is not None else None
+
+
+def diff_names_many(base: str, branches: list[str], cwd: str = None) -> dict:
+    """diff_names for several branches; uncached diffs run on the pool."""
+    if not POOL:
+        return {branch: diff_names(base, branch, cwd) for branch in branches}
+    base_sha = resolve_ref(base, cwd)
+    pending = {}
+    for branch in branches:
+        sha = resolve_ref(branch, cwd)
+        if base_sha and sha and (base_sha, sha) not in _diffs:
+            pending[branch] = (base_sha, sha)
+    keys = list(dict.fromkeys(pending.values()))
+    results = run_many([["diff", "--name-only", f"{a}...{b}"] for a, b in keys], cwd=cwd)
+    for key, (success, output) in zip(keys, results):
+        _diffs[key] = (frozenset(output.split("\n")) if output else frozenset()) if success else None
+    return {branch: diff_names(base, branch, cwd) for branch in branches}
+
+
+def read_object(spec: str, cwd: str = None):
+    """Content bytes of a blob/tree/commit, or None."""
+    root = repo_root(cwd)
+    if root is None:
+        return None
+    if POOL:
+        result = cat_file(root).read(spec)
+        return result[1] if result else None
+    _count_fork()
+    result = subprocess.run(["git", "cat-file", "-p", spec], cwd=root, capture_output=True)
+    return result.stdout if result.returncode == 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Git Helper")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    resolve_parser = subparsers.add_parser("resolve", help="Resolve refs to commit shas")
+    resolve_parser.add_argument("refs", nargs="+")
+
+    subparsers.add_parser("root", help="Print the repository root")
+
+    args = parser.parse_args()
+
+    if args.action == "root":
+        root = repo_root()
+        result = {"success": root is not None, "root": root}
+    else:
+        result = {"success": True, "refs": {ref: resolve_ref(ref) for ref in args.refs}}
+    result["forks"] = fork_count()
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["success"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,33 +6,161 @@ Based on Navigator's knowledge graph architecture.
 """
 
 import argparse
+import fcntl
 import json
 import hashlib
 import os
+import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 
 
 APEX_DIR = Path(os.environ.get("APEX_DIR", Path.home() / ".config" / "opencode" / "apex"))
-GRAPH_PATH = Path(os.environ.get("APEX_GRAPH_PATH", APEX_DIR / "state" / "knowledge-graph.json"))
+GRAPHS_DIR = Path(os.environ.get("APEX_GRAPHS_DIR", APEX_DIR / "state" / "graphs"))
+GLOBAL_PATH = GRAPHS_DIR / "global.json"
+LEGACY_PATH = APEX_DIR / "state" / "knowledge-graph.json"
 
+# Setting APEX_GRAPH_PATH keeps the old single-file graph (no shards, no global index).
+GRAPH_PATH = Path(os.environ["APEX_GRAPH_PATH"]) if os.environ.get("APEX_GRAPH_PATH") else None
 
-def init_graph(project_path: str = ".") -> dict:
-    """Initialize knowledge graph from project files."""
-    project = Path(project_path)
-    
-    graph = {
+# Memory types that are useful beyond the project they were learned in.
+GLOBAL_TYPES = {"pitfall", "pattern"}
+
+
+def project_root(project_path: str = ".") -> str:
+    """Git top-level for project_path, or its absolute path outside a repo."""
+    path = Path(project_path).absolute()
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--show-toplevel"],
+            cwd=path, capture_output=True, text=True
+        )
+        if result.returncode == 0:
+            return result.stdout.strip()
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return str(path)
+
+
+def project_key(project_path: str = ".") -> str:
+    """Shard name: repo directory name plus a hash of the repo root."""
+    root = project_root(project_path)
+    name = "".join(c if c.isalnum() or c in "-_" else "-" for c in Path(root).name) or "root"
+    return f"{name}-{hashlib.sha1(root.encode()).hexdigest()[:12]}"
+
+
+def shard_path(project_path: str = ".") -> Path:
+    if GRAPH_PATH is not None:
+        return GRAPH_PATH
+    return GRAPHS_DIR / f"{project_key(project_path)}.json"
+
+
+def read_json(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_json(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    tmp_path.rename(path)
+
+
+def empty_graph(project: str) -> dict:
+    now = datetime.utcnow().isoformat() + "Z"
+    return {
         "version": "1.0.0",
-        "created_at": datetime.utcnow().isoformat() + "Z",
-        "updated_at": datetime.utcnow().isoformat() + "Z",
-        "project": str(project.absolute()),
+        "created_at": now,
+        "updated_at": now,
+        "project": project,
         "concepts": {},
         "memories": [],
         "files": {},
         "relationships": []
     }
+
+
+# ---------------------------------------------------------------------------
+# Global index: shard registry plus cross-project pitfall/pattern memories
+# ---------------------------------------------------------------------------
+
+def update_global(mutate):
+    """Apply mutate(index) to global.json under an exclusive lock."""
+    GRAPHS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(f"{GLOBAL_PATH}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        index = read_json(GLOBAL_PATH) or {"version": "1.0.0", "shards": {}, "memories": []}
+        result = mutate(index)
+        write_json(GLOBAL_PATH, index)
+    return result
+
+
+def register_shard(graph: dict, path: Path):
+    def mutate(index: dict):
+        index["shards"][path.stem] = {
+            "project": graph.get("project"),
+            "path": str(path),
+            "memories": len(graph.get("memories", [])),
+            "concepts": len(graph.get("concepts", {})),
+            "updated_at": graph.get("updated_at"),
+        }
+    update_global(mutate)
+
+
+def publish_global(memories: list[dict], project: str):
+    """Copy pitfall/pattern memories into the global index (deduplicated by id)."""
+    shared = [m for m in memories if m.get("type") in GLOBAL_TYPES]
+    if not shared:
+        return
+
+    def mutate(index: dict):
+        known = {m["id"] for m in index["memories"]}
+        for memory in shared:
+            if memory["id"] not in known:
+                index["memories"].append({**memory, "project": project})
+                known.add(memory["id"])
+    update_global(mutate)
+
+
+def migrate_legacy():
+    """Split a pre-sharding knowledge-graph.json into its project shard and the global index."""
+    if GRAPH_PATH is not None or not LEGACY_PATH.exists():
+        return
+    legacy = read_json(LEGACY_PATH)
+    project = project_root(legacy.get("project", "."))
+    legacy["project"] = project
+    path = GRAPHS_DIR / f"{project_key(project)}.json"
+    existing = read_json(path)
+    if existing:
+        known = {m["summary"] for m in existing["memories"]}
+        existing["memories"].extend(m for m in legacy["memories"] if m["summary"] not in known)
+        for name, data in legacy.get("concepts", {}).items():
+            existing["concepts"].setdefault(name, data)
+        existing["relationships"].extend(legacy.get("relationships", []))
+        legacy = existing
+    write_json(path, legacy)
+    register_shard(legacy, path)
+    publish_global(legacy.get("memories", []), project)
+    LEGACY_PATH.rename(LEGACY_PATH.with_suffix(".json.migrated"))
+
+
+def init_graph(project_path: str = ".") -> dict:
+    """Initialize (or refresh) the project's graph, keeping existing memories."""
+    project = Path(project_root(project_path))
+
+    graph = load_graph(str(project)) or empty_graph(str(project))
+    graph["project"] = str(project)
+    graph["files"] = {}
+    graph["concepts"] = {
+        name: data for name, data in graph["concepts"].items() if data.get("type") != "directory"
+    }
     
     # Scan for common project files
     important_files = [
@@ -55,38 +183,52 @@ def init_graph(project_path: str = ".") -> dict:
         dirpath = project / dirname
         if dirpath.exists():
             file_count = len(list(dirpath.rglob("*")))
-            graph["concepts"][dirname] = {
+            concept = graph["concepts"].setdefault(dirname, {"memories": []})
+            concept.update({
                 "type": "directory",
                 "path": str(dirpath),
                 "file_count": file_count,
-                "related_files": []
-            }
+                "related_files": concept.get("related_files", [])
+            })
     
     save_graph(graph)
     return graph
 
 
-def load_graph() -> dict:
-    """Load existing knowledge graph."""
-    if not GRAPH_PATH.exists():
-        return None
-    with open(GRAPH_PATH) as f:
-        return json.load(f)
+def load_graph(project_path: str = ".") -> dict:
+    """Load the knowledge graph shard for one project (nothing else is read)."""
+    migrate_legacy()
+    return read_json(shard_path(project_path))
 
 
-def save_graph(graph: dict):
-    """Save knowledge graph atomically."""
-    GRAPH_PATH.parent.mkdir(parents=True, exist_ok=True)
+def save_graph(graph: dict, path: Path = None):
+    """Save knowledge graph atomically and refresh its entry in the global index."""
+    path = path or shard_path(graph.get("project", "."))
     graph["updated_at"] = datetime.utcnow().isoformat() + "Z"
-    tmp_path = GRAPH_PATH.with_suffix(".tmp")
-    with open(tmp_path, "w") as f:
-        json.dump(graph, f, indent=2)
-    tmp_path.rename(GRAPH_PATH)
+    write_json(path, graph)
+    if GRAPH_PATH is None:
+        register_shard(graph, path)
 
 
-def query(concept: str, graph: dict = None) -> dict:
-    """Query knowledge graph for a concept."""
-    graph = graph or load_graph()
+def search_memories(concept_lower: str, memories: list[dict]) -> list[dict]:
+    matches = []
+    for memory in memories:
+        if concept_lower in memory.get("summary", "").lower():
+            matches.append(memory)
+        elif concept_lower in " ".join(memory.get("concepts", [])).lower():
+            matches.append(memory)
+    return matches
+
+
+def query(concept: str, graph: dict = None, project_path: str = ".", include_global: bool = None) -> dict:
+    """Query a project's knowledge graph for a concept.
+
+    When the graph is loaded here (sharded mode), cross-project pitfall and
+    pattern memories from the global index are included as well.
+    """
+    if include_global is None:
+        include_global = graph is None and GRAPH_PATH is None
+    graph = graph or load_graph(project_path)
     if not graph:
         return {"error": "No knowledge graph found. Run init first."}
     
@@ -105,11 +247,14 @@ def query(concept: str, graph: dict = None) -> dict:
             results["concepts"].append({"name": name, **data})
     
     # Search memories
-    for memory in graph.get("memories", []):
-        if concept_lower in memory.get("summary", "").lower():
-            results["memories"].append(memory)
-        elif concept_lower in " ".join(memory.get("concepts", [])).lower():
-            results["memories"].append(memory)
+    results["memories"] = search_memories(concept_lower, graph.get("memories", []))
+    if include_global:
+        own = {m["id"] for m in results["memories"]}
+        shared = (read_json(GLOBAL_PATH) or {}).get("memories", [])
+        results["memories"].extend(
+            m for m in search_memories(concept_lower, shared)
+            if m["id"] not in own and m.get("project") != graph.get("project")
+        )
     
     # Search files
     for filename, data in graph.get("files", {}).items():
@@ -130,6 +275,35 @@ def query(concept: str, graph: dict = None) -> dict:
     return results
 
 
+def _query_shard(path: str, concept: str) -> dict:
+    graph = read_json(Path(path))
+    result = query(concept, graph, include_global=False) if graph else {"found": False}
+    result["project"] = (graph or {}).get("project")
+    return result
+
+
+def query_all(concept: str, workers: int = None) -> dict:
+    """Fan a query out across every project shard in parallel."""
+    migrate_legacy()
+    shards = sorted(str(p) for p in GRAPHS_DIR.glob("*.json") if p != GLOBAL_PATH)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(shards) or 1))
+    if workers == 1:
+        results = [_query_shard(path, concept) for path in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_query_shard, shards, [concept] * len(shards)))
+
+    shared = search_memories(concept.lower(), (read_json(GLOBAL_PATH) or {}).get("memories", []))
+    projects = [r for r in results if r.get("found")]
+    return {
+        "query": concept,
+        "shards_searched": len(shards),
+        "projects": projects,
+        "global_memories": shared,
+        "found": bool(projects or shared),
+    }
+
+
 def add_memory(
     memory_type: str,
     summary: str,
@@ -137,7 +311,11 @@ def add_memory(
     confidence: float = 0.8,
     graph: dict = None
 ) -> dict:
-    """Add a new memory to the knowledge graph."""
+    """Add a new memory to the knowledge graph.
+
+    Pitfalls and patterns are also published to the global index so other
+    projects can find them.
+    """
     graph = graph or load_graph()
     if not graph:
         graph = init_graph()
@@ -171,6 +349,8 @@ def add_memory(
         graph["concepts"][concept]["memories"].append(memory["id"])
     
     save_graph(graph)
+    if GRAPH_PATH is None:
+        publish_global([memory], graph.get("project"))
     return {"success": True, "memory": memory}
 
 
@@ -208,7 +388,7 @@ def get_stats(graph: dict = None) -> dict:
         t = mem.get("type", "unknown")
         memory_types[t] = memory_types.get(t, 0) + 1
     
-    return {
+    stats = {
         "version": graph.get("version", "unknown"),
         "project": graph.get("project", "unknown"),
         "created_at": graph.get("created_at"),
@@ -221,6 +401,11 @@ def get_stats(graph: dict = None) -> dict:
         },
         "memory_types": memory_types
     }
+    if GRAPH_PATH is None:
+        index = read_json(GLOBAL_PATH) or {}
+        stats["shards"] = len(index.get("shards", {}))
+        stats["global_memories"] = len(index.get("memories", []))
+    return stats
 
 
 def main():
@@ -234,6 +419,9 @@ def main():
     # Query
     query_parser = subparsers.add_parser("query", help="Query knowledge graph")
     query_parser.add_argument("concept", help="Concept to search for")
+    query_parser.add_argument("--all-projects", action="store_true",
+                              help="Search every project shard in parallel")
+    query_parser.add_argument("--workers", type=int, help="Processes for --all-projects")
     
     # Add memory
     memory_parser = subparsers.add_parser("memory", help="Add memory")
@@ -252,12 +440,15 @@ def main():
     # Stats
     subparsers.add_parser("stats", help="Show graph statistics")
     
+    # Shards
+    subparsers.add_parser("shards", help="List project shards from the global index")
+    
     args = parser.parse_args()
     
     if args.action == "init":
         result = init_graph(args.project)
     elif args.action == "query":
-        result = query(args.concept)
+        result = query_all(args.concept, args.workers) if args.all_projects else query(args.concept)
     elif args.action == "memory":
         concepts = [c.strip() for c in args.concepts.split(",")]
         result = add_memory(args.type, args.summary, concepts, args.confidence)
@@ -265,6 +456,10 @@ def main():
         result = add_relationship(args.from_concept, args.to, args.type)
     elif args.action == "stats":
         result = get_stats()
+    elif args.action == "shards":
+        migrate_legacy()
+        index = read_json(GLOBAL_PATH) or {"shards": {}, "memories": []}
+        result = {"shards": index["shards"], "global_memories": len(index["memories"])}
     
     print(json.dumps(result, indent=2))
 
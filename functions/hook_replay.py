@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+APEX Hook Replay
+Replay recorded hook payload streams through the metrics and circuit
+breaker logic in memory, to tune the mode limits offline.
+
+A stream is JSONL, one hook payload per line, as the hooks receive it
+(record live sessions with APEX_HOOK_RECORD=/path/stream.jsonl):
+
+    {"hook_event_name": "PreToolUse", "tool_name": "Edit", "tool_input": {...}}
+    {"hook_event_name": "PostToolUse", "tool_name": "Edit", "tool_input": {...},
+     "error": null, "usage": {"input_tokens": 1200, "output_tokens": 80}}
+    {"hook_event_name": "Stop"}
+
+PreToolUse runs the apex-circuit-breaker.sh checks, PostToolUse the
+apex-metrics.sh counter updates, Stop the apex-session.sh reset. Streams
+without PreToolUse records get a check before every PostToolUse. Lines
+without hook_event_name count as PostToolUse.
+
+For each limit set the report gives the first point the breaker would have
+stopped the session and the tool calls and tokens that came after it
+(what the trip would have saved).
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# Mirrors the mode table in hooks/apex-circuit-breaker.sh
+MODES = {
+    "safe": {"iteration_tools": 25, "iteration_errors": 3, "iteration_file_edits": 5,
+             "cycle_tools": 100, "cycle_errors": 10, "stuck_threshold": 2},
+    "default": {"iteration_tools": 50, "iteration_errors": 5, "iteration_file_edits": 10,
+                "cycle_tools": 200, "cycle_errors": 15, "stuck_threshold": 3},
+    "fast": {"iteration_tools": 100, "iteration_errors": 10, "iteration_file_edits": 20,
+             "cycle_tools": 400, "cycle_errors": 30, "stuck_threshold": 5},
+}
+EDIT_TOOLS = {"Edit", "Write", "MultiEdit"}
+# The breaker lets these through before any limit check
+SEMANTIC_TOOLS = {"grepai_search", "grepai_trace", "query_code_graph", "get_code_snippet", "surgical_replace_code"}
+PATTERN_WINDOW = 20
+MIN_PARALLEL = 8  # smaller grids run in-process
+
+PRE, POST, STOP = 0, 1, 2
+EVENT_KINDS = {"PreToolUse": PRE, "PostToolUse": POST, "Stop": STOP, "SubagentStop": STOP}
+
+
+def compile_event(payload: dict):
+    """Reduce a hook payload to the fields the hooks look at."""
+    kind = EVENT_KINDS.get(payload.get("hook_event_name") or "PostToolUse")
+    if kind is None:
+        return None
+    if kind == STOP:
+        return (STOP,)
+    tool = payload.get("tool_name") or ""
+    tool_input = payload.get("tool_input")
+    tool_input = tool_input if isinstance(tool_input, dict) else {}
+    file_path = (tool_input.get("file_path") or "") if tool in EDIT_TOOLS else ""
+    if kind == PRE:
+        return (PRE, tool, file_path)
+    error = payload.get("error")
+    failed = error not in (None, "", "null")
+    usage = payload.get("usage") or {}
+    tokens = int(usage.get("input_tokens") or 0) + int(usage.get("output_tokens") or 0)
+    # Same [tool, first input key, status] triple the metrics hook records
+    pattern = (tool, min(tool_input) if tool_input else "unknown", "error" if failed else "success")
+    return (POST, tool, file_path, failed, tokens, pattern)
+
+
+def load_stream(path: str) -> list[tuple]:
+    events = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = compile_event(json.loads(line))
+            except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+                continue
+            if event is not None:
+                events.append(event)
+    if not any(event[0] == PRE for event in events):
+        # Post-only recording: the breaker ran before every call
+        checked = []
+        for event in events:
+            if event[0] == POST:
+                checked.append((PRE, event[1], event[2]))
+            checked.append(event)
+        events = checked
+    return events
+
+
+def stuck_check(patterns: list, threshold: int) -> Optional[str]:
+    """The breaker's repeat and A→B→A→B checks over the last `threshold` patterns."""
+    recent = patterns[-threshold:] if threshold > 0 else []
+    if not recent:
+        return None
+    if len(recent) >= threshold and all(p == recent[0] for p in recent):
+        return "stuck_loop"
+    if len(recent) >= 4:
+        half = len(recent) // 2
+        if recent[:half] == recent[-half:]:
+            return "cycle_pattern"
+    return None
+
+
+def simulate(events: list[tuple], limits: dict, ralph: bool = False) -> dict:
+    """Run one stream under one limit set; stops at the first trip."""
+    iter_tool_limit = limits["iteration_tools"]
+    iter_error_limit = limits["iteration_errors"]
+    file_limit = limits["iteration_file_edits"]
+    cycle_tool_limit = limits["cycle_tools"]
+    cycle_error_limit = limits["cycle_errors"]
+    threshold = limits["stuck_threshold"]
+
+    iter_tools = cycle_tools = iter_errors = cycle_errors = 0
+    file_edits = {}
+    patterns = []
+    calls = tokens = 0
+    trip = None
+
+    for index, event in enumerate(events):
+        kind = event[0]
+        if kind == POST:
+            _, tool, file_path, failed, call_tokens, pattern = event
+            calls += 1
+            tokens += call_tokens
+            iter_tools += 1
+            cycle_tools += 1
+            if failed:
+                iter_errors += 1
+                cycle_errors += 1
+            if file_path:
+                file_edits[file_path] = file_edits.get(file_path, 0) + 1
+            patterns.append(pattern)
+            if len(patterns) > PATTERN_WINDOW:
+                del patterns[0]
+        elif kind == PRE:
+            tool, file_path = event[1], event[2]
+            if tool in SEMANTIC_TOOLS:
+                continue
+            reason = None
+            if iter_tools >= iter_tool_limit:
+                reason = "tool_calls_iteration"
+            elif ralph and cycle_tools >= cycle_tool_limit:
+                reason = "tool_calls_cycle"
+            elif iter_errors >= iter_error_limit:
+                reason = "errors_iteration"
+            elif ralph and cycle_errors >= cycle_error_limit:
+                reason = "errors_cycle"
+            elif file_path and file_edits.get(file_path, 0) >= file_limit:
+                reason = "same_file_edits"
+            else:
+                reason = stuck_check(patterns, threshold)
+            if reason:
+                trip = {"reason": reason, "event": index, "call": calls + 1,
+                        "calls_before": calls, "tokens_before": tokens}
+                break
+        else:
+            # Stop hook: next session starts from zero
+            iter_tools = cycle_tools = iter_errors = cycle_errors = 0
+            file_edits = {}
+            patterns = []
+
+    return {"trip": trip, "calls_before": calls, "tokens_before": tokens}
+
+
+def stream_totals(events: list[tuple]) -> tuple[int, int]:
+    posts = [event for event in events if event[0] == POST]
+    return len(posts), sum(event[4] for event in posts)
+
+
+def evaluate(streams: dict, limits: dict, ralph: bool = False) -> dict:
+    """Replay every stream under one limit set and total the savings."""
+    sessions = {}
+    saved_calls = saved_tokens = trips = 0
+    reasons = {}
+    for name, events in streams.items():
+        total_calls, total_tokens = stream_totals(events)
+        trip = simulate(events, limits, ralph)["trip"]
+        if trip:
+            trips += 1
+            reasons[trip["reason"]] = reasons.get(trip["reason"], 0) + 1
+            trip = dict(trip, saved_calls=total_calls - trip["calls_before"],
+                        saved_tokens=total_tokens - trip["tokens_before"])
+            saved_calls += trip["saved_calls"]
+            saved_tokens += trip["saved_tokens"]
+        sessions[name] = {"calls": total_calls, "tokens": total_tokens, "trip": trip}
+    return {"limits": limits, "trips": trips, "reasons": reasons,
+            "saved_calls": saved_calls, "saved_tokens": saved_tokens, "sessions": sessions}
+
+
+def replay_modes(streams: dict, ralph: bool = False) -> dict:
+    return {mode: evaluate(streams, limits, ralph) for mode, limits in MODES.items()}
+
+
+def parse_values(spec: str) -> list[int]:
+    """'25,50,75' or '25:100:25' (inclusive range)."""
+    if ":" in spec:
+        parts = [int(p) for p in spec.split(":")]
+        start, stop = parts[0], parts[1]
+        step = parts[2] if len(parts) > 2 else 1
+        return list(range(start, stop + 1, step))
+    return [int(v) for v in spec.split(",") if v.strip()]
+
+
+def build_grid(base: dict, params: list[str]) -> list[dict]:
+    axes = []
+    for spec in params:
+        name, _, values = spec.partition("=")
+        if name not in base:
+            raise ValueError(f"Unknown parameter: {name} (one of {', '.join(base)})")
+        axes.append([(name, v) for v in parse_values(values)])
+    return [dict(base, **dict(combo)) for combo in itertools.product(*axes)]
+
+
+_streams = {}
+
+
+def _init_worker(streams: dict):
+    global _streams
+    _streams = streams
+
+
+def _evaluate_summary(args: tuple) -> dict:
+    limits, ralph = args
+    result = evaluate(_streams, limits, ralph)
+    del result["sessions"]
+    return result
+
+
+def sweep(streams: dict, grid: list[dict], ralph: bool = False, jobs: int = None) -> list[dict]:
+    """Evaluate every limit set in the grid, across processes for large grids."""
+    tasks = [(limits, ralph) for limits in grid]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs <= 1 or len(tasks) < MIN_PARALLEL:
+        _init_worker(streams)
+        return [_evaluate_summary(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(streams,)) as pool:
+        return list(pool.map(_evaluate_summary, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
+
+
+def load_streams(paths: list[str]) -> dict:
+    return {path: load_stream(path) for path in paths}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Hook Replay")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    replay_parser = subparsers.add_parser("replay", help="Where each mode would have tripped")
+    replay_parser.add_argument("streams", nargs="+", help="Recorded hook payload JSONL files")
+    replay_parser.add_argument("--ralph", action="store_true", help="Completion cycle active (cycle limits apply)")
+
+    sweep_parser = subparsers.add_parser("sweep", help="Evaluate a grid of limit sets")
+    sweep_parser.add_argument("streams", nargs="+", help="Recorded hook payload JSONL files")
+    sweep_parser.add_argument("--param", action="append", default=[],
+                              help="name=25,50,75 or name=25:100:25 (repeatable)")
+    sweep_parser.add_argument("--base", choices=sorted(MODES), default="default", help="Limits for unswept parameters")
+    sweep_parser.add_argument("--ralph", action="store_true", help="Completion cycle active (cycle limits apply)")
+    sweep_parser.add_argument("--jobs", type=int, help="Worker processes (default: all cores)")
+    sweep_parser.add_argument("--top", type=int, help="Only the N limit sets saving the most tokens")
+
+    args = parser.parse_args()
+
+    try:
+        streams = load_streams(args.streams)
+    except OSError as e:
+        print(json.dumps({"success": False, "error": str(e)}, indent=2))
+        sys.exit(1)
+
+    if args.action == "replay":
+        result = {"success": True, "ralph": args.ralph, "modes": replay_modes(streams, args.ralph)}
+    else:
+        try:
+            grid = build_grid(MODES[args.base], args.param)
+        except ValueError as e:
+            print(json.dumps({"success": False, "error": str(e)}, indent=2))
+            sys.exit(1)
+        results = sweep(streams, grid, args.ralph, args.jobs)
+        if args.top:
+            results = sorted(results, key=lambda r: (-r["saved_tokens"], -r["saved_calls"]))[:args.top]
+        result = {"success": True, "ralph": args.ralph, "streams": len(streams),
+                  "combinations": len(grid), "results": results}
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+APEX Installer
+Incremental, manifest-driven install of an APEX checkout into APEX_DIR.
+
+.install-manifest.json in APEX_DIR records, for every installed file, the
+content hash plus the (mtime, size) of the source and of the installed
+copy. A re-install only hashes files whose stat changed and only copies
+files whose content did:
+
+- new or changed files are written to a temp file in the target directory
+  and renamed over the old one, so a hook never sees a half-written script
+- copies are reflinks where the filesystem supports them (btrfs, XFS),
+  hardlinks with --link hardlink, plain copies otherwise
+- installed files edited after install are kept: a newer version from the
+  checkout is written next to them as <file>.apex-new (--force overwrites)
+- files dropped from the checkout are removed, unless edited after install
+- changed functions/*.py are byte-compiled
+- apex-state.json and apex-profile.json gain any keys their templates
+  added, keeping every existing value (no reset)
+"""
+
+import argparse
+import compileall
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+APEX_DIR = Path(os.environ.get("APEX_DIR", Path.home() / ".config" / "opencode" / "apex"))
+MANIFEST_NAME = ".install-manifest.json"
+MANIFEST_VERSION = 1
+
+# Source patterns, relative to the checkout; files land at the same relative path
+INCLUDE = (
+    "*.md",
+    "update-apex.sh",
+    "commands/**/*",
+    "hooks/*",
+    "functions/*.py",
+    "state/*.template",
+    "templates/**/*",
+    "integrations/**/*",
+    "skills/**/*",
+    "mcp/settings.json.template",
+)
+SKIP_PARTS = {"__pycache__", ".git"}
+# Live state created from a template on first install, migrated afterwards
+STATE_FILES = {"state/apex-state.json": "state/apex-state.json.template",
+               "state/apex-profile.json": "state/apex-profile.json.template"}
+LINK_MODES = ("auto", "reflink", "hardlink", "copy")
+NEW_SUFFIX = ".apex-new"  # checkout version of a locally edited file
+FICLONE = 0x40049409  # Linux ioctl: share extents with another file
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def signature(path: Path):
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def source_files(source: Path) -> list[str]:
+    found = set()
+    for pattern in INCLUDE:
+        for path in source.glob(pattern):
+            rel = path.relative_to(source)
+            if path.is_file() and not SKIP_PARTS.intersection(rel.parts) and path.suffix != ".pyc":
+                found.add(rel.as_posix())
+    return sorted(found)
+
+
+def load_manifest(dest: Path) -> dict:
+    try:
+        with open(dest / MANIFEST_NAME) as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"version": MANIFEST_VERSION, "files": {}}
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def save_manifest(manifest: dict, dest: Path):
+    path = dest / MANIFEST_NAME
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# ---------------------------------------------------------------------------
+# Copying
+# ---------------------------------------------------------------------------
+
+def reflink(src: Path, dst: Path) -> bool:
+    """Clone src into dst (an open, empty file path) sharing extents; False if unsupported."""
+    if not hasattr(fcntl, "ioctl") or sys.platform != "linux":
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        return False
+
+
+def place(src: Path, dst: Path, link: str) -> str:
+    """Atomically put src's content at dst; returns the method that worked."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{dst.name}.", suffix=".apex-tmp", dir=dst.parent)
+    os.close(fd)
+    tmp = Path(tmp_name)
+    try:
+        method = None
+        if link == "hardlink":
+            tmp.unlink()
+            try:
+                os.link(src, tmp)
+                method = "hardlink"
+            except OSError:
+                pass
+        if method is None and link in ("auto", "reflink") and reflink(src, tmp):
+            shutil.copystat(src, tmp)
+            method = "reflink"
+        if method is None:
+            shutil.copy2(src, tmp)
+            method = "copy"
+        if method != "hardlink" and dst.suffix == ".sh":
+            os.chmod(tmp, os.stat(tmp).st_mode | 0o111)
+        os.replace(tmp, dst)
+    except BaseException:
+        if tmp.exists():
+            tmp.unlink()
+        raise
+    return method
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+def plan(source: Path, dest: Path, manifest: dict, force: bool = False) -> dict:
+    """
+    Compare the checkout with the manifest and the installed copies.
+    Returns {"copy": [(rel, hash, reason)], "unchanged": [...], "conflicts": [(rel, hash)],
+    "remove": [...], "kept": [...]}. Installed files edited since the last
+    install are conflicts rather than copies unless `force` is set.
+    """
+    old = manifest.get("files", {})
+    result = {"copy": [], "unchanged": [], "conflicts": [], "remove": [], "kept": []}
+    wanted = source_files(source)
+
+    for rel in wanted:
+        src = source / rel
+        entry = old.get(rel)
+        src_sig = signature(src)
+        if entry and entry.get("source_sig") == src_sig:
+            digest = entry["sha256"]
+        else:
+            digest = file_hash(src)
+        if not entry:
+            result["copy"].append((rel, digest, "new"))
+            continue
+        dst = dest / rel
+        dst_sig = signature(dst)
+        if dst_sig is None:
+            result["copy"].append((rel, digest, "missing"))
+            continue
+        local = file_hash(dst) if dst_sig != entry.get("dest_sig") else entry["sha256"]
+        if local == digest:
+            result["unchanged"].append((rel, digest))
+        elif local == entry["sha256"]:
+            result["copy"].append((rel, digest, "changed"))
+        elif force:
+            result["copy"].append((rel, digest, "modified_locally"))
+        else:
+            result["conflicts"].append((rel, digest))
+
+    present = set(wanted)
+    for rel, entry in old.items():
+        if rel in present:
+            continue
+        dst = dest / rel
+        if not dst.exists():
+            continue
+        if signature(dst) == entry.get("dest_sig") or file_hash(dst) == entry.get("sha256"):
+            result["remove"].append(rel)
+        else:
+            result["kept"].append(rel)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# State migration
+# ---------------------------------------------------------------------------
+
+def merge_missing(current, template, path: str = "") -> list[str]:
+    """Add keys the template has and current lacks, recursively; returns the added paths."""
+    added = []
+    for key, value in template.items():
+        key_path = f"{path}.{key}" if path else key
+        if key not in current:
+            current[key] = value
+            added.append(key_path)
+        elif isinstance(value, dict) and isinstance(current[key], dict):
+            added.extend(merge_missing(current[key], value, key_path))
+    return added
+
+
+def migrate_state(state_path: Path, template_path: Path) -> dict:
+    """Bring a live state file up to the template schema in place, under the hooks' lock."""
+    if not template_path.exists():
+        return {"path": str(state_path), "action": "no_template"}
+    with open(template_path) as f:
+        template = json.load(f)
+    if not state_path.exists():
+        shutil.copyfile(template_path, state_path)
+        return {"path": str(state_path), "action": "created"}
+
+    with open(f"{state_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except json.JSONDecodeError:
+            backup = state_path.with_name(state_path.name + ".corrupt")
+            os.replace(state_path, backup)
+            shutil.copyfile(template_path, state_path)
+            return {"path": str(state_path), "action": "replaced_corrupt", "backup": str(backup)}
+        added = merge_missing(state, template)
+        previous = state.get("version")
+        if "version" in template and previous != template["version"]:
+            state["version"] = template["version"]
+        if not added and previous == state.get("version"):
+            return {"path": str(state_path), "action": "current"}
+        tmp_path = state_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, state_path)
+    return {"path": str(state_path), "action": "migrated", "added": added,
+            "version": [previous, state.get("version")]}
+
+
+# ---------------------------------------------------------------------------
+# Install
+# ---------------------------------------------------------------------------
+
+def install(source: Path, dest: Path, link: str = "auto", dry_run: bool = False, compile_py: bool = True,
+            force: bool = False) -> dict:
+    source = source.resolve()
+    dest.mkdir(parents=True, exist_ok=True)
+    with open(dest / f"{MANIFEST_NAME}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = load_manifest(dest)
+        actions = plan(source, dest, manifest, force)
+        summary = {
+            "copied": [{"path": rel, "reason": reason} for rel, _, reason in actions["copy"]],
+            "unchanged": len(actions["unchanged"]),
+            "conflicts": [{"path": rel,
+                           "new": rel + NEW_SUFFIX if digest != manifest["files"][rel]["sha256"] else None}
+                          for rel, digest in actions["conflicts"]],
+            "removed": actions["remove"],
+            "kept_modified": actions["kept"],
+        }
+        if dry_run:
+            return {"success": True, "dry_run": True, "source": str(source), "dest": str(dest), **summary}
+
+        files = {}
+        methods = {}
+        for rel, digest in actions["unchanged"]:
+            if digest != manifest["files"][rel]["sha256"]:
+                # The edit now matches the checkout: an earlier .apex-new is obsolete
+                (dest / (rel + NEW_SUFFIX)).unlink(missing_ok=True)
+            files[rel] = dict(manifest["files"][rel], sha256=digest, source_sig=signature(source / rel),
+                              dest_sig=signature(dest / rel))
+        for rel, digest in actions["conflicts"]:
+            # Keep the edit and the old manifest entry, so it stays flagged until resolved
+            files[rel] = manifest["files"][rel]
+            new = dest / (rel + NEW_SUFFIX)
+            if digest != files[rel]["sha256"] and not (new.exists() and file_hash(new) == digest):
+                place(source / rel, new, "copy")
+        for rel, digest, _ in actions["copy"]:
+            method = place(source / rel, dest / rel, link)
+            (dest / (rel + NEW_SUFFIX)).unlink(missing_ok=True)
+            methods[method] = methods.get(method, 0) + 1
+            files[rel] = {"sha256": digest, "source_sig": signature(source / rel), "dest_sig": signature(dest / rel)}
+        for rel in actions["remove"]:
+            (dest / rel).unlink()
+        for rel in actions["kept"]:
+            files[rel] = manifest["files"][rel]
+
+        compiled = 0
+        if compile_py:
+            for rel, _, _ in actions["copy"]:
+                if rel.startswith("functions/") and rel.endswith(".py"):
+                    compiled += bool(compileall.compile_file(str(dest / rel), quiet=2))
+
+        migrations = [migrate_state(dest / live, dest / template) for live, template in STATE_FILES.items()]
+        save_manifest({"version": MANIFEST_VERSION, "source": str(source),
+                       "installed_at": datetime.utcnow().isoformat() + "Z", "files": files}, dest)
+
+    return {"success": True, "source": str(source), "dest": str(dest), **summary,
+            "methods": methods, "compiled": compiled, "state": migrations}
+
+
+def verify(dest: Path) -> dict:
+    """Installed files that were edited or deleted since the last install."""
+    manifest = load_manifest(dest)
+    modified, missing = [], []
+    for rel, entry in manifest["files"].items():
+        path = dest / rel
+        sig = signature(path)
+        if sig is None:
+            missing.append(rel)
+        elif sig != entry.get("dest_sig") and file_hash(path) != entry.get("sha256"):
+            modified.append(rel)
+    return {"success": not (modified or missing), "source": manifest.get("source"),
+            "installed_at": manifest.get("installed_at"), "files": len(manifest["files"]),
+            "modified": modified, "missing": missing}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Installer")
+    parser.add_argument("--dest", default=str(APEX_DIR), help="Install directory (default: APEX_DIR)")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    install_parser = subparsers.add_parser("install", help="Copy what changed from a checkout")
+    install_parser.add_argument("--source", help="APEX checkout (default: the one recorded in the manifest)")
+    install_parser.add_argument("--link", choices=LINK_MODES, default="auto",
+                                help="auto: reflink, else copy; hardlink shares inodes with the checkout")
+    install_parser.add_argument("--dry-run", action="store_true", help="Report the plan, change nothing")
+    install_parser.add_argument("--no-compile", action="store_true", help="Skip byte-compiling functions/")
+    install_parser.add_argument("--force", action="store_true",
+                                help=f"Overwrite locally edited files instead of writing <file>{NEW_SUFFIX}")
+
+    subparsers.add_parser("verify", help="Installed files edited or deleted since install")
+
+    migrate_parser = subparsers.add_parser("migrate", help="Add new template keys to a state file")
+    migrate_parser.add_argument("--state", required=True)
+    migrate_parser.add_argument("--template", required=True)
+
+    args = parser.parse_args()
+    dest = Path(args.dest).expanduser()
+
+    if args.action == "install":
+        source = args.source or load_manifest(dest).get("source")
+        if not source or not Path(source).is_dir():
+            print(json.dumps({"success": False, "error": f"No APEX checkout at {source}"}, indent=2))
+            sys.exit(1)
+        result = install(Path(source), dest, args.link, args.dry_run, not args.no_compile, args.force)
+    elif args.action == "verify":
+        result = verify(dest)
+    else:
+        result = {"success": True, **migrate_state(Path(args.state), Path(args.template))}
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success") else 1)
+
+
+if __name__ == "__main__":
+    main()
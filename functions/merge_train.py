@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+APEX Merge Train
+Lands swarm worker branches by speculatively building cumulative merges.
+
+For workers w1..wn the train builds base+w1, base+w1+w2, ... in scratch
+worktrees, runs the verify command on them concurrently and lands the
+longest passing prefix. With fewer jobs than prefixes it probes evenly
+spaced prefixes and bisects between the last pass and the first failure.
+The branch that breaks the train is ejected and the rest re-queued.
+A probe that cannot be set up (worktree add, verify command not runnable)
+says nothing about the branches: it is retried, then fails the whole train
+instead of ejecting anyone.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import git_helper
+from conflict_detector import get_changed_files
+from worktree_manager import get_repo_root, load_swarm_queue, run_git, save_swarm_queue
+
+OUTPUT_TAIL = 2000
+SETUP_RETRIES = 1
+
+# git worktree add/remove update shared admin files; serialize them.
+_worktree_lock = threading.Lock()
+
+
+class TrainError(Exception):
+    """A probe failed for reasons unrelated to the branches under test."""
+
+
+def build_prefix(repo_root: str, base_sha: str, branches: list[str], k: int, scratch: Path) -> dict:
+    """Merge branches[:k] onto base_sha in a fresh detached worktree."""
+    path = scratch / f"apex-train-{k}"
+    with _worktree_lock:
+        success, output = run_git(["worktree", "add", "--detach", str(path), base_sha], cwd=repo_root)
+        if not success:
+            # A failed add can leave a half-made worktree behind; clear it for the retry
+            run_git(["worktree", "remove", "--force", str(path)], cwd=repo_root)
+    if not success:
+        return {"k": k, "passed": False, "stage": "worktree", "setup_error": True, "output": output[-OUTPUT_TAIL:]}
+
+    probe = {"k": k, "path": str(path)}
+    for branch in branches[:k]:
+        success, output = run_git(
+            ["merge", "--no-ff", "--no-edit", "-m", f"train: merge {branch}", branch],
+            cwd=str(path)
+        )
+        if not success:
+            run_git(["merge", "--abort"], cwd=str(path))
+            probe.update({"passed": False, "stage": "merge", "branch": branch, "output": output[-OUTPUT_TAIL:]})
+            return probe
+
+    _, probe["commit"] = run_git(["rev-parse", "HEAD"], cwd=str(path))
+    probe["passed"] = True
+    return probe
+
+
+def verify_prefix(probe: dict, command: Optional[str], timeout: Optional[int]) -> dict:
+    """Run the verification command inside the probe's worktree."""
+    if not probe.get("passed") or not command:
+        return probe
+    try:
+        result = subprocess.run(
+            command,
+            shell=True,
+            cwd=probe["path"],
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+        probe["passed"] = result.returncode == 0
+        if not probe["passed"]:
+            probe["stage"] = "verify"
+            probe["output"] = (result.stdout + result.stderr)[-OUTPUT_TAIL:]
+    except subprocess.TimeoutExpired:
+        probe.update({"passed": False, "stage": "verify", "output": f"timed out after {timeout}s"})
+    except OSError as e:
+        probe.update({"passed": False, "stage": "verify", "setup_error": True, "output": str(e)})
+    return probe
+
+
+def evaluate_prefix(repo_root: str, base_sha: str, branches: list[str], k: int, scratch: Path,
+                    command: Optional[str], timeout: Optional[int]) -> dict:
+    start = time.perf_counter()
+    probe = build_prefix(repo_root, base_sha, branches, k, scratch)
+    try:
+        probe = verify_prefix(probe, command, timeout)
+    finally:
+        if probe.get("path"):
+            with _worktree_lock:
+                run_git(["worktree", "remove", "--force", probe.pop("path")], cwd=repo_root)
+    probe["duration_ms"] = round((time.perf_counter() - start) * 1000)
+    return probe
+
+
+def pick_probes(lo: int, hi: int, total: int, jobs: int) -> list[int]:
+    """
+    Choose prefix lengths to test in (lo, hi).
+
+    lo is the longest known-good prefix, hi the shortest known-bad one
+    (total + 1 while none has failed). Before any failure the full train is
+    always probed; afterwards points are spread evenly to bisect.
+    """
+    candidates = list(range(lo + 1, hi))
+    if len(candidates) <= jobs:
+        return candidates
+    picks = set()
+    if hi > total:
+        picks.add(total)
+    slots = jobs - len(picks)
+    for i in range(1, slots + 1):
+        picks.add(lo + i * (hi - lo) // (slots + 1))
+    return sorted(p for p in picks if lo < p < hi)
+
+
+def find_longest_prefix(repo_root: str, base_sha: str, branches: list[str], command: Optional[str],
+                        jobs: int, timeout: Optional[int]) -> dict:
+    """
+    Locate the longest passing prefix, assuming failures are monotonic.
+    Raises TrainError when a probe still cannot be set up after retrying.
+    """
+    total = len(branches)
+    lo, hi = 0, total + 1
+    probes = {}
+    rounds = 0
+
+    with tempfile.TemporaryDirectory(prefix="apex-train-") as tmp, ThreadPoolExecutor(max_workers=jobs) as pool:
+        scratch = Path(tmp)
+        try:
+            while hi - lo > 1:
+                ks = pick_probes(lo, hi, total, jobs)
+                rounds += 1
+                futures = {
+                    k: pool.submit(evaluate_prefix, repo_root, base_sha, branches, k, scratch, command, timeout)
+                    for k in ks
+                }
+                for k, future in futures.items():
+                    probe = future.result()
+                    for _ in range(SETUP_RETRIES):
+                        if not probe.get("setup_error"):
+                            break
+                        probe = evaluate_prefix(repo_root, base_sha, branches, k, scratch, command, timeout)
+                    if probe.get("setup_error"):
+                        raise TrainError(f"prefix {k} could not be set up ({probe['stage']}): {probe['output']}")
+                    probes[k] = probe
+
+                failed = [k for k in ks if not probes[k]["passed"]]
+                if failed:
+                    hi = min(hi, min(failed))
+                passed = [k for k in ks if probes[k]["passed"] and k < hi]
+                if passed:
+                    lo = max(lo, max(passed))
+        finally:
+            run_git(["worktree", "prune"], cwd=repo_root)
+
+    return {
+        "prefix": lo,
+        "commit": probes[lo]["commit"] if lo else base_sha,
+        "failed_at": hi if hi <= total else None,
+        "failure": probes.get(hi) if hi <= total else None,
+        "rounds": rounds,
+        "probes": [
+            {key: value for key, value in probes[k].items() if key != "output"}
+            for k in sorted(probes)
+        ],
+    }
+
+
+def land(repo_root: str, base: str, old_sha: str, new_sha: str) -> tuple[bool, str]:
+    """Fast-forward base to new_sha, updating the checkout if base is checked out."""
+    if old_sha == new_sha:
+        return True, "nothing to land"
+    _, current = run_git(["symbolic-ref", "--short", "-q", "HEAD"], cwd=repo_root)
+    if current == base:
+        result = run_git(["merge", "--ff-only", new_sha], cwd=repo_root)
+    else:
+        result = run_git(["update-ref", f"refs/heads/{base}", new_sha, old_sha], cwd=repo_root)
+    git_helper.forget_ref()  # base moved: drop memoized lookups of it
+    return result
+
+
+def record_in_queue(landed: list[dict], ejected: list[dict]):
+    """Mirror train results into swarm-queue.json for workers given by ID."""
+    if not any(item.get("worker") for item in landed + ejected):
+        return
+    data = load_swarm_queue()
+    workers = data.get("workers", {})
+    for item in landed:
+        if item.get("worker"):
+            task = workers.get(item["worker"], {}).get("task")
+            data.setdefault("completed", []).append({"id": task, "worker": item["worker"], "commit": item["commit"]})
+    for item in ejected:
+        if item.get("worker"):
+            data.setdefault("conflicts", []).append({
+                "worker": item["worker"],
+                "branch": item["branch"],
+                "stage": item["stage"],
+                "overlap": item["overlap"],
+                "detected_at": datetime.utcnow().isoformat() + "Z",
+            })
+    save_swarm_queue(data)
+
+
+def run_train(
+    branches: list[str],
+    base: str = "main",
+    command: Optional[str] = None,
+    jobs: Optional[int] = None,
+    timeout: Optional[int] = None,
+    dry_run: bool = False,
+    worker_ids: Optional[dict[str, str]] = None
+) -> dict:
+    """Land as many branches as possible, ejecting each one that breaks the train."""
+    repo_root = get_repo_root()
+    worker_ids = worker_ids or {}
+    jobs = max(1, jobs or len(branches))
+    success, base_sha = run_git(["rev-parse", "--verify", base], cwd=repo_root)
+    if not success:
+        return {"success": False, "error": f"Unknown base branch: {base}"}
+
+    remaining = list(branches)
+    landed, ejected, passes = [], [], []
+    head = base_sha
+
+    while remaining:
+        try:
+            result = find_longest_prefix(repo_root, head, remaining, command, jobs, timeout)
+        except TrainError as e:
+            if not dry_run:
+                record_in_queue(landed, ejected)
+            return {"success": False, "error": str(e), "base": base, "base_before": base_sha, "head": head,
+                    "landed": landed, "ejected": ejected, "passes": passes}
+        passes.append({key: value for key, value in result.items() if key != "failure"})
+
+        if not dry_run and result["prefix"]:
+            success, output = land(repo_root, base, head, result["commit"])
+            if not success:
+                return {"success": False, "error": f"Landing failed: {output}", "landed": landed, "passes": passes}
+        for branch in remaining[:result["prefix"]]:
+            landed.append({"branch": branch, "worker": worker_ids.get(branch), "commit": result["commit"]})
+        head = result["commit"]
+
+        if result["failed_at"] is None:
+            break
+
+        culprit = remaining[result["failed_at"] - 1]
+        culprit_files = get_changed_files(culprit, base_sha)
+        overlap = set()
+        for item in landed:
+            overlap |= culprit_files & get_changed_files(item["branch"], base_sha)
+        ejected.append({
+            "branch": culprit,
+            "worker": worker_ids.get(culprit),
+            "stage": result["failure"].get("stage"),
+            "output": result["failure"].get("output", ""),
+            "overlap": sorted(overlap),
+        })
+        remaining = remaining[result["failed_at"]:]
+
+    if not dry_run:
+        record_in_queue(landed, ejected)
+
+    return {
+        "success": not ejected,
+        "dry_run": dry_run,
+        "base": base,
+        "base_before": base_sha,
+        "head": head,
+        "landed": landed,
+        "ejected": ejected,
+        "passes": passes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Merge Train")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--workers", help="Comma-separated worker IDs (branches apex-swarm-N)")
+    target.add_argument("--branches", help="Comma-separated branch names, in merge order")
+    parser.add_argument("--base", default="main", help="Branch to land onto")
+    parser.add_argument("--verify", help="Command run in each speculative merge (e.g. 'npm test')")
+    parser.add_argument("--jobs", type=int, help="Concurrent prefixes (default: one per branch)")
+    parser.add_argument("--timeout", type=int, help="Verify timeout in seconds")
+    parser.add_argument("--dry-run", action="store_true", help="Build and verify but do not land")
+
+    args = parser.parse_args()
+
+    if args.workers:
+        ids = [w.strip() for w in args.workers.split(",") if w.strip()]
+        branches = [f"apex-swarm-{w}" for w in ids]
+        worker_ids = dict(zip(branches, ids))
+    else:
+        branches = [b.strip() for b in args.branches.split(",") if b.strip()]
+        worker_ids = {}
+
+    result = run_train(branches, args.base, args.verify, args.jobs, args.timeout, args.dry_run, worker_ids)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success") else 1)
+
+
+if __name__ == "__main__":
+    main()
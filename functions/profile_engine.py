@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+APEX Profile Engine
+Cluster similar user corrections and promote them into preferences.
+
+Each correction is normalized into a feature set (stemmed words of the
+correction plus its learned preference) and summarized by a MinHash signature.
+Signatures are banded into an LSH index, so finding the corrections
+similar to a new one costs a few bucket lookups, not a pass over the
+log. A correction with the same `learned` preference as an indexed one
+always joins its cluster, however differently it is worded. Similar
+corrections are joined into clusters; a cluster of
+PROMOTE_AT corrections becomes a `preferences_learned` entry (the
+"2+ similar corrections" rule in skills/apex-profile.md), and one of
+DRIFT_AT raises a drift indicator.
+
+The index lives next to the profile (profile-index.json), so the raw
+`corrections` log can stay capped at MAX_CORRECTIONS without losing the
+clusters it fed.
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import random
+import re
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+APEX_STATE_DIR = Path(os.environ.get("APEX_STATE_DIR", Path.home() / ".config" / "opencode" / "apex" / "state"))
+APEX_PROFILE = Path(os.environ.get("APEX_PROFILE", APEX_STATE_DIR / "apex-profile.json"))
+
+NUM_PERM = 64
+BANDS = 32               # 32 bands x 2 rows: a 0.4-Jaccard pair collides >99% of the time
+ROWS = NUM_PERM // BANDS
+SIMILARITY = 0.4         # estimated Jaccard to count as "similar"
+LEARNED_WEIGHT = 4
+PROMOTE_AT = 2
+DRIFT_AT = 3
+MAX_CORRECTIONS = 50     # raw log kept in the profile
+MAX_INDEXED = 1000       # signatures kept in the index
+BUCKET_CAP = 32          # newest entries per LSH bucket
+
+MERSENNE = (1 << 61) - 1
+EMPTY_SIGNATURE = [MERSENNE] * NUM_PERM  # minhashes are < MERSENNE, so only an empty set has this
+_rng = random.Random(46)
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE), _rng.randrange(0, MERSENNE)) for _ in range(NUM_PERM)]
+
+STOPWORDS = frozenset("""
+a an and are as at be but by do for from have i in is it its just me much my of on or please so
+that the this to too was we with you your
+""".split())
+LEARNED_FORMAT = re.compile(r"^\s*([a-z_]+)\s*[:=]\s*(.+?)\s*$")
+
+
+def stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def learned_key(correction: dict) -> str:
+    return " ".join((correction.get("learned") or "").lower().split())
+
+
+def features(correction: dict) -> set[str]:
+    """
+    Stemmed content words of the correction, plus the learned preference.
+    Context is left out: it describes the task, which differs every time,
+    while the correction and the preference it implies are what repeat.
+    """
+    words = re.findall(r"[a-z0-9_']+", str(correction.get("correction") or "").lower())
+    feats = {stem(w) for w in words if w not in STOPWORDS}
+    learned = learned_key(correction)
+    if learned:
+        # Same inferred preference is the strongest evidence: weight it as several features
+        feats.update(f"learned={learned}#{i}" for i in range(LEARNED_WEIGHT))
+    return feats
+
+
+def signature(feats: set[str]) -> list[int]:
+    if not feats:
+        return list(EMPTY_SIGNATURE)
+    hashes = [int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), "big") for f in feats]
+    return [min((a * h + b) % MERSENNE for h in hashes) for a, b in PERMUTATIONS]
+
+
+def band_keys(sig: list[int]) -> list[str]:
+    return [f"{band}:" + hashlib.blake2b(",".join(map(str, sig[band * ROWS:(band + 1) * ROWS])).encode(),
+                                          digest_size=8).hexdigest() for band in range(BANDS)]
+
+
+def estimate_similarity(a: list[int], b: list[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def empty_index() -> dict:
+    return {"next_id": 1, "entries": {}, "buckets": {}, "parents": {}, "clusters": {}, "learned": {}}
+
+
+class CorrectionIndex:
+    """MinHash LSH over corrections with union-find clusters."""
+
+    def __init__(self, data: dict = None):
+        self.data = data or empty_index()
+        if "learned" not in self.data:
+            # Indexes written before exact-preference matching
+            self.data["learned"] = {learned_key(e): entry_id for entry_id, e in self.data.get("entries", {}).items()
+                                    if learned_key(e)}
+        for key, value in empty_index().items():
+            self.data.setdefault(key, value)
+
+    def find(self, entry_id: str) -> str:
+        parents = self.data["parents"]
+        root = entry_id
+        while parents.get(root, root) != root:
+            root = parents[root]
+        while parents.get(entry_id, entry_id) != root:
+            parents[entry_id], entry_id = root, parents[entry_id]
+        return root
+
+    def candidates(self, sig: list[int]) -> set[str]:
+        found = set()
+        for key in band_keys(sig):
+            found.update(self.data["buckets"].get(key, []))
+        return found
+
+    def similar(self, sig: list[int]) -> list[tuple[str, float]]:
+        entries = self.data["entries"]
+        scored = [(c, estimate_similarity(sig, entries[c]["sig"])) for c in self.candidates(sig) if c in entries]
+        return sorted((item for item in scored if item[1] >= SIMILARITY), key=lambda item: -item[1])
+
+    def matches(self, correction: dict) -> tuple[list[int], list[tuple[str, float]]]:
+        """Signature of a correction plus its similar entries, exact-preference match first."""
+        feats = features(correction)
+        sig = signature(feats)
+        if not feats:
+            # All stopwords and no preference: every such signature is identical,
+            # so it carries no evidence of similarity
+            return sig, []
+        matches = self.similar(sig)
+        same = self.data["learned"].get(learned_key(correction))
+        if same in self.data["entries"] and all(m != same for m, _ in matches):
+            matches.insert(0, (same, estimate_similarity(sig, self.data["entries"][same]["sig"])))
+        return sig, matches
+
+    def size(self, root: str) -> int:
+        cluster = self.data["clusters"][root]
+        return len(cluster["members"]) + cluster.get("evicted", 0)
+
+    def add(self, correction: dict) -> dict:
+        sig, matches = self.matches(correction)
+        entry_id = str(self.data["next_id"])
+        self.data["next_id"] += 1
+        self.data["entries"][entry_id] = {
+            "sig": sig,
+            "learned": (correction.get("learned") or "").strip(),
+            "text": (correction.get("correction") or "").strip()[:200],
+            "timestamp": correction.get("timestamp"),
+        }
+        # A feature-less correction stays out of the buckets (see matches)
+        for key in band_keys(sig) if sig != EMPTY_SIGNATURE else ():
+            bucket = self.data["buckets"].setdefault(key, [])
+            bucket.append(entry_id)
+            del bucket[:-BUCKET_CAP]
+        if learned_key(correction):
+            self.data["learned"][learned_key(correction)] = entry_id
+
+        self.data["parents"][entry_id] = entry_id
+        clusters = self.data["clusters"]
+        clusters[entry_id] = {"members": [entry_id]}
+        for other, _ in matches:
+            self.union(entry_id, other)
+        self.evict()
+        root = self.find(entry_id)
+        return {"id": entry_id, "cluster": root, "cluster_size": self.size(root),
+                "similar": [{"id": other, "similarity": round(score, 3)} for other, score in matches[:5]]}
+
+    def union(self, a: str, b: str):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        clusters = self.data["clusters"]
+        # Keep the older cluster id so promotions stay attached to it
+        if int(root_b) > int(root_a):
+            root_a, root_b = root_b, root_a
+        self.data["parents"][root_a] = root_b
+        merged = clusters.pop(root_a, {"members": []})
+        target = clusters.setdefault(root_b, {"members": []})
+        target["members"] = sorted(set(target["members"]) | set(merged["members"]), key=int)
+        if merged.get("evicted"):
+            target["evicted"] = target.get("evicted", 0) + merged["evicted"]
+        if root_a not in self.data["entries"]:
+            # An evicted root only held its members together: repoint them and drop it
+            for member in merged["members"]:
+                self.data["parents"][member] = root_b
+            self.data["parents"].pop(root_a, None)
+        if merged.get("promoted") and not target.get("promoted"):
+            target["promoted"] = merged["promoted"]
+
+    def evict(self):
+        """
+        Drop the oldest signatures beyond MAX_INDEXED.
+
+        An evicted entry leaves its cluster's member list but still counts
+        toward its size. Its union-find node goes too, once the surviving
+        members point straight at the root; a cluster left with no indexed
+        members is dropped along with its root.
+        """
+        entries = self.data["entries"]
+        parents = self.data["parents"]
+        clusters = self.data["clusters"]
+        while len(entries) > MAX_INDEXED:
+            oldest = next(iter(entries))  # ids are inserted in increasing order
+            for key in band_keys(entries[oldest]["sig"]):
+                bucket = self.data["buckets"].get(key, [])
+                if oldest in bucket:
+                    bucket.remove(oldest)
+                if not bucket:
+                    self.data["buckets"].pop(key, None)
+            learned = learned_key(entries[oldest])
+            if self.data["learned"].get(learned) == oldest:
+                del self.data["learned"][learned]
+
+            root = self.find(oldest)
+            cluster = clusters.get(root, {"members": []})
+            cluster["members"] = [m for m in cluster["members"] if m != oldest]
+            cluster["evicted"] = cluster.get("evicted", 0) + 1
+            for member in cluster["members"]:
+                parents[member] = root
+            if oldest != root:
+                parents.pop(oldest, None)
+            if not cluster["members"]:
+                clusters.pop(root, None)
+                parents.pop(root, None)
+            del entries[oldest]
+
+    def cluster_summary(self, root: str) -> dict:
+        cluster = self.data["clusters"][root]
+        entries = self.data["entries"]
+        members = [m for m in cluster["members"] if m in entries]
+        learned = Counter(entries[m]["learned"] for m in members if entries[m]["learned"])
+        return {
+            "cluster": root,
+            "size": self.size(root),
+            "preference": learned.most_common(1)[0][0] if learned else None,
+            "examples": [entries[m]["text"] for m in members[-3:]],
+            "promoted": cluster.get("promoted"),
+        }
+
+
+def read_json(path: Path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return default
+
+
+def write_json(path: Path, data):
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def index_path(profile_path: Path) -> Path:
+    return profile_path.parent / "profile-index.json"
+
+
+def apply_preference(profile: dict, preference: str):
+    """Set `field: value` preferences on the matching profile section; returns the path set."""
+    match = LEARNED_FORMAT.match(preference or "")
+    if not match:
+        return None
+    field, value = match.groups()
+    parsed = {"true": True, "false": False}.get(value.lower(), value)
+    for section_name in ("communication", "coding", "workflow"):
+        section = profile.get("user_profile", {}).get(section_name, {})
+        if field in section and not isinstance(section[field], (list, dict)):
+            section[field] = parsed
+            return f"{section_name}.{field}"
+    return None
+
+
+def promote(profile: dict, index: CorrectionIndex, root: str, now: str) -> dict:
+    """Create or refresh the preferences_learned entry for a cluster."""
+    summary = index.cluster_summary(root)
+    learned = profile.setdefault("user_profile", {}).setdefault("preferences_learned", [])
+    # Clusters merge over time: an entry promoted under a merged-away id still belongs here
+    entry = next((p for p in learned if isinstance(p, dict) and p.get("cluster") in index.data["parents"]
+                  and index.find(p["cluster"]) == root), None)
+    if entry is None and summary["preference"]:
+        # Its old cluster id may have been evicted from the index since
+        entry = next((p for p in learned if isinstance(p, dict)
+                      and p.get("preference") == summary["preference"]), None)
+    newly = entry is None
+    if newly:
+        entry = {"cluster": root, "promoted_at": now}
+        learned.append(entry)
+        index.data["clusters"][root]["promoted"] = now
+    entry.update({
+        "cluster": root,
+        "preference": summary["preference"] or summary["examples"][-1],
+        "evidence": summary["size"],
+        "examples": summary["examples"],
+        "updated_at": now,
+    })
+    applied = apply_preference(profile, summary["preference"])
+    if applied:
+        entry["applied_to"] = applied
+    return {"promoted": newly, "preference": entry["preference"], "applied_to": applied}
+
+
+def add_correction(correction: dict, profile_path: Path = None) -> dict:
+    profile_path = profile_path or APEX_PROFILE
+    now = datetime.utcnow().isoformat() + "Z"
+    correction = dict(correction, timestamp=correction.get("timestamp") or now)
+    profile_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{profile_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        profile = read_json(profile_path, {})
+        idx_path = index_path(profile_path)
+        index = CorrectionIndex(read_json(idx_path, None)) if idx_path.exists() else build_index(profile)
+
+        result = index.add(correction)
+        user = profile.setdefault("user_profile", {})
+        user["corrections"] = (user.get("corrections", []) + [correction])[-MAX_CORRECTIONS:]
+        collab = profile.setdefault("collaboration_state", {})
+        collab["recent_corrections"] = collab.get("recent_corrections", 0) + 1
+
+        size = result["cluster_size"]
+        if size >= PROMOTE_AT:
+            result.update(promote(profile, index, result["cluster"], now))
+        if size >= DRIFT_AT:
+            summary = index.cluster_summary(result["cluster"])
+            indicators = [d for d in collab.get("drift_indicators", [])
+                          if not (isinstance(d, dict) and d.get("cluster") == result["cluster"])]
+            indicators.append({"cluster": result["cluster"], "type": "repeated_correction",
+                               "preference": summary["preference"], "count": size, "detected_at": now})
+            collab["drift_indicators"] = indicators[-10:]
+            collab["recalibration_needed"] = True
+            result["drift"] = True
+
+        profile["updated"] = now
+        write_json(profile_path, profile)
+        write_json(idx_path, index.data)
+    return {"success": True, **result}
+
+
+def build_index(profile: dict) -> CorrectionIndex:
+    """Index the corrections already in a profile (for profiles predating the index)."""
+    index = CorrectionIndex()
+    for correction in profile.get("user_profile", {}).get("corrections", []):
+        if isinstance(correction, dict):
+            index.add(correction)
+    return index
+
+
+def find_similar(text: str, learned: str = "", profile_path: Path = None) -> dict:
+    profile_path = profile_path or APEX_PROFILE
+    idx_path = index_path(profile_path)
+    index = CorrectionIndex(read_json(idx_path, None)) if idx_path.exists() else build_index(read_json(profile_path, {}))
+    _, matches = index.matches({"correction": text, "learned": learned})
+    clusters = []
+    for root in dict.fromkeys(index.find(m) for m, _ in matches):
+        clusters.append(index.cluster_summary(root))
+    return {"success": True, "similar": [{"id": m, "similarity": round(s, 3)} for m, s in matches[:10]],
+            "clusters": clusters}
+
+
+def list_clusters(profile_path: Path = None, min_size: int = 1) -> dict:
+    profile_path = profile_path or APEX_PROFILE
+    idx_path = index_path(profile_path)
+    index = CorrectionIndex(read_json(idx_path, None)) if idx_path.exists() else build_index(read_json(profile_path, {}))
+    clusters = [index.cluster_summary(root) for root in index.data["clusters"]]
+    clusters = sorted((c for c in clusters if c["size"] >= min_size), key=lambda c: -c["size"])
+    return {"success": True, "indexed": len(index.data["entries"]), "clusters": clusters}
+
+
+def rebuild(profile_path: Path = None) -> dict:
+    profile_path = profile_path or APEX_PROFILE
+    with open(f"{profile_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        index = build_index(read_json(profile_path, {}))
+        write_json(index_path(profile_path), index.data)
+    return {"success": True, "indexed": len(index.data["entries"]), "clusters": len(index.data["clusters"])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Profile Engine")
+    parser.add_argument("--profile", help="apex-profile.json path (default: APEX_PROFILE)")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    add_parser = subparsers.add_parser("add", help="Record a correction and cluster it")
+    add_parser.add_argument("--correction", required=True, help="What the user said")
+    add_parser.add_argument("--context", default="", help="What was being done")
+    add_parser.add_argument("--learned", default="", help="Inferred preference, e.g. 'verbosity: concise'")
+
+    similar_parser = subparsers.add_parser("similar", help="Corrections similar to a text (no insert)")
+    similar_parser.add_argument("--text", required=True)
+    similar_parser.add_argument("--learned", default="")
+
+    clusters_parser = subparsers.add_parser("clusters", help="Correction clusters, largest first")
+    clusters_parser.add_argument("--min-size", type=int, default=1)
+
+    subparsers.add_parser("rebuild", help="Re-index the corrections in the profile")
+
+    args = parser.parse_args()
+    profile_path = Path(args.profile) if args.profile else APEX_PROFILE
+
+    if args.action == "add":
+        result = add_correction({"context": args.context, "correction": args.correction,
+                                 "learned": args.learned}, profile_path)
+    elif args.action == "similar":
+        result = find_similar(args.text, args.learned, profile_path)
+    elif args.action == "clusters":
+        result = list_clusters(profile_path, args.min_size)
+    else:
+        result = rebuild(profile_path)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+APEX Read Cache
+Inspect the file-read cache kept by apex-metrics.sh and attach summaries.
+
+The metrics hook records every Read (path, range, mtime/size, content hash,
+iteration, token estimate) in read-cache.json next to apex-state.json. The
+circuit breaker uses it to warn before an unchanged range is read again and
+shows the attached summary instead, if there is one.
+
+Swarm workers (APEX_WORKER, or a cwd inside an apex-worker-N worktree) keep
+their own state and cache under state/workers/, resolved as the hooks do.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+WORKER_RE = re.compile(r"/apex-worker-(\d+)(/|$)")
+
+
+def current_worker() -> str:
+    """Swarm worker id as the hooks resolve it: APEX_WORKER, else an apex-worker-N cwd."""
+    if os.environ.get("APEX_WORKER"):
+        return os.environ["APEX_WORKER"]
+    match = WORKER_RE.search(os.getcwd())
+    return match.group(1) if match else ""
+
+
+APEX_STATE_DIR = Path(os.environ.get("APEX_STATE_DIR", Path.home() / ".config" / "opencode" / "apex" / "state"))
+APEX_WORKER = current_worker()
+if "APEX_STATE" in os.environ:
+    APEX_STATE = Path(os.environ["APEX_STATE"])
+    READ_CACHE = Path(os.environ.get("APEX_READ_CACHE", APEX_STATE.parent / "read-cache.json"))
+elif APEX_WORKER:
+    APEX_STATE = APEX_STATE_DIR / "workers" / f"apex-worker-{APEX_WORKER}.json"
+    READ_CACHE = Path(os.environ.get("APEX_READ_CACHE", APEX_STATE_DIR / "workers" / f"read-cache-{APEX_WORKER}.json"))
+else:
+    APEX_STATE = APEX_STATE_DIR / "apex-state.json"
+    READ_CACHE = Path(os.environ.get("APEX_READ_CACHE", APEX_STATE.parent / "read-cache.json"))
+
+
+def load_cache() -> dict:
+    if READ_CACHE.exists():
+        with open(READ_CACHE) as f:
+            return json.load(f)
+    return {"seq": 0, "entries": {}}
+
+
+def update_cache(mutate) -> dict:
+    """Apply mutate(cache) under the same lock the hooks use for state."""
+    with open(f"{APEX_STATE}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        cache = load_cache()
+        result = mutate(cache)
+        tmp_path = READ_CACHE.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, READ_CACHE)
+    return result
+
+
+def summarize(path: str, summary: str) -> dict:
+    """Attach a summary to every cached range of path."""
+    path = os.path.abspath(path)
+
+    def mutate(cache: dict) -> dict:
+        keys = [k for k, entry in cache["entries"].items() if entry.get("path") == path]
+        for key in keys:
+            cache["entries"][key]["summary"] = summary
+        return {"success": bool(keys), "path": path, "ranges": len(keys)}
+
+    return update_cache(mutate)
+
+
+def stats() -> dict:
+    entries = list(load_cache()["entries"].values())
+    repeated = sorted((e for e in entries if e.get("reads", 1) > 1), key=lambda e: -e["reads"])
+    return {
+        "entries": len(entries),
+        "cached_tokens": sum(e.get("tokens", 0) for e in entries),
+        "summarized": sum(1 for e in entries if e.get("summary")),
+        "wasted_tokens": sum(e.get("tokens", 0) * (e.get("reads", 1) - 1) for e in entries),
+        "top_repeats": [
+            {"path": e["path"], "reads": e["reads"], "tokens": e.get("tokens", 0)} for e in repeated[:10]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Read Cache")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    summary_parser = subparsers.add_parser("summarize", help="Attach a summary to a cached file")
+    summary_parser.add_argument("path", help="File path as passed to Read")
+    summary_parser.add_argument("--summary", required=True, help="Short summary shown on re-read")
+
+    subparsers.add_parser("stats", help="Show cache statistics")
+    subparsers.add_parser("clear", help="Drop all cached reads")
+
+    args = parser.parse_args()
+
+    if args.action == "summarize":
+        result = summarize(args.path, args.summary)
+    elif args.action == "clear":
+        result = update_cache(lambda cache: cache.update({"entries": {}}) or {"success": True})
+    else:
+        result = stats()
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success", True) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+APEX Session Archive
+Append-only, rotating, compressed store for completed session records.
+
+Records are appended to an active JSONL segment. Once it holds
+SEGMENT_RECORDS records it is sealed into a gzip segment. index.json keeps,
+per segment, the session ids, date range and per-day aggregates (sessions,
+tool calls, duration, outcomes, phases), so aggregate queries over whole
+days are answered from the index without decompressing anything. The
+index also keeps running totals and the last few records, so the Stop
+hook's rolling summary is O(1).
+"""
+
+import argparse
+import fcntl
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+APEX_STATE_DIR = Path(os.environ.get("APEX_STATE_DIR", Path.home() / ".config" / "opencode" / "apex" / "state"))
+ARCHIVE_DIR = Path(os.environ.get("APEX_SESSION_ARCHIVE", APEX_STATE_DIR / "sessions"))
+
+SEGMENT_RECORDS = int(os.environ.get("APEX_SESSION_SEGMENT_RECORDS", 1000))
+RECENT_IN_STATE = 5
+ACTIVE_NAME = "active.jsonl"
+INDEX_NAME = "index.json"
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def normalize(record: dict) -> dict:
+    """Fill derived fields (day, duration_s) used by the index."""
+    record = dict(record)
+    started, ended = parse_time(record.get("started")), parse_time(record.get("ended"))
+    if "duration_s" not in record:
+        record["duration_s"] = int((ended - started).total_seconds()) if started and ended else 0
+    record["tool_calls"] = int(record.get("tool_calls") or 0)
+    record.setdefault("outcome", "session_end")
+    record.setdefault("final_phase", "unknown")
+    stamp = ended or started
+    record["day"] = stamp.strftime("%Y-%m-%d") if stamp else "unknown"
+    return record
+
+
+# ---------------------------------------------------------------------------
+# Aggregates
+# ---------------------------------------------------------------------------
+
+def empty_bucket() -> dict:
+    return {"sessions": 0, "tool_calls": 0, "duration_s": 0, "max_tool_calls": 0,
+            "outcomes": {}, "phases": {}}
+
+
+def add_to_bucket(bucket: dict, record: dict):
+    bucket["sessions"] += 1
+    bucket["tool_calls"] += record["tool_calls"]
+    bucket["duration_s"] += record["duration_s"]
+    bucket["max_tool_calls"] = max(bucket["max_tool_calls"], record["tool_calls"])
+    bucket["outcomes"][record["outcome"]] = bucket["outcomes"].get(record["outcome"], 0) + 1
+    bucket["phases"][record["final_phase"]] = bucket["phases"].get(record["final_phase"], 0) + 1
+
+
+def merge_bucket(target: dict, bucket: dict):
+    for key in ("sessions", "tool_calls", "duration_s"):
+        target[key] += bucket[key]
+    target["max_tool_calls"] = max(target["max_tool_calls"], bucket["max_tool_calls"])
+    for field in ("outcomes", "phases"):
+        for name, count in bucket[field].items():
+            target[field][name] = target[field].get(name, 0) + count
+
+
+def empty_segment(name: str) -> dict:
+    return {"file": name, "records": 0, "first_day": None, "last_day": None, "ids": [], "by_day": {}}
+
+
+def recent_entry(record: dict) -> dict:
+    return {key: record.get(key) for key in ("id", "ended", "final_phase", "tool_calls", "outcome")}
+
+
+def index_totals(index: dict) -> dict:
+    """Totals over every indexed segment, from the per-day buckets."""
+    total = empty_bucket()
+    for segment in index["segments"] + [index["active"]]:
+        for bucket in segment["by_day"].values():
+            merge_bucket(total, bucket)
+    return total
+
+
+def index_record(segment: dict, record: dict):
+    segment["records"] += 1
+    segment["ids"].append(record.get("id"))
+    day = record["day"]
+    if day != "unknown":
+        segment["first_day"] = min(segment["first_day"] or day, day)
+        segment["last_day"] = max(segment["last_day"] or day, day)
+    add_to_bucket(segment["by_day"].setdefault(day, empty_bucket()), record)
+
+
+# ---------------------------------------------------------------------------
+# Storage
+# ---------------------------------------------------------------------------
+
+class Archive:
+    def __init__(self, root: Path = None):
+        self.root = Path(root or ARCHIVE_DIR)
+        self.index_path = self.root / INDEX_NAME
+        self.active_path = self.root / ACTIVE_NAME
+
+    def load_index(self) -> dict:
+        if not self.index_path.exists():
+            return {"version": 1, "next_segment": 1, "segments": [], "active": empty_segment(ACTIVE_NAME),
+                    "totals": empty_bucket(), "recent": []}
+        with open(self.index_path) as f:
+            index = json.load(f)
+        if "totals" not in index:
+            # Index written before running totals: rebuild once (saved by the next write)
+            index["totals"] = index_totals(index)
+            recent = []
+            for segment in reversed(self.segments(index)):
+                recent[:0] = [recent_entry(r) for r in self.read_segment(segment)][-(RECENT_IN_STATE - len(recent)):]
+                if len(recent) >= RECENT_IN_STATE:
+                    break
+            index["recent"] = recent
+        return index
+
+    def save_index(self, index: dict):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def locked(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        lock = open(self.root / ".lock", "w")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def append(self, records: list[dict]) -> dict:
+        """Append records, sealing the active segment whenever it fills up."""
+        with self.locked():
+            index = self.load_index()
+            for record in records:
+                record = normalize(record)
+                with open(self.active_path, "a") as f:
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                index_record(index["active"], record)
+                add_to_bucket(index["totals"], record)
+                index["recent"] = (index["recent"] + [recent_entry(record)])[-RECENT_IN_STATE:]
+                if index["active"]["records"] >= SEGMENT_RECORDS:
+                    self.seal(index)
+            self.save_index(index)
+        return index
+
+    def seal(self, index: dict):
+        """Compress the active segment into sessions-NNNNNN.jsonl.gz."""
+        name = f"sessions-{index['next_segment']:06d}.jsonl.gz"
+        tmp_path = self.root / (name + ".tmp")
+        with open(self.active_path, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+            dst.write(src.read())
+        os.replace(tmp_path, self.root / name)
+        segment = index["active"]
+        segment["file"] = name
+        index["segments"].append(segment)
+        index["next_segment"] += 1
+        index["active"] = empty_segment(ACTIVE_NAME)
+        self.active_path.unlink()
+
+    def prune(self, keep: int) -> int:
+        """Delete all but the newest `keep` sealed segments."""
+        with self.locked():
+            index = self.load_index()
+            dropped = index["segments"][:-keep] if keep else index["segments"]
+            gone = set()
+            for segment in dropped:
+                (self.root / segment["file"]).unlink(missing_ok=True)
+                gone.update(segment["ids"])
+            index["segments"] = index["segments"][len(dropped):]
+            index["totals"] = index_totals(index)
+            index["recent"] = [entry for entry in index["recent"] if entry["id"] not in gone]
+            self.save_index(index)
+        return len(dropped)
+
+    def read_segment(self, segment: dict) -> Iterator[dict]:
+        path = self.root / segment["file"]
+        if not path.exists():
+            return
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def segments(self, index: dict) -> list[dict]:
+        active = index["active"]
+        return index["segments"] + ([active] if active["records"] else [])
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+def in_range(day: str, since: Optional[str], until: Optional[str]) -> bool:
+    if since and (day == "unknown" or day < since):
+        return False
+    if until and (day == "unknown" or day > until):
+        return False
+    return True
+
+
+def stats(archive: Archive, since: str = None, until: str = None, group_by: str = None) -> dict:
+    """Aggregate from per-day index buckets; segments outside the range are skipped."""
+    index = archive.load_index()
+    total = empty_bucket()
+    groups = {}
+    skipped = 0
+    for segment in archive.segments(index):
+        if (since and segment["last_day"] and segment["last_day"] < since) or \
+           (until and segment["first_day"] and segment["first_day"] > until):
+            skipped += 1
+            continue
+        for day, bucket in segment["by_day"].items():
+            if not in_range(day, since, until):
+                continue
+            merge_bucket(total, bucket)
+            if group_by == "day":
+                merge_bucket(groups.setdefault(day, empty_bucket()), bucket)
+            elif group_by == "month":
+                merge_bucket(groups.setdefault(day[:7], empty_bucket()), bucket)
+
+    result = summarize_bucket(total)
+    result["segments"] = len(archive.segments(index))
+    result["segments_skipped"] = skipped
+    if group_by in ("day", "month"):
+        result["groups"] = {key: summarize_bucket(groups[key]) for key in sorted(groups)}
+    elif group_by in ("outcome", "phase"):
+        result["groups"] = total["outcomes" if group_by == "outcome" else "phases"]
+    return result
+
+
+def summarize_bucket(bucket: dict) -> dict:
+    sessions = bucket["sessions"]
+    return {
+        "sessions": sessions,
+        "tool_calls": bucket["tool_calls"],
+        "avg_tool_calls": round(bucket["tool_calls"] / sessions, 2) if sessions else 0,
+        "max_tool_calls": bucket["max_tool_calls"],
+        "duration_s": bucket["duration_s"],
+        "avg_duration_s": round(bucket["duration_s"] / sessions, 1) if sessions else 0,
+        "outcomes": bucket["outcomes"],
+        "phases": bucket["phases"],
+    }
+
+
+def find(archive: Archive, session_id: str) -> Optional[dict]:
+    """Look up one session, decompressing only the segment that holds it."""
+    index = archive.load_index()
+    for segment in reversed(archive.segments(index)):
+        if session_id in segment["ids"]:
+            for record in archive.read_segment(segment):
+                if record.get("id") == session_id:
+                    return record
+    return None
+
+
+def list_sessions(archive: Archive, since: str = None, until: str = None, outcome: str = None,
+                  limit: int = 20) -> list[dict]:
+    """Newest-first records; only segments overlapping the date range are opened."""
+    index = archive.load_index()
+    found = []
+    for segment in reversed(archive.segments(index)):
+        if (since and segment["last_day"] and segment["last_day"] < since) or \
+           (until and segment["first_day"] and segment["first_day"] > until):
+            continue
+        matches = [
+            r for r in archive.read_segment(segment)
+            if in_range(r.get("day", "unknown"), since, until) and (not outcome or r.get("outcome") == outcome)
+        ]
+        found.extend(reversed(matches))
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+
+def rolling_summary(archive: Archive, index: dict = None) -> dict:
+    """
+    Small summary kept in apex-state.json in place of the full history.
+    Read from the index's running totals; pass the index returned by
+    append() to summarize exactly what was written under the lock.
+    """
+    index = index or archive.load_index()
+    total = index["totals"]
+    recent = list(reversed(index["recent"]))
+    return {
+        "sessions": total["sessions"],
+        "tool_calls": total["tool_calls"],
+        "duration_s": total["duration_s"],
+        "outcomes": total["outcomes"],
+        "recent": recent,
+        "archive": str(archive.root),
+    }
+
+
+def read_records(raw: str) -> list[dict]:
+    raw = raw.strip()
+    if not raw:
+        return []
+    if raw.startswith("["):
+        return json.loads(raw)
+    return [json.loads(line) for line in raw.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Session Archive")
+    parser.add_argument("--archive", help="Archive directory (default: state/sessions)")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    subparsers.add_parser("append", help="Append session records (JSON object, array or JSONL on stdin)")
+
+    stats_parser = subparsers.add_parser("stats", help="Aggregate tool calls, outcomes and durations")
+    stats_parser.add_argument("--since", help="First day (YYYY-MM-DD)")
+    stats_parser.add_argument("--until", help="Last day (YYYY-MM-DD)")
+    stats_parser.add_argument("--group-by", choices=["day", "month", "outcome", "phase"])
+
+    list_parser = subparsers.add_parser("list", help="List recent sessions")
+    list_parser.add_argument("--since")
+    list_parser.add_argument("--until")
+    list_parser.add_argument("--outcome")
+    list_parser.add_argument("--limit", type=int, default=20)
+
+    show_parser = subparsers.add_parser("show", help="Show one session by id")
+    show_parser.add_argument("id")
+
+    subparsers.add_parser("summary", help="Rolling summary for apex-state.json")
+
+    prune_parser = subparsers.add_parser("prune", help="Drop old sealed segments")
+    prune_parser.add_argument("--keep", type=int, required=True, help="Sealed segments to keep")
+
+    args = parser.parse_args()
+    archive = Archive(args.archive)
+
+    if args.action == "append":
+        records = read_records(sys.stdin.read())
+        index = archive.append(records)
+        result = {"success": True, "appended": len(records), "summary": rolling_summary(archive, index)}
+    elif args.action == "stats":
+        result = stats(archive, args.since, args.until, args.group_by)
+    elif args.action == "list":
+        sessions = list_sessions(archive, args.since, args.until, args.outcome, args.limit)
+        result = {"sessions": sessions, "count": len(sessions)}
+    elif args.action == "show":
+        record = find(archive, args.id)
+        result = {"success": record is not None, "session": record}
+    elif args.action == "summary":
+        result = rolling_summary(archive)
+    else:
+        result = {"success": True, "pruned": archive.prune(args.keep)}
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success", True) else 1)
+
+
+if __name__ == "__main__":
+    main()
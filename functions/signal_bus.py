@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+APEX Signal Bus
+In-process loop pipeline: pilot signals -> loop state -> exit gate -> APEX_STATUS.
+
+Replaces the per-iteration chain of signal_parser.py, exit_gate.py and
+status_generator.py processes. The gate is re-evaluated and the status
+block re-rendered only when their inputs change.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import sys
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+from exit_gate import evaluate
+from signal_parser import follow_lines, iter_signals, mmap_lines
+from status_generator import render_status
+
+Handler = Callable[[dict[str, Any]], None]
+
+
+class SignalBus:
+    """Minimal publish/subscribe dispatcher keyed by signal type ("*" = all)."""
+
+    def __init__(self):
+        self._handlers: dict[str, list[Handler]] = {}
+
+    def subscribe(self, signal_type: str, handler: Handler):
+        self._handlers.setdefault(signal_type, []).append(handler)
+
+    def publish(self, signal: dict[str, Any]):
+        for handler in self._handlers.get("*", []):
+            handler(signal)
+        for handler in self._handlers.get(signal.get("type", ""), []):
+            handler(signal)
+
+
+# LoopState field -> (loop_mode section, key) it is persisted to
+PERSISTED = {
+    "phase": ("status", "phase"),
+    "iteration": ("status", "iteration"),
+    "max_iterations": ("status", "max_iterations"),
+    "exit_signal": ("exit_conditions", "exit_signal"),
+    "required": ("exit_conditions", "heuristics_required"),
+    "stagnation": ("stagnation", "consecutive_same"),
+}
+
+
+def persisted_in(state: dict) -> dict:
+    """The persisted loop fields present in an apex-state.json document."""
+    loop = state.get("loop_mode", {})
+    values = {name: loop[section][key] for name, (section, key) in PERSISTED.items()
+              if key in loop.get(section, {})}
+    if isinstance(loop.get("completion_indicators"), dict):
+        values["indicators"] = {str(k): bool(v) for k, v in loop["completion_indicators"].items()}
+    return values
+
+
+@dataclass
+class LoopState:
+    phase: str = "INIT"
+    iteration: int = 1
+    max_iterations: int = 10
+    indicators: dict[str, bool] = field(default_factory=dict)
+    exit_signal: bool = False
+    required: int = 2
+    stagnation: int = 0
+    stagnation_threshold: int = 3
+    state_hash: str = "unknown"
+    next_action: str = "Continue"
+
+    def __post_init__(self):
+        # Persisted fields as of the last read/write, on our side and on disk:
+        # the hooks and /apex commands edit the same fields while the bus runs
+        self._synced = {"ours": self.persisted(), "disk": {}}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "LoopState":
+        """Read the loop_mode section of apex-state.json."""
+        loop = state.get("loop_mode", {})
+        status = loop.get("status", {})
+        exits = loop.get("exit_conditions", {})
+        stagnation = loop.get("stagnation", {})
+        loop_state = cls(
+            phase=status.get("phase", "INIT"),
+            iteration=status.get("iteration", 1) or 1,
+            max_iterations=status.get("max_iterations", 10),
+            indicators={k: bool(v) for k, v in loop.get("completion_indicators", {}).items()},
+            exit_signal=bool(exits.get("exit_signal", False)),
+            required=exits.get("heuristics_required", 2),
+            stagnation=stagnation.get("consecutive_same", 0),
+            stagnation_threshold=stagnation.get("threshold", 3),
+            state_hash=stagnation.get("current_hash") or "unknown",
+        )
+        loop_state._synced["disk"] = persisted_in(state)
+        return loop_state
+
+    def persisted(self) -> dict:
+        values = {name: getattr(self, name) for name in PERSISTED}
+        values["indicators"] = dict(self.indicators)
+        return values
+
+    def changed(self) -> dict:
+        """Persisted fields (and indicator names) the bus changed since the last sync."""
+        ours = self._synced["ours"]
+        changed = {name: True for name in PERSISTED if getattr(self, name) != ours[name]}
+        changed["indicators"] = {k for k, v in self.indicators.items() if ours["indicators"].get(k) != v}
+        return changed
+
+    def merge(self, state: dict):
+        """
+        Pick up fields edited on disk since the last sync that the bus left
+        alone. Stagnant signals are added to the count on disk, since the
+        metrics hook bumps and resets it concurrently.
+        """
+        disk, before = persisted_in(state), self._synced["disk"]
+        changed = self.changed()
+        for name in PERSISTED:
+            if name == "stagnation" and name in disk:
+                self.stagnation = disk[name] + self.stagnation - self._synced["ours"]["stagnation"]
+            elif name in disk and name not in changed and disk[name] != before.get(name):
+                setattr(self, name, disk[name])
+        previous = before.get("indicators", {})
+        for name, value in disk.get("indicators", {}).items():
+            if name not in changed["indicators"] and value != previous.get(name):
+                self.indicators[name] = value
+
+    def apply_to(self, state: dict, decision: dict):
+        """
+        Write the fields the bus changed (and any missing from `state`) plus
+        the latest gate decision back into apex-state.json. Call merge() on
+        the same document first.
+        """
+        changed = self.changed()
+        disk = persisted_in(state)
+        loop = state.setdefault("loop_mode", {})
+        for name, (section, key) in PERSISTED.items():
+            if name in changed or name not in disk:
+                loop.setdefault(section, {})[key] = getattr(self, name)
+        indicators = loop.setdefault("completion_indicators", {})
+        for name, value in self.indicators.items():
+            if name in changed["indicators"] or name not in indicators:
+                indicators[name] = value
+        exits = loop.setdefault("exit_conditions", {})
+        exits["heuristics_met"] = decision["met_count"]
+        exits["decision"] = decision["decision"]
+        self._synced = {"ours": self.persisted(), "disk": persisted_in(state)}
+
+
+class LoopPipeline:
+    """Applies signals to a LoopState and keeps gate/status results current."""
+
+    def __init__(self, loop: LoopState, require_explicit: bool = True):
+        self.loop = loop
+        self.require_explicit = require_explicit
+        self.bus = SignalBus()
+        self.decision: Optional[dict] = None
+        self.status: Optional[str] = None
+        self.evaluations = 0
+        self.renders = 0
+        self._gate_key = None
+        self._status_key = None
+
+        self.bus.subscribe("*", self._on_any)
+        self.bus.subscribe("exit", self._on_exit)
+        self.bus.subscribe("blocked", self._on_blocked)
+        self.bus.subscribe("stagnant", self._on_stagnant)
+        self.bus.subscribe("handoff", self._on_handoff)
+        self.refresh()
+
+    # Signal handlers
+
+    def _on_any(self, signal: dict):
+        if isinstance(signal.get("phase"), str):
+            self.loop.phase = signal["phase"]
+        if isinstance(signal.get("iteration"), int):
+            self.loop.iteration = signal["iteration"]
+        if isinstance(signal.get("indicators"), dict):
+            for name, value in signal["indicators"].items():
+                self.loop.indicators[str(name)] = bool(value)
+        if isinstance(signal.get("next_action"), str):
+            self.loop.next_action = signal["next_action"]
+
+    def _on_exit(self, signal: dict):
+        self.loop.exit_signal = signal.get("success", True) is not False
+
+    def _on_blocked(self, signal: dict):
+        self.loop.next_action = f"Blocked: {signal.get('reason', 'external dependency')}"
+
+    def _on_stagnant(self, signal: dict):
+        self.loop.stagnation += 1
+
+    def _on_handoff(self, signal: dict):
+        self.loop.next_action = f"Handoff: {signal.get('reason', 'see deliverable.md')}"
+
+    # Incremental evaluation
+
+    def refresh(self) -> bool:
+        """Re-evaluate gate and status if inputs changed. Returns True on status change."""
+        loop = self.loop
+        gate_key = (tuple(loop.indicators.items()), loop.exit_signal, loop.required)
+        if gate_key != self._gate_key:
+            self.decision = evaluate(loop.indicators, loop.exit_signal, loop.required, self.require_explicit)
+            self._gate_key = gate_key
+            self.evaluations += 1
+
+        status_key = json.dumps(asdict(loop), sort_keys=True)
+        if status_key == self._status_key:
+            return False
+        self.status = render_status(
+            phase=loop.phase,
+            iteration=loop.iteration,
+            max_iterations=loop.max_iterations,
+            indicators=loop.indicators,
+            exit_signal=loop.exit_signal,
+            state_hash=loop.state_hash,
+            stagnation=loop.stagnation,
+            stagnation_threshold=loop.stagnation_threshold,
+            next_action=loop.next_action,
+        )
+        self._status_key = status_key
+        self.renders += 1
+        return True
+
+    def handle(self, signal: dict[str, Any]) -> dict[str, Any]:
+        """Apply one parsed signal and return the resulting event."""
+        if "error" not in signal:
+            self.bus.publish(signal)
+        changed = self.refresh()
+        return {"signal": signal, "decision": self.decision["decision"], "status_changed": changed}
+
+    def run(self, signals: Iterable[dict[str, Any]], on_event: Callable[[dict], None] = None,
+            until_exit: bool = False) -> dict:
+        for signal in signals:
+            event = self.handle(signal)
+            if on_event:
+                on_event(event)
+            if until_exit and self.decision["decision"] in ("exit", "blocked"):
+                break
+        return self.decision
+
+
+def load_state(path: Path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(path: Path, pipeline: LoopPipeline):
+    """Merge the pipeline's loop fields into the state file under the hooks' flock."""
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        state = load_state(path) if path.exists() else {}
+        pipeline.loop.merge(state)
+        # Fields merged from disk can move the gate: decide on the merged inputs
+        pipeline.refresh()
+        pipeline.loop.apply_to(state, pipeline.decision)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="APEX signal-driven loop pipeline")
+    parser.add_argument("--file", help="Agent output to read. Defaults stdin.")
+    parser.add_argument("--follow", action="store_true", help="Keep tailing --file as it grows")
+    parser.add_argument("--until-exit", action="store_true", help="Stop once the gate decides exit/blocked")
+    parser.add_argument("--state", help="apex-state.json to seed loop state from and write back to")
+    parser.add_argument("--no-explicit", action="store_true", help="Do not require explicit EXIT_SIGNAL")
+    parser.add_argument("--format", choices=["status", "jsonl"], default="status",
+                        help="Print APEX_STATUS blocks on change, or one JSON event per signal")
+    args = parser.parse_args()
+
+    if args.follow and not args.file:
+        parser.error("--follow requires --file")
+
+    state_path = Path(args.state) if args.state else None
+    loop = LoopState.from_state(load_state(state_path)) if state_path and state_path.exists() else LoopState()
+    pipeline = LoopPipeline(loop, require_explicit=not args.no_explicit)
+
+    def on_event(event: dict):
+        if state_path and event["status_changed"]:
+            save_state(state_path, pipeline)
+        if args.format == "jsonl":
+            print(json.dumps(event), flush=True)
+        elif event["status_changed"]:
+            print(pipeline.status, flush=True)
+
+    if args.follow:
+        lines = follow_lines(args.file)
+    elif args.file:
+        lines = mmap_lines(args.file)
+    else:
+        lines = sys.stdin.buffer
+
+    if args.format == "status":
+        print(pipeline.status, flush=True)
+    try:
+        decision = pipeline.run(iter_signals(lines), on_event, args.until_exit)
+    except KeyboardInterrupt:
+        decision = pipeline.decision
+
+    print(json.dumps({
+        "decision": decision,
+        "evaluations": pipeline.evaluations,
+        "renders": pipeline.renders,
+    }, indent=2), file=sys.stderr if args.format == "status" else sys.stdout)
+    return 0 if decision["can_exit"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,30 +3,203 @@
 
 import argparse
 import json
+import mmap
+import os
 import re
 import sys
-from typing import Any
+import time
+from typing import Any, Iterable, Iterator, Optional
 
 SIGNAL_RE = re.compile(r"```pilot-signal\s*(\{.*?\})\s*```", re.DOTALL)
 
+FENCE_OPEN = b"```pilot-signal"
+FENCE_CLOSE = b"```"
+MAX_BLOCK_BYTES = 64 * 1024
+FOLLOW_INTERVAL = 0.25
+
+
+def decode_signal(raw: str) -> Optional[dict[str, Any]]:
+    """Decode one block body. Returns None for non-v2 payloads."""
+    try:
+        signal = json.loads(raw)
+    except json.JSONDecodeError:
+        return {"error": "invalid_json", "raw": raw}
+    if isinstance(signal, dict) and signal.get("v") == 2 and isinstance(signal.get("type"), str):
+        return signal
+    return None
+
 
 def parse_signals(text: str) -> list[dict[str, Any]]:
     signals = []
     for match in SIGNAL_RE.finditer(text):
-        raw = match.group(1)
-        try:
-            signal = json.loads(raw)
-            if signal.get("v") == 2 and isinstance(signal.get("type"), str):
-                signals.append(signal)
-        except json.JSONDecodeError:
-            signals.append({"error": "invalid_json", "raw": raw})
+        signal = decode_signal(match.group(1))
+        if signal is not None:
+            signals.append(signal)
     return signals
 
 
+def iter_signals(lines: Iterable[bytes]) -> Iterator[dict[str, Any]]:
+    """
+    Line-oriented state machine over pilot-signal fences.
+
+    Fences may open or close anywhere in a line, as parse_signals allows,
+    and one line may hold several blocks. Yields each signal as soon as
+    its closing fence is seen. Only the current block is buffered, and
+    blocks larger than MAX_BLOCK_BYTES are reported as errors and dropped,
+    so memory stays bounded.
+    """
+    block = None
+    size = 0
+    overflow = False
+
+    for line in lines:
+        pos = 0
+        while True:
+            if block is None:
+                hit = line.find(FENCE_OPEN, pos)
+                if hit == -1:
+                    break
+                pos = hit + len(FENCE_OPEN)
+                block, size, overflow = [], 0, False
+                continue
+
+            close = line.find(FENCE_CLOSE, pos)
+            piece = (line[pos:] if close == -1 else line[pos:close]).strip()
+            size += len(piece)
+            if size > MAX_BLOCK_BYTES:
+                overflow = True
+                block = []
+            elif piece and not overflow:
+                block.append(piece)
+            if close == -1:
+                break
+
+            if overflow:
+                yield {"error": "block_too_large", "bytes": size}
+            else:
+                signal = decode_signal(b"\n".join(block).decode("utf-8", "replace"))
+                if signal is not None:
+                    yield signal
+            block = None
+            pos = close + len(FENCE_CLOSE)
+
+
+def inside_block(line: bytes, inside: bool = False) -> bool:
+    """Whether the state machine is inside a block after this line."""
+    pos = 0
+    while True:
+        if inside:
+            close = line.find(FENCE_CLOSE, pos)
+            if close == -1:
+                return True
+            inside, pos = False, close + len(FENCE_CLOSE)
+        else:
+            hit = line.find(FENCE_OPEN, pos)
+            if hit == -1:
+                return False
+            inside, pos = True, hit + len(FENCE_OPEN)
+
+
+def mmap_lines(path: str) -> Iterator[bytes]:
+    """
+    Yield candidate lines from a memory-mapped file.
+
+    Text between blocks is skipped with mmap.find() instead of being split
+    into lines, so only fence regions are materialized.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            end = len(mapped)
+            pos = 0
+            while pos < end:
+                hit = mapped.find(FENCE_OPEN, pos)
+                if hit == -1:
+                    return
+                start = mapped.rfind(b"\n", 0, hit) + 1
+                inside = False
+                while start < end:
+                    newline = mapped.find(b"\n", start)
+                    if newline == -1:
+                        newline = end
+                    line = mapped[start:newline]
+                    start = newline + 1
+                    yield line
+                    inside = inside_block(line, inside)
+                    if not inside:
+                        break
+                pos = start
+
+
+def follow_lines(path: str, interval: float = FOLLOW_INTERVAL) -> Iterator[bytes]:
+    """Tail a growing file, reopening it if it is truncated or rotated."""
+    while True:
+        # The agent may not have created its log yet
+        try:
+            f = open(path, "rb")
+            break
+        except FileNotFoundError:
+            time.sleep(interval)
+    inode = os.fstat(f.fileno()).st_ino
+    pending = b""
+    try:
+        while True:
+            chunk = f.readline()
+            if chunk:
+                pending += chunk
+                if pending.endswith(b"\n"):
+                    yield pending
+                    pending = b""
+                continue
+
+            time.sleep(interval)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_ino != inode or stat.st_size < f.tell():
+                f.close()
+                f = open(path, "rb")
+                inode = os.fstat(f.fileno()).st_ino
+                pending = b""
+    finally:
+        f.close()
+
+
+def stream(lines: Iterable[bytes], out=sys.stdout) -> int:
+    """Emit each signal as a JSONL line as soon as its block closes."""
+    count = 0
+    for signal in iter_signals(lines):
+        out.write(json.dumps(signal) + "\n")
+        out.flush()
+        count += 1
+    return count
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Parse pilot-signal code blocks")
     parser.add_argument("--file", help="File to parse. Defaults stdin.")
+    parser.add_argument("--stream", action="store_true", help="Scan incrementally and emit JSONL per signal")
+    parser.add_argument("--follow", action="store_true", help="Keep tailing --file as it grows (implies --stream)")
     args = parser.parse_args()
+
+    if args.follow and not args.file:
+        parser.error("--follow requires --file")
+
+    if args.stream or args.follow:
+        if args.follow:
+            lines = follow_lines(args.file)
+        elif args.file:
+            lines = mmap_lines(args.file)
+        else:
+            lines = sys.stdin.buffer
+        try:
+            count = stream(lines)
+        except KeyboardInterrupt:
+            return 0
+        return 0 if count else 1
+
     text = open(args.file).read() if args.file else sys.stdin.read()
     signals = parse_signals(text)
     print(json.dumps({"signals": signals, "count": len(signals)}, indent=2))
@@ -3,37 +3,37 @@
 
 import argparse
 import json
+from typing import Optional
 
 
 def checkbox(value: bool) -> str:
     return "x" if value else " "
 
 
-def main() -> int:
-    parser = argparse.ArgumentParser(description="Generate APEX_STATUS block")
-    parser.add_argument("--phase", default="INIT")
-    parser.add_argument("--iteration", type=int, default=1)
-    parser.add_argument("--max-iterations", type=int, default=5)
-    parser.add_argument("--progress", type=int)
-    parser.add_argument("--indicators", default="{}", help="JSON object of indicator booleans")
-    parser.add_argument("--exit-signal", default="false")
-    parser.add_argument("--state-hash", default="unknown")
-    parser.add_argument("--stagnation", type=int, default=0)
-    parser.add_argument("--stagnation-threshold", type=int, default=3)
-    parser.add_argument("--next-action", default="Continue")
-    args = parser.parse_args()
-
-    indicators = json.loads(args.indicators)
+def render_status(
+    phase: str = "INIT",
+    iteration: int = 1,
+    max_iterations: int = 5,
+    progress: Optional[int] = None,
+    indicators: Optional[dict] = None,
+    exit_signal: bool = False,
+    state_hash: str = "unknown",
+    stagnation: int = 0,
+    stagnation_threshold: int = 3,
+    next_action: str = "Continue",
+) -> str:
+    """Render an APEX_STATUS block."""
+    indicators = indicators or {}
     met = sum(1 for v in indicators.values() if v)
     total = len(indicators)
-    progress = args.progress if args.progress is not None else min(100, round((args.iteration / max(args.max_iterations, 1)) * 100))
-    exit_signal = str(args.exit_signal).lower() in {"1", "true", "yes", "y"}
+    if progress is None:
+        progress = min(100, round((iteration / max(max_iterations, 1)) * 100))
 
     lines = [
         "APEX_STATUS",
         "=" * 50,
-        f"Phase: {args.phase}",
-        f"Iteration: {args.iteration}/{args.max_iterations}",
+        f"Phase: {phase}",
+        f"Iteration: {iteration}/{max_iterations}",
         f"Progress: {progress}%",
         "",
         "Completion Indicators:",
@@ -49,12 +49,40 @@ def main() -> int:
         f"  Heuristics: {met}/{total} (need 2+)",
         f"  EXIT_SIGNAL: {str(exit_signal).lower()}",
         "",
-        f"Stagnation: {args.stagnation}/{args.stagnation_threshold}",
-        f"State Hash: {args.state_hash}",
-        f"Next Action: {args.next_action}",
+        f"Stagnation: {stagnation}/{stagnation_threshold}",
+        f"State Hash: {state_hash}",
+        f"Next Action: {next_action}",
         "=" * 50,
     ])
-    print("\n".join(lines))
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate APEX_STATUS block")
+    parser.add_argument("--phase", default="INIT")
+    parser.add_argument("--iteration", type=int, default=1)
+    parser.add_argument("--max-iterations", type=int, default=5)
+    parser.add_argument("--progress", type=int)
+    parser.add_argument("--indicators", default="{}", help="JSON object of indicator booleans")
+    parser.add_argument("--exit-signal", default="false")
+    parser.add_argument("--state-hash", default="unknown")
+    parser.add_argument("--stagnation", type=int, default=0)
+    parser.add_argument("--stagnation-threshold", type=int, default=3)
+    parser.add_argument("--next-action", default="Continue")
+    args = parser.parse_args()
+
+    print(render_status(
+        phase=args.phase,
+        iteration=args.iteration,
+        max_iterations=args.max_iterations,
+        progress=args.progress,
+        indicators=json.loads(args.indicators),
+        exit_signal=str(args.exit_signal).lower() in {"1", "true", "yes", "y"},
+        state_hash=args.state_hash,
+        stagnation=args.stagnation,
+        stagnation_threshold=args.stagnation_threshold,
+        next_action=args.next_action,
+    ))
     return 0
 
 
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+APEX Swarm Monitor
+Live swarm status: every worker's state file, queue entry, conflicts and
+token usage in one continuously refreshed terminal view.
+
+Files are polled by (mtime, size) and only re-parsed when they change, and
+the terminal is redrawn line by line, so an idle swarm of 20+ workers costs
+a few stat() calls per refresh.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from worktree_manager import SWARM_QUEUE, WORKER_STATE_DIR
+
+BAR_WIDTH = 10
+RULE = "━" * 52
+
+
+class FileCache:
+    """Parsed JSON files, re-read only when their stat signature changes."""
+
+    def __init__(self):
+        self.entries = {}
+        self.reads = 0
+
+    def get(self, path: Path, default=None):
+        try:
+            stat = path.stat()
+        except OSError:
+            self.entries.pop(path, None)
+            return default
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self.entries.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # Caught mid-write by a non-atomic writer: keep the last good copy
+            return cached[1] if cached else default
+        self.reads += 1
+        self.entries[path] = (signature, data)
+        return data
+
+    def signature(self, paths: list[Path]) -> tuple:
+        """Cheap change detector for a set of files (no parsing)."""
+        signature = []
+        for path in paths:
+            try:
+                stat = path.stat()
+                signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((str(path), None, None))
+        return tuple(signature)
+
+
+def discover_workers(queue: dict, state_dir: Path) -> list[str]:
+    """Worker ids from the swarm queue plus any worker state files."""
+    ids = set(queue.get("workers", {}).keys())
+    if state_dir.is_dir():
+        for entry in os.scandir(state_dir):
+            if entry.name.startswith("apex-worker-") and entry.name.endswith(".json"):
+                ids.add(entry.name[len("apex-worker-"):-len(".json")])
+    return sorted(ids, key=lambda w: (not w.isdigit(), int(w) if w.isdigit() else 0, w))
+
+
+def worker_summary(worker_id: str, info: dict, state: dict) -> dict:
+    """Condense one worker's queue entry and apex-state.json into a status row."""
+    breakers = state.get("circuit_breakers", {})
+    loop = state.get("loop_mode", {})
+    session = state.get("current_session") or {}
+    stuck = breakers.get("stuck_loop", {})
+    tokens = (state.get("metrics") or {}).get("tokens", {})
+
+    progress = loop.get("status", {}).get("progress_percent", 0)
+    if not progress:
+        indicators = loop.get("completion_indicators", {})
+        if indicators and any(indicators.values()):
+            progress = round(100 * sum(1 for v in indicators.values() if v) / len(indicators))
+
+    if breakers.get("tripped"):
+        health = "tripped"
+    elif stuck.get("stagnation_count", 0) >= stuck.get("threshold", 3):
+        health = "stuck"
+    elif info.get("status") in {"completed", "landed", "done"}:
+        health = "done"
+    else:
+        health = "ok"
+
+    return {
+        "id": worker_id,
+        "task": info.get("task") or info.get("branch") or "-",
+        "status": info.get("status", "unknown"),
+        "phase": session.get("phase") or loop.get("status", {}).get("phase", "INIT"),
+        "progress": int(progress),
+        "tool_calls": breakers.get("tool_calls", {}).get("cycle_current", 0),
+        "tokens_input": tokens.get("input", 0),
+        "tokens_output": tokens.get("output", 0),
+        "health": health,
+    }
+
+
+def collect(cache: FileCache, queue_path: Path = None, state_dir: Path = None) -> dict:
+    """Snapshot of the whole swarm built from cached files."""
+    queue_path = queue_path or SWARM_QUEUE
+    state_dir = state_dir or WORKER_STATE_DIR
+    queue = cache.get(queue_path, {}) or {}
+    workers = []
+    for worker_id in discover_workers(queue, state_dir):
+        info = queue.get("workers", {}).get(worker_id, {})
+        state = cache.get(state_dir / f"apex-worker-{worker_id}.json", {}) or {}
+        workers.append(worker_summary(worker_id, info, state))
+
+    return {
+        "swarm_id": queue.get("swarm_id", "-"),
+        "workers": workers,
+        "queue": {
+            "pending": len(queue.get("queue", [])),
+            "completed": len(queue.get("completed", [])),
+            "in_progress": sum(1 for w in workers if w["health"] in {"ok", "stuck"}),
+        },
+        "tokens": {
+            "input": sum(w["tokens_input"] for w in workers),
+            "output": sum(w["tokens_output"] for w in workers),
+        },
+        "conflicts": queue.get("conflicts", []),
+    }
+
+
+def render(snapshot: dict) -> list[str]:
+    """Status lines for a snapshot (no terminal control codes)."""
+    marks = {"done": "✓", "stuck": "⚠️ STUCK", "tripped": "⛔ TRIPPED", "ok": ""}
+    lines = [
+        RULE,
+        "APEX SWARM STATUS",
+        RULE,
+        f"Swarm: {snapshot['swarm_id']}",
+        f"Workers: {snapshot['queue']['in_progress']} active / {len(snapshot['workers'])}",
+        "",
+    ]
+    for w in snapshot["workers"]:
+        filled = min(BAR_WIDTH, w["progress"] * BAR_WIDTH // 100)
+        bar = "█" * filled + "░" * (BAR_WIDTH - filled)
+        task = w["task"] if len(w["task"]) <= 28 else w["task"][:27] + "…"
+        lines.append(f"Worker {w['id']:<3} {bar} {w['progress']:>3}%  {task:<28} ({w['phase']}) "
+                     f"{w['tool_calls']} calls {marks[w['health']]}".rstrip())
+    queue = snapshot["queue"]
+    conflicts = snapshot["conflicts"]
+    lines.extend([
+        "",
+        f"Queue: {queue['pending']} pending, {queue['completed']} completed, {queue['in_progress']} in-progress",
+        f"Tokens: {snapshot['tokens']['input']:,} input / {snapshot['tokens']['output']:,} output",
+        "",
+        f"Conflicts: {len(conflicts)}" if conflicts else "Conflicts: None",
+    ])
+    for conflict in conflicts[-5:]:
+        files = conflict.get("overlap") or conflict.get("files") or []
+        detail = ", ".join(files[:3]) or conflict.get("stage", "")
+        lines.append(f"  worker {conflict.get('worker', '?')}: {detail}")
+    lines.append(RULE)
+    return lines
+
+
+class DiffRenderer:
+    """Redraw only the terminal lines that changed since the last frame."""
+
+    def __init__(self, stream=sys.stdout):
+        self.stream = stream
+        self.previous = None
+
+    def draw(self, lines: list[str]) -> int:
+        out = []
+        if self.previous is None:
+            out.append("\x1b[2J\x1b[H")
+            out.extend(f"{line}\x1b[K\n" for line in lines)
+            changed = len(lines)
+        else:
+            changed = 0
+            for row, line in enumerate(lines):
+                if row >= len(self.previous) or self.previous[row] != line:
+                    out.append(f"\x1b[{row + 1};1H{line}\x1b[K")
+                    changed += 1
+            if len(lines) < len(self.previous):
+                out.append(f"\x1b[{len(lines) + 1};1H\x1b[J")
+            out.append(f"\x1b[{len(lines) + 1};1H")
+        self.previous = lines
+        if out:
+            self.stream.write("".join(out))
+            self.stream.flush()
+        return changed
+
+
+def watch(interval: float = 0.5, queue_path: Path = None, state_dir: Path = None, iterations: int = None):
+    """Refresh until interrupted; frames are skipped while nothing changed."""
+    queue_path = queue_path or SWARM_QUEUE
+    state_dir = state_dir or WORKER_STATE_DIR
+    cache = FileCache()
+    renderer = DiffRenderer()
+    last_signature = None
+    frame = 0
+    sys.stdout.write("\x1b[?25l")
+    try:
+        while iterations is None or frame < iterations:
+            queue = cache.get(queue_path, {}) or {}
+            paths = [queue_path, state_dir] + [state_dir / f"apex-worker-{w}.json"
+                                               for w in discover_workers(queue, state_dir)]
+            signature = cache.signature(paths)
+            if signature != last_signature:
+                renderer.draw(render(collect(cache, queue_path, state_dir)))
+                last_signature = signature
+            frame += 1
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stdout.write("\x1b[?25h")
+        sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Swarm Monitor")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    watch_parser = subparsers.add_parser("watch", help="Live dashboard (Ctrl-C to exit)")
+    watch_parser.add_argument("--interval", type=float, default=0.5, help="Poll interval in seconds")
+    watch_parser.add_argument("--once", action="store_true", help="Print one frame and exit")
+    watch_parser.add_argument("--format", choices=["text", "json"], default="text")
+
+    args = parser.parse_args()
+
+    if args.once or args.format == "json":
+        snapshot = collect(FileCache())
+        if args.format == "json":
+            print(json.dumps(snapshot, indent=2))
+        else:
+            print("\n".join(render(snapshot)))
+        return
+
+    if not sys.stdout.isatty():
+        print("Error: watch needs a terminal (use --once or --format json)", file=sys.stderr)
+        sys.exit(1)
+    watch(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+APEX Swarm State
+Aggregate the per-worker state files written by the hooks.
+
+Inside an apex-worker-N worktree the hooks keep their counters in
+state/workers/apex-worker-N.json (own lock, no cross-worker contention).
+Cycle-wide limits still apply to the swarm as a whole: the circuit breaker
+sums every worker's cycle counters, and this module produces the same
+totals for status output and folds them back into the shared state when
+the swarm ends.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from worktree_manager import APEX_STATE_DIR, WORKER_STATE_DIR
+
+SHARED_STATE = Path(os.environ.get("APEX_STATE", APEX_STATE_DIR / "apex-state.json"))
+
+
+def read_state(path: Path) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def worker_files(state_dir: Path = None) -> list[Path]:
+    state_dir = state_dir or WORKER_STATE_DIR
+    if not state_dir.is_dir():
+        return []
+    return sorted(state_dir.glob("apex-worker-*.json"))
+
+
+def worker_counters(state: dict) -> dict:
+    breakers = state.get("circuit_breakers", {})
+    tokens = (state.get("metrics") or {}).get("tokens", {})
+    return {
+        "tool_calls": breakers.get("tool_calls", {}).get("cycle_current", 0),
+        "errors": breakers.get("errors", {}).get("cycle_current", 0),
+        "tokens_input": tokens.get("input", 0),
+        "tokens_output": tokens.get("output", 0),
+        "tripped": bool(breakers.get("tripped")),
+        "trip_reason": breakers.get("trip_reason"),
+        "files_edited": len(breakers.get("same_file_edits", {}).get("files", {})),
+    }
+
+
+def aggregate(state_dir: Path = None, shared_path: Path = None) -> dict:
+    """Per-worker counters plus swarm totals against the shared cycle limits."""
+    shared = read_state(shared_path or SHARED_STATE)
+    limits = shared.get("circuit_breakers", {})
+    workers = {}
+    for path in worker_files(state_dir):
+        workers[path.stem[len("apex-worker-"):]] = worker_counters(read_state(path))
+
+    totals = {
+        key: sum(w[key] for w in workers.values())
+        for key in ("tool_calls", "errors", "tokens_input", "tokens_output", "files_edited")
+    }
+    tool_limit = limits.get("tool_calls", {}).get("cycle_limit", 200)
+    error_limit = limits.get("errors", {}).get("cycle_limit", 15)
+    return {
+        "workers": workers,
+        "totals": totals,
+        "limits": {
+            "tool_calls": {"used": totals["tool_calls"], "limit": tool_limit,
+                           "exceeded": totals["tool_calls"] >= tool_limit},
+            "errors": {"used": totals["errors"], "limit": error_limit,
+                       "exceeded": totals["errors"] >= error_limit},
+        },
+        "tripped": sorted(w for w, c in workers.items() if c["tripped"]),
+    }
+
+
+def fold(state_dir: Path = None, shared_path: Path = None, keep: bool = False) -> dict:
+    """Add the swarm's totals to the shared state and retire the worker files."""
+    shared_path = shared_path or SHARED_STATE
+    summary = aggregate(state_dir, shared_path)
+    if not shared_path.exists():
+        return {"success": False, "error": f"No shared state at {shared_path}"}
+
+    with open(f"{shared_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        state = read_state(shared_path)
+        totals = summary["totals"]
+        metrics = state.get("metrics") or {}
+        tokens = metrics.setdefault("tokens", {})
+        tokens["input"] = tokens.get("input", 0) + totals["tokens_input"]
+        tokens["output"] = tokens.get("output", 0) + totals["tokens_output"]
+        tokens["total"] = tokens["input"] + tokens["output"]
+        state["metrics"] = metrics
+        state["last_swarm"] = {
+            "workers": len(summary["workers"]),
+            "tool_calls": totals["tool_calls"],
+            "errors": totals["errors"],
+            "tripped": summary["tripped"],
+            "folded_at": datetime.utcnow().isoformat() + "Z",
+        }
+        tmp_path = shared_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, shared_path)
+
+    removed = []
+    if not keep:
+        for path in worker_files(state_dir):
+            worker_id = path.stem[len("apex-worker-"):]
+            for stale in (path, Path(f"{path}.lock"), path.parent / f"read-cache-{worker_id}.json"):
+                if stale.exists():
+                    stale.unlink()
+            removed.append(worker_id)
+
+    return {"success": True, "folded": summary["totals"], "removed": removed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Swarm State")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    subparsers.add_parser("summary", help="Per-worker counters and swarm-wide totals")
+
+    fold_parser = subparsers.add_parser("fold", help="Merge worker totals into the shared state")
+    fold_parser.add_argument("--keep", action="store_true", help="Keep the worker state files")
+
+    args = parser.parse_args()
+
+    if args.action == "fold":
+        result = fold(keep=args.keep)
+    else:
+        result = aggregate()
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("success", True) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,43 @@ Breaks down complex tasks into parallelizable subtasks.
 """
 
 import argparse
+import fcntl
+import hashlib
 import json
+import math
+import os
 import re
+import subprocess
 import sys
+import zlib
 from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from pathlib import Path
 from typing import Optional
 
+APEX_STATE_DIR = Path(os.environ.get("APEX_STATE_DIR", Path.home() / ".config" / "opencode" / "apex" / "state"))
+TASK_HISTORY = APEX_STATE_DIR / "task-history.jsonl"
+TASK_MODEL = APEX_STATE_DIR / "task-model.json"
+DECOMPOSE_CACHE = APEX_STATE_DIR / "decompose-cache.json"
+DECOMPOSE_CACHE_MAX = 100
+DECOMPOSE_CACHE_VERSION = 1
+
+FEATURE_BUCKETS = 2048
+NEIGHBORS = 5
+MIN_SIMILARITY = 0.2
+MAX_HISTORY = 5000
+MAX_SUGGESTED_WORKERS = 3
+TARGETS = ("tool_calls", "tokens", "duration_s")
+
+# Keyword fallback when no similar work has been recorded yet
+SIZE_PRIOR = {
+    "S": {"tool_calls": 15, "tokens": 20000, "duration_s": 600},
+    "M": {"tool_calls": 40, "tokens": 60000, "duration_s": 1800},
+    "L": {"tool_calls": 90, "tokens": 150000, "duration_s": 3600},
+}
+FEATURE_STOPWORDS = {"a", "an", "the", "and", "or", "for", "to", "of", "in", "on", "with", "implement",
+                     "add", "create", "build", "write"}
+
 
 @dataclass
 class Subtask:
@@ -85,23 +116,225 @@ def estimate_size(description: str) -> str:
     return 'M'
 
 
+# ---------------------------------------------------------------------------
+# Learned cost model: k nearest neighbours over hashed TF-IDF text features
+# ---------------------------------------------------------------------------
+
+def text_features(description: str) -> dict[int, float]:
+    """Hashed unigram + bigram counts."""
+    words = [w for w in re.findall(r"[a-z0-9]+", description.lower()) if w not in FEATURE_STOPWORDS]
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts = {}
+    for gram in grams:
+        bucket = zlib.crc32(gram.encode()) % FEATURE_BUCKETS
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+def weigh(counts: dict[int, float], idf: dict, default_idf: float) -> dict[int, float]:
+    vector = {b: c * idf.get(str(b), default_idf) for b, c in counts.items()}
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {b: v / norm for b, v in vector.items()}
+
+
+def read_history(path: Path = None) -> list[dict]:
+    path = path or TASK_HISTORY
+    if not path.exists():
+        return []
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("description") and all(isinstance(record.get(t), (int, float)) for t in TARGETS):
+                records.append(record)
+    return records[-MAX_HISTORY:]
+
+
+def history_fingerprint(path: Path = None) -> Optional[list[int]]:
+    path = path or TASK_HISTORY
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def train_model(records: list[dict]) -> dict:
+    """Build idf weights and normalized vectors; targets are stored as log1p."""
+    features = [text_features(r["description"]) for r in records]
+    df = {}
+    for counts in features:
+        for bucket in counts:
+            df[bucket] = df.get(bucket, 0) + 1
+    n = len(records)
+    idf = {str(b): math.log((1 + n) / (1 + count)) + 1 for b, count in df.items()}
+    default_idf = math.log(1 + n) + 1
+    rows = []
+    for counts, record in zip(features, records):
+        vector = weigh(counts, idf, default_idf)
+        rows.append([
+            list(vector.keys()),
+            [round(v, 5) for v in vector.values()],
+            [round(math.log1p(max(record[t], 0)), 5) for t in TARGETS],
+        ])
+    return {"version": 1, "samples": n, "idf": idf, "default_idf": default_idf, "rows": rows}
+
+
+def load_model() -> Optional[dict]:
+    """Cached model, retrained whenever task-history.jsonl changes."""
+    fingerprint = history_fingerprint()
+    if fingerprint is None:
+        return None
+    if TASK_MODEL.exists():
+        try:
+            with open(TASK_MODEL) as f:
+                model = json.load(f)
+            if model.get("fingerprint") == fingerprint:
+                return model
+        except (json.JSONDecodeError, OSError):
+            pass
+    records = read_history()
+    if not records:
+        return None
+    model = train_model(records)
+    model["fingerprint"] = fingerprint
+    TASK_MODEL.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = TASK_MODEL.with_suffix(f".tmp-{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(model, f)
+    os.replace(tmp_path, TASK_MODEL)
+    return model
+
+
+def predict_cost(description: str, model: Optional[dict]) -> dict:
+    """Similarity-weighted mean of the nearest recorded subtasks, else the keyword prior."""
+    if model and model.get("rows"):
+        query = weigh(text_features(description), model["idf"], model["default_idf"])
+        scored = []
+        for indices, values, targets in model["rows"]:
+            similarity = sum(query.get(b, 0.0) * v for b, v in zip(indices, values))
+            if similarity >= MIN_SIMILARITY:
+                scored.append((similarity, targets))
+        scored.sort(key=lambda item: -item[0])
+        neighbours = scored[:NEIGHBORS]
+        if neighbours:
+            total = sum(sim for sim, _ in neighbours)
+            estimate = {
+                t: round(math.expm1(sum(sim * targets[i] for sim, targets in neighbours) / total))
+                for i, t in enumerate(TARGETS)
+            }
+            estimate.update({
+                "source": "model",
+                "neighbours": len(neighbours),
+                "confidence": round(neighbours[0][0], 3),
+            })
+            return estimate
+
+    estimate = dict(SIZE_PRIOR[estimate_size(description)])
+    estimate.update({"source": "keywords", "neighbours": 0, "confidence": 0.0})
+    return estimate
+
+
+def size_from_cost(cost: dict) -> str:
+    if cost["tool_calls"] < 25:
+        return "S"
+    if cost["tool_calls"] < 70:
+        return "M"
+    return "L"
+
+
+def record_actual(description: str, tool_calls: int, tokens: int, duration_s: int) -> dict:
+    """Append a completed subtask's actual cost to task-history.jsonl."""
+    record = {
+        "description": description,
+        "tool_calls": int(tool_calls),
+        "tokens": int(tokens),
+        "duration_s": int(duration_s),
+        "recorded_at": datetime.utcnow().isoformat() + "Z",
+    }
+    TASK_HISTORY.parent.mkdir(parents=True, exist_ok=True)
+    with open(TASK_HISTORY, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return record
+
+
+def actuals_from_state(path: str) -> dict:
+    """Tool calls, tokens and elapsed time of the current session in apex-state.json."""
+    with open(path) as f:
+        state = json.load(f)
+    # A fresh swarm worker's state has "metrics": null; treat null sections as empty
+    tool_calls = ((state.get("circuit_breakers") or {}).get("tool_calls") or {}).get("cycle_current")
+    tokens = ((state.get("metrics") or {}).get("tokens") or {}).get("total")
+    actuals = {
+        "tool_calls": tool_calls or 0,
+        "tokens": tokens or 0,
+        "duration_s": 0,
+    }
+    started = (state.get("current_session") or {}).get("started")
+    if started:
+        start = datetime.fromisoformat(started.replace("Z", "+00:00"))
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        actuals["duration_s"] = int((datetime.now(timezone.utc) - start).total_seconds())
+    return actuals
+
+
+def assign_workers(subtasks: list[dict], parallel_groups: list[list[str]]) -> tuple[int, list[dict]]:
+    """
+    Size the swarm from predicted durations.
+
+    A group needs ceil(total / longest) workers before its longest subtask
+    dominates; subtasks are then packed longest-first onto the least
+    loaded worker (LPT).
+    """
+    by_id = {t["id"]: t for t in subtasks}
+    workers = 1
+    for group in parallel_groups:
+        costs = [by_id[t]["estimated_cost"]["duration_s"] or 1 for t in group]
+        workers = max(workers, min(len(group), math.ceil(sum(costs) / max(costs))))
+    workers = min(workers, MAX_SUGGESTED_WORKERS)
+
+    schedule = []
+    for level, group in enumerate(parallel_groups):
+        loads = [[0, []] for _ in range(min(workers, len(group)))]
+        for task_id in sorted(group, key=lambda t: -by_id[t]["estimated_cost"]["duration_s"]):
+            slot = min(loads, key=lambda load: load[0])
+            slot[0] += by_id[task_id]["estimated_cost"]["duration_s"]
+            slot[1].append(task_id)
+        schedule.append({
+            "group": level + 1,
+            "workers": [{"worker": i + 1, "tasks": tasks, "duration_s": load} for i, (load, tasks) in enumerate(loads)],
+            "duration_s": max(load for load, _ in loads),
+        })
+    return workers, schedule
+
+
 def decompose_task(task: str, max_subtasks: int = 5) -> dict:
     """Decompose a task into subtasks with dependency analysis."""
     components = extract_components(task)
     
+    model = load_model()
+    
     # If no clear components, treat as single task
     if len(components) <= 1:
+        cost = predict_cost(task, model)
         return {
             "original_task": task,
             "subtasks": [{
                 "id": "task-001",
                 "description": task,
                 "dependencies": [],
-                "estimated_size": estimate_size(task),
+                "estimated_size": size_from_cost(cost) if cost["source"] == "model" else estimate_size(task),
+                "estimated_cost": cost,
                 "parallel_safe": True
             }],
             "parallel_groups": [["task-001"]],
-            "recommendation": "single_worker"
+            "recommendation": "single_worker",
+            "suggested_workers": 1,
+            "estimated_duration_s": cost["duration_s"],
+            "model_samples": model["samples"] if model else 0
         }
     
     # Limit to max_subtasks
@@ -127,11 +360,13 @@ def decompose_task(task: str, max_subtasks: int = 5) -> dict:
                     dep_ids.append(dep_id)
                     seen_dep_ids.add(dep_id)
         
+        cost = predict_cost(component, model)
         subtasks.append({
             "id": task_id,
             "description": f"Implement {component}",
             "dependencies": dep_ids,
-            "estimated_size": estimate_size(component),
+            "estimated_size": size_from_cost(cost) if cost["source"] == "model" else estimate_size(component),
+            "estimated_cost": cost,
             "parallel_safe": len(dep_ids) == 0
         })
     
@@ -146,12 +381,17 @@ def decompose_task(task: str, max_subtasks: int = 5) -> dict:
     else:
         recommendation = "mixed"
     
+    suggested_workers, schedule = assign_workers(subtasks, parallel_groups)
+    
     return {
         "original_task": task,
         "subtasks": subtasks,
         "parallel_groups": parallel_groups,
         "recommendation": recommendation,
-        "suggested_workers": min(max(len(g) for g in parallel_groups), 3)
+        "suggested_workers": suggested_workers,
+        "schedule": schedule,
+        "estimated_duration_s": sum(level["duration_s"] for level in schedule),
+        "model_samples": model["samples"] if model else 0
     }
 
 
@@ -181,15 +421,150 @@ def compute_parallel_groups(subtasks: list[dict]) -> list[list[str]]:
     return groups
 
 
+# ---------------------------------------------------------------------------
+# Decomposition cache: same task + repo HEAD gives the same plan
+# ---------------------------------------------------------------------------
+
+def normalize_task(task: str) -> str:
+    return " ".join(task.lower().split())
+
+
+def repo_head(cwd: str = None) -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--verify", "-q", "HEAD"],
+                                capture_output=True, text=True, cwd=cwd)
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def cache_key(task: str, max_subtasks: int, head: Optional[str]) -> str:
+    material = json.dumps([DECOMPOSE_CACHE_VERSION, normalize_task(task), max_subtasks, head])
+    return hashlib.sha1(material.encode()).hexdigest()
+
+
+def load_cache() -> dict:
+    if DECOMPOSE_CACHE.exists():
+        try:
+            with open(DECOMPOSE_CACHE) as f:
+                cache = json.load(f)
+            if cache.get("version") == DECOMPOSE_CACHE_VERSION:
+                return cache
+        except json.JSONDecodeError:
+            pass
+    return {"version": DECOMPOSE_CACHE_VERSION, "seq": 0, "hits": 0, "misses": 0, "entries": {}}
+
+
+def update_cache(mutate):
+    """Apply mutate(cache) under an exclusive lock and write it back atomically."""
+    DECOMPOSE_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{DECOMPOSE_CACHE}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        cache = load_cache()
+        result = mutate(cache)
+        tmp_path = DECOMPOSE_CACHE.with_suffix(f".tmp-{os.getpid()}")
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, DECOMPOSE_CACHE)
+    return result
+
+
+def cached_decompose(task: str, max_subtasks: int = 5, cwd: str = None) -> dict:
+    """
+    decompose_task() memoized on normalized task text, max_subtasks and repo
+    HEAD, so dry run, execute and resume all see the same plan. Recorded
+    task history does not invalidate entries; a new commit does.
+    """
+    head = repo_head(cwd)
+    key = cache_key(task, max_subtasks, head)
+
+    def lookup(cache: dict) -> Optional[dict]:
+        entry = cache["entries"].get(key)
+        cache["seq"] += 1
+        if entry is None:
+            cache["misses"] += 1
+            return None
+        cache["hits"] += 1
+        entry["seq"] = cache["seq"]
+        return entry["result"]
+
+    result = update_cache(lookup)
+    if result is not None:
+        return dict(result, cache={"hit": True, "key": key, "head": head})
+
+    result = decompose_task(task, max_subtasks)
+
+    def store(cache: dict):
+        cache["seq"] += 1
+        cache["entries"][key] = {
+            "seq": cache["seq"],
+            "task": normalize_task(task),
+            "head": head,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "result": result,
+        }
+        if len(cache["entries"]) > DECOMPOSE_CACHE_MAX:
+            keep = sorted(cache["entries"].items(), key=lambda item: item[1]["seq"])[-DECOMPOSE_CACHE_MAX:]
+            cache["entries"] = dict(keep)
+
+    update_cache(store)
+    return dict(result, cache={"hit": False, "key": key, "head": head})
+
+
+def cache_stats() -> dict:
+    cache = load_cache()
+    lookups = cache["hits"] + cache["misses"]
+    return {
+        "entries": len(cache["entries"]),
+        "max_entries": DECOMPOSE_CACHE_MAX,
+        "hits": cache["hits"],
+        "misses": cache["misses"],
+        "hit_rate": round(cache["hits"] / lookups, 3) if lookups else 0.0,
+    }
+
+
 def main():
     parser = argparse.ArgumentParser(description="APEX Task Decomposer")
-    parser.add_argument("--task", required=True, help="Task description to decompose")
+    parser.add_argument("--task", help="Task description to decompose")
     parser.add_argument("--max-subtasks", type=int, default=5, help="Maximum subtasks")
     parser.add_argument("--format", choices=["json", "text"], default="json")
+    parser.add_argument("--record", action="store_true",
+                        help="Record the actual cost of --task (a completed subtask) instead of decomposing")
+    parser.add_argument("--tool-calls", type=int, help="Actual tool calls (with --record)")
+    parser.add_argument("--tokens", type=int, help="Actual tokens (with --record)")
+    parser.add_argument("--duration", type=int, help="Actual wall time in seconds (with --record)")
+    parser.add_argument("--from-state", help="apex-state.json to take missing actuals from (with --record)")
+    parser.add_argument("--no-cache", action="store_true", help="Decompose from scratch, bypassing the plan cache")
+    parser.add_argument("--cache-stats", action="store_true", help="Show plan cache statistics")
+    parser.add_argument("--clear-cache", action="store_true", help="Drop all cached plans")
     
     args = parser.parse_args()
     
-    result = decompose_task(args.task, args.max_subtasks)
+    if args.cache_stats or args.clear_cache:
+        if args.clear_cache:
+            update_cache(lambda cache: cache.update({"entries": {}, "hits": 0, "misses": 0}))
+        print(json.dumps(cache_stats(), indent=2))
+        return
+    
+    if not args.task:
+        parser.error("--task is required")
+    
+    if args.record:
+        actuals = actuals_from_state(args.from_state) if args.from_state else {}
+        for key, value in (("tool_calls", args.tool_calls), ("tokens", args.tokens), ("duration_s", args.duration)):
+            if value is not None:
+                actuals[key] = value
+        missing = [key for key in TARGETS if key not in actuals]
+        if missing:
+            parser.error(f"--record needs {', '.join(missing)} (pass flags or --from-state)")
+        record = record_actual(args.task, actuals["tool_calls"], actuals["tokens"], actuals["duration_s"])
+        print(json.dumps({"success": True, "recorded": record}, indent=2))
+        return
+    
+    if args.no_cache:
+        result = decompose_task(args.task, args.max_subtasks)
+    else:
+        result = cached_decompose(args.task, args.max_subtasks)
     
     if args.format == "json":
         print(json.dumps(result, indent=2))
@@ -200,7 +575,9 @@ def main():
         print("\nSubtasks:")
         for task in result["subtasks"]:
             deps = f" (depends: {', '.join(task['dependencies'])})" if task['dependencies'] else ""
-            print(f"  [{task['id']}] {task['description']} [{task['estimated_size']}]{deps}")
+            cost = task["estimated_cost"]
+            print(f"  [{task['id']}] {task['description']} [{task['estimated_size']}, "
+                  f"~{cost['tool_calls']} calls, ~{cost['duration_s'] // 60}m, {cost['source']}]{deps}")
         print("\nParallel groups:")
         for i, group in enumerate(result["parallel_groups"]):
             print(f"  Group {i+1}: {', '.join(group)}")
@@ -7,36 +7,34 @@ Manages git worktrees for parallel swarm execution.
 import argparse
 import json
 import os
-import subprocess
 import sys
 from pathlib import Path
 from datetime import datetime
 
+import git_helper
+
 APEX_STATE_DIR = Path(os.environ.get("APEX_STATE_DIR", Path.home() / ".config" / "opencode" / "apex" / "state"))
 SWARM_QUEUE = APEX_STATE_DIR / "swarm-queue.json"
+WORKER_STATE_DIR = APEX_STATE_DIR / "workers"
+
+
+def worker_state_path(worker_id) -> Path:
+    """Per-worker apex-state.json, kept next to the shared state."""
+    return WORKER_STATE_DIR / f"apex-worker-{worker_id}.json"
 
 
 def run_git(args: list[str], cwd: str = None) -> tuple[bool, str]:
     """Run git command and return (success, output)."""
-    try:
-        result = subprocess.run(
-            ["git"] + args,
-            cwd=cwd,
-            capture_output=True,
-            text=True
-        )
-        return result.returncode == 0, result.stdout.strip() or result.stderr.strip()
-    except Exception as e:
-        return False, str(e)
+    return git_helper.run(args, cwd=cwd, stderr_fallback=True)
 
 
 def get_repo_root() -> str:
     """Get the root of the current git repository."""
-    success, output = run_git(["rev-parse", "--show-toplevel"])
-    if not success:
+    root = git_helper.repo_root()
+    if root is None:
         print("Error: Not in a git repository", file=sys.stderr)
         sys.exit(1)
-    return output
+    return root
 
 
 def create_worker(worker_id: int, branch: str = None, task: str = None) -> dict:
@@ -46,6 +44,9 @@ def create_worker(worker_id: int, branch: str = None, task: str = None) -> dict:
     
     branch = branch or f"apex-swarm-{worker_id}"
     worktree_path = parent_dir / f"apex-worker-{worker_id}"
+    # What the worker branches from, so its own changes can be told apart later
+    on_branch, base = run_git(["symbolic-ref", "--short", "-q", "HEAD"], cwd=repo_root)
+    has_commit, base_commit = run_git(["rev-parse", "--verify", "-q", "HEAD"], cwd=repo_root)
     
     # Create worktree with new branch
     success, output = run_git(
@@ -67,7 +68,10 @@ def create_worker(worker_id: int, branch: str = None, task: str = None) -> dict:
         "id": worker_id,
         "branch": branch,
         "path": str(worktree_path),
+        "base": base if on_branch else None,
+        "base_commit": base_commit if has_commit else None,
         "task": task,
+        "state_file": str(worker_state_path(worker_id)),
         "status": "ready",
         "created_at": datetime.utcnow().isoformat() + "Z"
     }
@@ -4,8 +4,24 @@
 
 set -e
 
-APEX_STATE="${APEX_STATE:-${APEX_STATE_DIR:-$HOME/.config/opencode/apex/state}/apex-state.json}"
+APEX_STATE_DIR="${APEX_STATE_DIR:-$HOME/.config/opencode/apex/state}"
+# Swarm workers run in apex-worker-N worktrees and keep their own state file,
+# so parallel workers never contend on one lock
+if [[ -z "$APEX_WORKER" && "$PWD" =~ /apex-worker-([0-9]+)(/|$) ]]; then
+    APEX_WORKER="${BASH_REMATCH[1]}"
+fi
+if [[ -z "$APEX_STATE" && -n "$APEX_WORKER" ]]; then
+    APEX_STATE="$APEX_STATE_DIR/workers/apex-worker-$APEX_WORKER.json"
+    APEX_READ_CACHE="${APEX_READ_CACHE:-$APEX_STATE_DIR/workers/read-cache-$APEX_WORKER.json}"
+fi
+APEX_STATE="${APEX_STATE:-$APEX_STATE_DIR/apex-state.json}"
 APEX_LOCK="$APEX_STATE.lock"
+APEX_READ_CACHE="${APEX_READ_CACHE:-$(dirname "$APEX_STATE")/read-cache.json}"
+
+# "mtime size" for a file (GNU stat, then BSD stat)
+file_signature() {
+    stat -c '%Y %s' "$1" 2>/dev/null || stat -f '%m %z' "$1" 2>/dev/null
+}
 
 if [[ ! -f "$APEX_STATE" ]]; then
     exit 0
@@ -19,6 +35,11 @@ HOOK_INPUT=$(cat)
 TOOL_NAME=$(echo "$HOOK_INPUT" | jq -r '.tool_name // empty')
 TOOL_INPUT=$(echo "$HOOK_INPUT" | jq -r '.tool_input // empty')
 
+# Opt-in stream recording for offline replay (functions/hook_replay.py)
+if [[ -n "$APEX_HOOK_RECORD" ]]; then
+    echo "$HOOK_INPUT" | jq -c '.hook_event_name //= "PreToolUse"' >> "$APEX_HOOK_RECORD" 2>/dev/null || true
+fi
+
 # Atomic read with flock
 (
 flock -s 200
@@ -37,6 +58,17 @@ fi
 MODE=$(echo "$STATE" | jq -r '.mode // "default"')
 RALPH_ACTIVE=$(echo "$STATE" | jq -r '.completion_cycle.active // false')
 
+# Cycle limits are a swarm-wide budget: sum every worker's counters. Workers
+# replace their files atomically, so this read needs no lock.
+CYCLE_SCOPE=""
+if [[ -n "$APEX_WORKER" ]]; then
+    read -r SWARM_TOOL_CALLS SWARM_ERRORS < <(jq -rs '
+        [(map(.circuit_breakers.tool_calls.cycle_current // 0) | add // 0),
+         (map(.circuit_breakers.errors.cycle_current // 0) | add // 0)] | @tsv
+    ' "$(dirname "$APEX_STATE")"/apex-worker-*.json 2>/dev/null || echo "")
+    CYCLE_SCOPE=" (all swarm workers)"
+fi
+
 case "$MODE" in
     "safe")
         ITER_TOOL_LIMIT=25
@@ -64,6 +96,13 @@ case "$MODE" in
         ;;
 esac
 
+# Adaptive budgets (functions/adaptive_limits.py) are decided by the metrics
+# hook and stored in state, so here they are a lookup
+read -r ADAPT_TOOL_LIMIT ADAPT_ERROR_LIMIT < <(echo "$STATE" | jq -r '
+    .circuit_breakers.adaptive // {} | if .enabled == true then [.limits.tool_calls // "", .limits.errors // ""] else ["", ""] end | @tsv')
+ITER_TOOL_LIMIT="${ADAPT_TOOL_LIMIT:-$ITER_TOOL_LIMIT}"
+ITER_ERROR_LIMIT="${ADAPT_ERROR_LIMIT:-$ITER_ERROR_LIMIT}"
+
 trip_breaker() {
     local reason="$1"
     jq --arg reason "$reason" '.circuit_breakers.tripped = true | .circuit_breakers.trip_reason = $reason' "$APEX_STATE" > "$APEX_STATE.tmp"
@@ -76,9 +115,14 @@ for sem_tool in $SEMANTIC_TOOLS; do
     if [[ "$TOOL_NAME" == "$sem_tool" ]]; then
         GREPAI_AVAIL=$(echo "$STATE" | jq -r '.semantic_tools.available.grepai // false')
         GRAPHCODE_AVAIL=$(echo "$STATE" | jq -r '.semantic_tools.available.graph_code // false')
+        LOCAL_INDEX_AVAIL=$(echo "$STATE" | jq -r '.semantic_tools.available.local_index // false')
         
         if [[ "$TOOL_NAME" == grepai_* && "$GREPAI_AVAIL" == "false" ]]; then
-            echo "⚠️  grepai not available - using grep fallback" >&2
+            if [[ "$LOCAL_INDEX_AVAIL" == "true" ]]; then
+                echo "ℹ️  grepai not available - using local index (functions/code_index.py query)" >&2
+            else
+                echo "⚠️  grepai not available - using grep fallback" >&2
+            fi
         fi
         if [[ "$TOOL_NAME" == query_* || "$TOOL_NAME" == get_code_* || "$TOOL_NAME" == surgical_* ]]; then
             if [[ "$GRAPHCODE_AVAIL" == "false" ]]; then
@@ -101,9 +145,9 @@ if [[ "$ITER_TOOL_CALLS" -ge "$ITER_TOOL_LIMIT" ]]; then
 fi
 
 if [[ "$RALPH_ACTIVE" == "true" ]]; then
-    CYCLE_TOOL_CALLS=$(echo "$STATE" | jq -r '.circuit_breakers.tool_calls.cycle_current // 0')
+    CYCLE_TOOL_CALLS=${SWARM_TOOL_CALLS:-$(echo "$STATE" | jq -r '.circuit_breakers.tool_calls.cycle_current // 0')}
     if [[ "$CYCLE_TOOL_CALLS" -ge "$CYCLE_TOOL_LIMIT" ]]; then
-        echo "🚨 APEX HARD LIMIT REACHED: Total tool calls across all iterations ($CYCLE_TOOL_CALLS/$CYCLE_TOOL_LIMIT)" >&2
+        echo "🚨 APEX HARD LIMIT REACHED: Total tool calls across all iterations$CYCLE_SCOPE ($CYCLE_TOOL_CALLS/$CYCLE_TOOL_LIMIT)" >&2
         echo "   This cycle has used maximum allowed tool calls." >&2
         echo "   Run '/apex/resume --reset-cycle' or start fresh." >&2
         trip_breaker "tool_calls_cycle"
@@ -124,9 +168,9 @@ if [[ "$ITER_ERRORS" -ge "$ITER_ERROR_LIMIT" ]]; then
 fi
 
 if [[ "$RALPH_ACTIVE" == "true" ]]; then
-    CYCLE_ERRORS=$(echo "$STATE" | jq -r '.circuit_breakers.errors.cycle_current // 0')
+    CYCLE_ERRORS=${SWARM_ERRORS:-$(echo "$STATE" | jq -r '.circuit_breakers.errors.cycle_current // 0')}
     if [[ "$CYCLE_ERRORS" -ge "$CYCLE_ERROR_LIMIT" ]]; then
-        echo "🚨 APEX HARD LIMIT REACHED: Total errors across all iterations ($CYCLE_ERRORS/$CYCLE_ERROR_LIMIT)" >&2
+        echo "🚨 APEX HARD LIMIT REACHED: Total errors across all iterations$CYCLE_SCOPE ($CYCLE_ERRORS/$CYCLE_ERROR_LIMIT)" >&2
         trip_breaker "errors_cycle"
     fi
 fi
@@ -149,6 +193,25 @@ if [[ "$TOOL_NAME" == "Edit" || "$TOOL_NAME" == "Write" || "$TOOL_NAME" == "Mult
     fi
 fi
 
+# Redundant read advisory: the same range was already read and the file is unchanged
+if [[ "$TOOL_NAME" == "Read" && -f "$APEX_READ_CACHE" ]]; then
+    READ_PATH=$(echo "$TOOL_INPUT" | jq -r '.file_path // empty')
+    READ_KEY="$READ_PATH:$(echo "$TOOL_INPUT" | jq -r '.offset // 0'):$(echo "$TOOL_INPUT" | jq -r '.limit // 0')"
+    READ_ENTRY=$(jq -c --arg key "$READ_KEY" '.entries[$key] // empty' "$APEX_READ_CACHE" 2>/dev/null || true)
+    if [[ -n "$READ_PATH" && -n "$READ_ENTRY" && -f "$READ_PATH" ]]; then
+        CACHED_SIGNATURE=$(echo "$READ_ENTRY" | jq -r '"\(.mtime) \(.size)"')
+        if [[ "$(file_signature "$READ_PATH")" == "$CACHED_SIGNATURE" ]]; then
+            echo "$READ_ENTRY" | jq -r '"ℹ️  APEX: \(.path) unchanged since read at iteration \(.iteration) (tool call #\(.call), ~\(.tokens) tokens)"' >&2
+            READ_SUMMARY=$(echo "$READ_ENTRY" | jq -r '.summary // empty')
+            if [[ -n "$READ_SUMMARY" ]]; then
+                echo "   Cached summary: $READ_SUMMARY" >&2
+            else
+                echo "   Reuse the earlier read instead of loading it again." >&2
+            fi
+        fi
+    fi
+fi
+
 # Improved stuck loop detection using hash-based approach
 PATTERN_HASHES=$(echo "$STATE" | jq -r '[.circuit_breakers.stuck_loop.patterns[-'$STUCK_THRESHOLD':][]] | map(@base64) | .[]' 2>/dev/null || echo "")
 if [[ -n "$PATTERN_HASHES" ]]; then
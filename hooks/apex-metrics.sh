@@ -4,8 +4,54 @@
 
 set -e
 
-APEX_STATE="${APEX_STATE:-${APEX_STATE_DIR:-$HOME/.config/opencode/apex/state}/apex-state.json}"
+APEX_STATE_DIR="${APEX_STATE_DIR:-$HOME/.config/opencode/apex/state}"
+# Swarm workers run in apex-worker-N worktrees and keep their own state file,
+# so parallel workers never contend on one lock
+if [[ -z "$APEX_WORKER" && "$PWD" =~ /apex-worker-([0-9]+)(/|$) ]]; then
+    APEX_WORKER="${BASH_REMATCH[1]}"
+fi
+if [[ -z "$APEX_STATE" && -n "$APEX_WORKER" ]]; then
+    APEX_STATE="$APEX_STATE_DIR/workers/apex-worker-$APEX_WORKER.json"
+    APEX_READ_CACHE="${APEX_READ_CACHE:-$APEX_STATE_DIR/workers/read-cache-$APEX_WORKER.json}"
+fi
+APEX_STATE="${APEX_STATE:-$APEX_STATE_DIR/apex-state.json}"
 APEX_LOCK="$APEX_STATE.lock"
+APEX_READ_CACHE="${APEX_READ_CACHE:-$(dirname "$APEX_STATE")/read-cache.json}"
+READ_CACHE_MAX=200
+
+# "mtime size" for a file (GNU stat, then BSD stat)
+file_signature() {
+    stat -c '%Y %s' "$1" 2>/dev/null || stat -f '%m %z' "$1" 2>/dev/null
+}
+
+content_hash() {
+    if command -v sha1sum >/dev/null 2>&1; then
+        sha1sum "$1" | cut -d' ' -f1
+    else
+        shasum -a 1 "$1" | cut -d' ' -f1
+    fi
+}
+
+# A worker's first tool call seeds its state from the shared state with fresh counters
+SHARED_STATE="$APEX_STATE_DIR/apex-state.json"
+if [[ -n "$APEX_WORKER" && ! -f "$APEX_STATE" && -f "$SHARED_STATE" ]]; then
+    mkdir -p "$(dirname "$APEX_STATE")"
+    jq --arg worker "$APEX_WORKER" '
+        .swarm_worker = $worker |
+        .circuit_breakers.tripped = false | del(.circuit_breakers.trip_reason) |
+        .circuit_breakers.tool_calls.iteration_current = 0 |
+        .circuit_breakers.tool_calls.cycle_current = 0 |
+        .circuit_breakers.errors.iteration_current = 0 |
+        .circuit_breakers.errors.cycle_current = 0 |
+        .circuit_breakers.errors.history = [] |
+        .circuit_breakers.same_file_edits.files = {} |
+        .circuit_breakers.stuck_loop.patterns = [] |
+        .circuit_breakers.stuck_loop.state_hashes = [] |
+        .circuit_breakers.stuck_loop.stagnation_count = 0 |
+        .metrics = null |
+        del(.session_summary, .session_history)
+    ' "$SHARED_STATE" > "$APEX_STATE.seed.$$" && mv "$APEX_STATE.seed.$$" "$APEX_STATE"
+fi
 
 if [[ ! -f "$APEX_STATE" ]]; then
     exit 0
@@ -16,6 +62,11 @@ TOOL_NAME=$(echo "$HOOK_INPUT" | jq -r '.tool_name // empty')
 TOOL_INPUT=$(echo "$HOOK_INPUT" | jq -r '.tool_input // empty')
 TOOL_ERROR=$(echo "$HOOK_INPUT" | jq -r '.error // empty')
 
+# Opt-in stream recording for offline replay (functions/hook_replay.py)
+if [[ -n "$APEX_HOOK_RECORD" ]]; then
+    echo "$HOOK_INPUT" | jq -c '.hook_event_name //= "PostToolUse"' >> "$APEX_HOOK_RECORD" 2>/dev/null || true
+fi
+
 # Extract token usage if present
 INPUT_TOKENS=$(echo "$HOOK_INPUT" | jq -r '.usage.input_tokens // 0')
 OUTPUT_TOKENS=$(echo "$HOOK_INPUT" | jq -r '.usage.output_tokens // 0')
@@ -100,6 +151,54 @@ if [[ "$TOOL_NAME" == "Read" || "$TOOL_NAME" == "Grep" || "$TOOL_NAME" == "Glob"
     ')
 fi
 
+# Redundant read detection: remember what each Read returned and flag
+# repeat reads of the same range while the file content is unchanged.
+READ_PATH=$(echo "$TOOL_INPUT" | jq -r '.file_path // empty' 2>/dev/null || true)
+if [[ "$TOOL_NAME" == "Read" && -z "$TOOL_ERROR" && -n "$READ_PATH" && -f "$READ_PATH" ]]; then
+    READ_OFFSET=$(echo "$TOOL_INPUT" | jq -r '.offset // 0')
+    READ_LIMIT=$(echo "$TOOL_INPUT" | jq -r '.limit // 0')
+    read -r READ_MTIME READ_SIZE <<< "$(file_signature "$READ_PATH")"
+    READ_HASH=$(content_hash "$READ_PATH")
+    if [[ "$READ_LIMIT" -gt 0 ]]; then
+        READ_BYTES=$(tail -n +"$((READ_OFFSET > 0 ? READ_OFFSET : 1))" "$READ_PATH" | head -n "$READ_LIMIT" | wc -c | tr -d ' ')
+    else
+        READ_BYTES="$READ_SIZE"
+    fi
+    READ_TOKENS=$((READ_BYTES / 4))
+    READ_CALL=$(echo "$STATE" | jq -r '.circuit_breakers.tool_calls.cycle_current // 0')
+    READ_ITERATION=$(echo "$STATE" | jq -r '.loop_mode.status.iteration // 1')
+
+    [[ -f "$APEX_READ_CACHE" ]] || echo '{"seq": 0, "entries": {}}' > "$APEX_READ_CACHE"
+    CACHE=$(jq --arg key "$READ_PATH:$READ_OFFSET:$READ_LIMIT" --arg path "$READ_PATH" \
+        --arg hash "$READ_HASH" --argjson mtime "${READ_MTIME:-0}" --argjson size "${READ_SIZE:-0}" \
+        --argjson offset "$READ_OFFSET" --argjson limit "$READ_LIMIT" --argjson tokens "$READ_TOKENS" \
+        --argjson call "$READ_CALL" --argjson iter "$READ_ITERATION" --argjson max "$READ_CACHE_MAX" '
+        .seq += 1 |
+        .entries[$key] as $prev |
+        ($prev != null and $prev.hash == $hash) as $redundant |
+        .redundant = $redundant |
+        .entries[$key] = {
+            path: $path, offset: $offset, limit: $limit,
+            mtime: $mtime, size: $size, hash: $hash, tokens: $tokens,
+            iteration: (if $redundant then $prev.iteration else $iter end),
+            call: (if $redundant then $prev.call else $call end),
+            last_iteration: $iter, last_call: $call,
+            reads: (if $redundant then $prev.reads + 1 else 1 end),
+            summary: (if $redundant then $prev.summary else null end),
+            seq: .seq
+        } |
+        .entries |= (to_entries | sort_by(.value.seq) | .[-$max:] | from_entries)
+    ' "$APEX_READ_CACHE")
+    echo "$CACHE" | jq 'del(.redundant)' > "$APEX_READ_CACHE.tmp" && mv "$APEX_READ_CACHE.tmp" "$APEX_READ_CACHE"
+
+    if [[ "$(echo "$CACHE" | jq -r '.redundant')" == "true" ]]; then
+        STATE=$(echo "$STATE" | jq --argjson tokens "$READ_TOKENS" '
+            .context_efficiency.redundant_reads = ((.context_efficiency.redundant_reads // 0) + 1) |
+            .context_efficiency.wasted_tokens = ((.context_efficiency.wasted_tokens // 0) + $tokens)
+        ')
+    fi
+fi
+
 if [[ "$TOOL_NAME" == "grepai_search" || "$TOOL_NAME" == "query_code_graph" ]]; then
     STATE=$(echo "$STATE" | jq '
         .context_efficiency.searches_performed += 1
@@ -115,4 +214,33 @@ echo "$STATE" | jq '.' > "$APEX_STATE.tmp" && mv "$APEX_STATE.tmp" "$APEX_STATE"
 
 ) 200>"$APEX_LOCK"
 
+APEX_FUNCTIONS="${APEX_FUNCTIONS:-$(dirname "$0")/../functions}"
+
+# Adaptive budgets: every APEX_ADAPT_EVERY calls, re-decide the iteration
+# limits from progress so the breaker only has to read them
+ADAPT_CALLS=$(jq -r 'if .circuit_breakers.adaptive.enabled == true then .circuit_breakers.tool_calls.iteration_current else empty end' "$APEX_STATE" 2>/dev/null || true)
+if [[ -n "$ADAPT_CALLS" && $((ADAPT_CALLS % ${APEX_ADAPT_EVERY:-10})) -eq 0 && -f "$APEX_FUNCTIONS/adaptive_limits.py" ]]; then
+    python3 "$APEX_FUNCTIONS/adaptive_limits.py" --state "$APEX_STATE" update >/dev/null 2>&1 || true
+fi
+
+# Context budget: estimate what this call loaded into context and keep
+# context_budget.used/breakdown current; warns on stderr at a threshold
+case "$TOOL_NAME" in
+    Read|Grep|Glob|Bash|WebFetch|WebSearch|grepai_search|grepai_trace|query_code_graph|get_code_snippet)
+        if [[ "${APEX_CONTEXT_BUDGET:-1}" != "0" && -f "$APEX_FUNCTIONS/context_budget.py" ]]; then
+            echo "$HOOK_INPUT" | python3 "$APEX_FUNCTIONS/context_budget.py" --state "$APEX_STATE" hook >/dev/null || true
+        fi
+        ;;
+esac
+
+# Swarm duplicate-work index: refresh this worker's edit fingerprints in the
+# background (the orchestrator reads flags with duplicate_detector.py check)
+if [[ -n "$APEX_WORKER" && "${APEX_DUPLICATES:-1}" != "0" ]] \
+    && [[ "$TOOL_NAME" == "Edit" || "$TOOL_NAME" == "Write" || "$TOOL_NAME" == "MultiEdit" ]]; then
+    if [[ -f "$APEX_FUNCTIONS/duplicate_detector.py" ]]; then
+        (APEX_STATE_DIR="$APEX_STATE_DIR" python3 "$APEX_FUNCTIONS/duplicate_detector.py" \
+            update --worker "$APEX_WORKER" --path "$PWD" >/dev/null 2>&1 &)
+    fi
+fi
+
 exit 0
@@ -4,13 +4,29 @@
 
 set -e
 
-APEX_STATE="${APEX_STATE:-${APEX_STATE_DIR:-$HOME/.config/opencode/apex/state}/apex-state.json}"
+APEX_STATE_DIR="${APEX_STATE_DIR:-$HOME/.config/opencode/apex/state}"
+# Swarm workers run in apex-worker-N worktrees and keep their own state file,
+# so parallel workers never contend on one lock
+if [[ -z "$APEX_WORKER" && "$PWD" =~ /apex-worker-([0-9]+)(/|$) ]]; then
+    APEX_WORKER="${BASH_REMATCH[1]}"
+fi
+if [[ -z "$APEX_STATE" && -n "$APEX_WORKER" ]]; then
+    APEX_STATE="$APEX_STATE_DIR/workers/apex-worker-$APEX_WORKER.json"
+    SESSION_ARCHIVE="${APEX_SESSION_ARCHIVE:-$APEX_STATE_DIR/sessions}"
+fi
+APEX_STATE="${APEX_STATE:-$APEX_STATE_DIR/apex-state.json}"
+APEX_FUNCTIONS="${APEX_FUNCTIONS:-$(dirname "$0")/../functions}"
+SESSION_ARCHIVE="${SESSION_ARCHIVE:-${APEX_SESSION_ARCHIVE:-$(dirname "$APEX_STATE")/sessions}}"
 
 # Ensure state file exists
 if [[ ! -f "$APEX_STATE" ]]; then
     exit 0
 fi
 
+if [[ -n "$APEX_HOOK_RECORD" ]]; then
+    echo '{"hook_event_name":"Stop"}' >> "$APEX_HOOK_RECORD" 2>/dev/null || true
+fi
+
 # Read current state
 STATE=$(cat "$APEX_STATE")
 
@@ -28,22 +44,49 @@ TOOL_CALLS=$(echo "$STATE" | jq -r '.circuit_breakers.tool_calls.iteration_curre
 # Create session summary
 SESSION_END=$(date -u +%Y-%m-%dT%H:%M:%SZ)
 
-# Add to session history
-STATE=$(echo "$STATE" | jq --arg id "$SESSION_ID" \
+SESSION_RECORD=$(echo "$STATE" | jq -c --arg id "$SESSION_ID" \
     --arg started "$SESSION_START" \
     --arg ended "$SESSION_END" \
     --arg phase "$SESSION_PHASE" \
-    --arg tools "$TOOL_CALLS" '
-    .session_history += [{
+    --arg tools "$TOOL_CALLS" '{
         "id": $id,
         "started": $started,
         "ended": $ended,
         "final_phase": $phase,
         "tool_calls": ($tools | tonumber // 0),
+        "cycle_tool_calls": (.circuit_breakers.tool_calls.cycle_current // 0),
+        "errors": (.circuit_breakers.errors.cycle_current // 0),
+        "mode": (.mode // "default"),
         "outcome": "session_end"
-    }] |
-    .session_history = .session_history[-50:]
-')
+    }')
+
+# Archive the session (plus any pre-archive .session_history) and keep
+# only a rolling summary in state
+SESSION_SUMMARY=""
+if command -v python3 >/dev/null 2>&1 && [[ -f "$APEX_FUNCTIONS/session_archive.py" ]]; then
+    SESSION_SUMMARY=$(echo "$STATE" | jq -c --argjson rec "$SESSION_RECORD" '(.session_history // []) + [$rec] | .[]' \
+        | python3 "$APEX_FUNCTIONS/session_archive.py" --archive "$SESSION_ARCHIVE" append 2>/dev/null \
+        | jq -c '.summary // empty' 2>/dev/null || true)
+fi
+
+if [[ -n "$SESSION_SUMMARY" ]]; then
+    STATE=$(echo "$STATE" | jq --argjson summary "$SESSION_SUMMARY" '
+        .session_summary = $summary | del(.session_history)
+    ')
+else
+    # No archive available: keep the last 50 sessions in state
+    STATE=$(echo "$STATE" | jq --argjson rec "$SESSION_RECORD" '
+        .session_history = ((.session_history // []) + [$rec])[-50:]
+    ')
+fi
+
+# Iteration boundary of a completion cycle: checkpoint worktree + loop state
+# so /apex/resume --to can roll back to it
+CYCLE_ACTIVE=$(echo "$STATE" | jq -r '.completion_cycle.active // false')
+if [[ "$CYCLE_ACTIVE" == "true" && "${APEX_CHECKPOINTS:-1}" != "0" && -f "$APEX_FUNCTIONS/checkpoint.py" ]] \
+    && git rev-parse --is-inside-work-tree >/dev/null 2>&1; then
+    python3 "$APEX_FUNCTIONS/checkpoint.py" --state "$APEX_STATE" create --label "$SESSION_ID" >/dev/null 2>&1 || true
+fi
 
 # Reset circuit breakers for next session
 STATE=$(echo "$STATE" | jq '
@@ -53,7 +96,12 @@ STATE=$(echo "$STATE" | jq '
     .circuit_breakers.errors.cycle_current = 0 |
     .circuit_breakers.errors.history = [] |
     .circuit_breakers.same_file_edits.files = {} |
-    .circuit_breakers.stuck_loop.patterns = []
+    .circuit_breakers.stuck_loop.patterns = [] |
+    .context_budget.used = 0 |
+    .context_budget.files_loaded = [] |
+    .context_budget.breakdown |= ((. // {}) | with_entries(if .key == "system" then . else .value = 0 end)) |
+    .context_budget.level = "ok" |
+    del(.context_budget.overflow, .context_budget.observed)
 ')
 
 # Clear current session (will be recreated on next start)
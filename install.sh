@@ -63,6 +63,7 @@ for arg in "$@"; do
             echo "  --help         Show this help"
             echo ""
             echo "Without options, installer will prompt for each component."
+            echo "Re-running only rewrites changed files (APEX_INSTALL_LINK=hardlink|reflink|copy)."
             exit 0
             ;;
     esac
@@ -95,6 +96,7 @@ echo -e "${BLUE}[2/7]${NC} Creating APEX directory structure..."
 mkdir -p "$APEX_DIR"
 mkdir -p "$APEX_DIR/commands"
 mkdir -p "$APEX_DIR/hooks"
+mkdir -p "$APEX_DIR/functions"
 mkdir -p "$APEX_DIR/state"
 mkdir -p "$APEX_DIR/templates"
 mkdir -p "$APEX_DIR/integrations/grepai"
@@ -104,20 +106,35 @@ mkdir -p "$MCP_DIR"
 
 # Copy core files
 echo -e "${BLUE}[3/7]${NC} Copying APEX core files..."
-cp -r "$SCRIPT_DIR"/*.md "$APEX_DIR/" 2>/dev/null || true
-cp -r "$SCRIPT_DIR"/commands/* "$APEX_DIR/commands/" 2>/dev/null || true
-cp -r "$SCRIPT_DIR"/hooks/* "$APEX_DIR/hooks/" 2>/dev/null || true
-cp -r "$SCRIPT_DIR"/state/* "$APEX_DIR/state/" 2>/dev/null || true
-cp -r "$SCRIPT_DIR"/templates/* "$APEX_DIR/templates/" 2>/dev/null || true
-cp -r "$SCRIPT_DIR"/integrations/* "$APEX_DIR/integrations/" 2>/dev/null || true
-cp -r "$SCRIPT_DIR"/skills/* "$APEX_DIR/skills/" 2>/dev/null || true
-cp "$SCRIPT_DIR"/update-apex.sh "$APEX_DIR/" 2>/dev/null || true
+if command -v python3 &> /dev/null; then
+    # Manifest-driven: only changed files are written (atomically), bytecode is
+    # precompiled and existing state gains new template keys without a reset
+    INSTALL_RESULT=$(python3 "$SCRIPT_DIR/functions/installer.py" --dest "$APEX_DIR" install \
+        --source "$SCRIPT_DIR" --link "${APEX_INSTALL_LINK:-auto}") || {
+        echo -e "${RED}✗ Install failed${NC}"
+        echo "$INSTALL_RESULT"
+        exit 1
+    }
+    echo "$INSTALL_RESULT" | jq -r '"  \(.copied | length) updated, \(.unchanged) unchanged, \(.removed | length) removed",
+        (.conflicts[]? | "  Kept local edit: \(.path)\(if .new then " (new version in \(.new))" else "" end)"),
+        (.state[] | select(.action == "migrated") | "  Migrated \(.path): added \(.added | join(", "))")' 2>/dev/null || true
+else
+    cp -r "$SCRIPT_DIR"/*.md "$APEX_DIR/" 2>/dev/null || true
+    cp -r "$SCRIPT_DIR"/commands/* "$APEX_DIR/commands/" 2>/dev/null || true
+    cp -r "$SCRIPT_DIR"/hooks/* "$APEX_DIR/hooks/" 2>/dev/null || true
+    cp -r "$SCRIPT_DIR"/functions/*.py "$APEX_DIR/functions/" 2>/dev/null || true
+    cp -r "$SCRIPT_DIR"/state/* "$APEX_DIR/state/" 2>/dev/null || true
+    cp -r "$SCRIPT_DIR"/templates/* "$APEX_DIR/templates/" 2>/dev/null || true
+    cp -r "$SCRIPT_DIR"/integrations/* "$APEX_DIR/integrations/" 2>/dev/null || true
+    cp -r "$SCRIPT_DIR"/skills/* "$APEX_DIR/skills/" 2>/dev/null || true
+    cp "$SCRIPT_DIR"/update-apex.sh "$APEX_DIR/" 2>/dev/null || true
+fi
 
 # Make hooks executable
 chmod +x "$APEX_DIR"/hooks/*.sh 2>/dev/null || true
 chmod +x "$APEX_DIR"/update-apex.sh 2>/dev/null || true
 
-echo -e "${GREEN}✓ Core files copied to $APEX_DIR${NC}"
+echo -e "${GREEN}✓ Core files installed to $APEX_DIR${NC}"
 
 # Initialize state file
 if [[ ! -f "$APEX_DIR/state/apex-state.json" ]]; then
@@ -240,9 +257,11 @@ mv "$APEX_DIR/state/apex-state.json.tmp" "$APEX_DIR/state/apex-state.json" 2>/de
 # Create MCP configuration templates
 echo -e "${BLUE}[5/7]${NC} Creating MCP configuration templates..."
 
-# Copy the complete MCP settings template from repo (includes local E5/Jina service env).
+# The complete MCP settings template from repo (includes local E5/Jina service env)
+# is installed with the core files when present.
 if [[ -f "$SCRIPT_DIR/mcp/settings.json.template" ]]; then
-    cp "$SCRIPT_DIR/mcp/settings.json.template" "$MCP_DIR/settings.json.template"
+    cmp -s "$SCRIPT_DIR/mcp/settings.json.template" "$MCP_DIR/settings.json.template" \
+        || cp "$SCRIPT_DIR/mcp/settings.json.template" "$MCP_DIR/settings.json.template"
 else
     # Fallback: create minimal template if repo file missing
     cat > "$MCP_DIR/settings.json.template" << 'EOF'
@@ -0,0 +1,979 @@
+#!/usr/bin/env python3
+"""
+APEX Benchmark Suite
+Times hooks and functions against synthetic fixtures.
+
+Results are stored as JSON so two runs can be compared with a
+regression threshold (e.g. in CI, against a committed baseline).
+"""
+
+import argparse
+import atexit
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+FUNCTIONS_DIR = REPO_DIR / "functions"
+HOOKS_DIR = REPO_DIR / "hooks"
+STATE_TEMPLATE = REPO_DIR / "state" / "apex-state.json.template"
+
+sys.path.insert(0, str(FUNCTIONS_DIR))
+
+SCALES = {
+    "small": {
+        "memories": 10000,
+        "edited_files": 200,
+        "workers": 8,
+        "files_per_worker": 20,
+        "history": 500,
+        "log_mb": 5,
+        "source_files": 300,
+        "sessions": 5000,
+        "task_history": 1000,
+        "hook_events": 20000,
+        "repeat": 5,
+    },
+    "large": {
+        "memories": 100000,
+        "edited_files": 2000,
+        "workers": 32,
+        "files_per_worker": 50,
+        "history": 5000,
+        "log_mb": 100,
+        "source_files": 3000,
+        "sessions": 50000,
+        "task_history": 5000,
+        "hook_events": 200000,
+        "repeat": 3,
+    },
+}
+
+WORDS = (
+    "auth user profile settings dashboard admin api cache query index "
+    "token session worker merge branch config schema migration test docs"
+).split()
+
+BENCHMARKS = {}
+
+
+def bench(name: str):
+    """Register a benchmark case. The case returns (setup, run, params)."""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+def make_state(path: Path, edited_files: int) -> Path:
+    """Write a large apex-state.json based on the shipped template."""
+    rng = random.Random(edited_files)
+    with open(STATE_TEMPLATE) as f:
+        state = json.load(f)
+
+    breakers = state["circuit_breakers"]
+    breakers["tool_calls"]["iteration_current"] = 10
+    breakers["tool_calls"]["cycle_current"] = 40
+    breakers["same_file_edits"]["files"] = {
+        f"src/module_{i}/file_{i}.py": (i % 4) + 1 for i in range(edited_files)
+    }
+    breakers["errors"]["history"] = [f"Error {i}: command failed" for i in range(10)]
+    breakers["stuck_loop"]["patterns"] = [
+        [rng.choice(["Read", "Edit", "Bash"]), "file_path", "success"] for _ in range(20)
+    ]
+    state["context_budget"]["files_loaded"] = [
+        {"path": f"src/module_{i}/file_{i}.py", "tokens": 1200} for i in range(edited_files // 4)
+    ]
+    state["session_summary"] = {
+        "sessions": 50,
+        "tool_calls": 6000,
+        "duration_s": 180000,
+        "outcomes": {"session_end": 50},
+        "recent": [
+            {"id": f"session-{i}", "ended": "2026-01-01T01:00:00Z", "final_phase": "COMMIT",
+             "tool_calls": 120, "outcome": "session_end"}
+            for i in range(45, 50)
+        ],
+    }
+    state["current_session"] = {"id": "bench", "started": "2026-01-01T00:00:00Z", "phase": "EXECUTE"}
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(state, f, indent=2)
+    return path
+
+
+def make_graph(memories: int) -> dict:
+    """Build a knowledge graph dict with the given number of memories."""
+    rng = random.Random(memories)
+    concepts = {}
+    graph_memories = []
+    for i in range(memories):
+        tags = rng.sample(WORDS, 3)
+        memory_id = hashlib.md5(f"m{i}".encode()).hexdigest()[:8]
+        graph_memories.append({
+            "id": memory_id,
+            "type": rng.choice(["pattern", "pitfall", "decision", "learning"]),
+            "summary": f"Memory {i}: {' '.join(rng.sample(WORDS, 6))}",
+            "concepts": tags,
+            "confidence": 0.8,
+            "created_at": "2026-01-01T00:00:00Z",
+        })
+        for tag in tags:
+            concepts.setdefault(tag, {"type": "inferred", "memories": [], "related_files": []})
+            concepts[tag]["memories"].append(memory_id)
+
+    return {
+        "version": "1.0.0",
+        "created_at": "2026-01-01T00:00:00Z",
+        "updated_at": "2026-01-01T00:00:00Z",
+        "project": "/bench/project",
+        "concepts": concepts,
+        "memories": graph_memories,
+        "files": {},
+        "relationships": [
+            {"from": a, "to": b, "type": "uses", "created_at": "2026-01-01T00:00:00Z"}
+            for a, b in zip(WORDS, WORDS[1:])
+        ],
+    }
+
+
+def git(args: list[str], cwd: Path):
+    subprocess.run(["git"] + args, cwd=cwd, check=True, capture_output=True)
+
+
+def make_repo(path: Path, workers: int, files_per_worker: int) -> Path:
+    """Create a git repo with apex-swarm-N branches touching overlapping files."""
+    path.mkdir(parents=True, exist_ok=True)
+    git(["init", "-q", "-b", "main"], path)
+    git(["config", "user.email", "bench@apex.local"], path)
+    git(["config", "user.name", "APEX Bench"], path)
+    total_files = workers * files_per_worker // 2 + 1
+    for i in range(total_files):
+        (path / f"file_{i}.txt").write_text(f"base {i}\n")
+    git(["add", "-A"], path)
+    git(["commit", "-q", "-m", "base"], path)
+
+    for worker in range(1, workers + 1):
+        git(["checkout", "-q", "-b", f"apex-swarm-{worker}", "main"], path)
+        start = (worker - 1) * files_per_worker // 2
+        for i in range(start, start + files_per_worker):
+            with open(path / f"file_{i % total_files}.txt", "a") as f:
+                f.write(f"worker {worker}\n")
+        git(["commit", "-q", "-am", f"worker {worker}"], path)
+    git(["checkout", "-q", "main"], path)
+    return path
+
+
+def make_source_tree(path: Path, files: int) -> Path:
+    """Create a git repo of Python modules, each with a class and a few functions."""
+    rng = random.Random(7)
+    path.mkdir(parents=True, exist_ok=True)
+    git(["init", "-q", "-b", "main"], path)
+    git(["config", "user.email", "bench@apex.local"], path)
+    git(["config", "user.name", "APEX Bench"], path)
+    for i in range(files):
+        module = path / "src" / f"pkg_{i % 20}" / f"mod_{i}.py"
+        module.parent.mkdir(parents=True, exist_ok=True)
+        parts = [f'"""Module {i}: {" ".join(rng.sample(WORDS, 4))}."""\n']
+        for n in range(6):
+            a, b = rng.sample(WORDS, 2)
+            parts.append(
+                f"\ndef {a}_{b}_{n}(value, {b}_config=None):\n"
+                f"    \"\"\"Handle {a} {b} for {rng.choice(WORDS)}.\"\"\"\n"
+                f"    result = load_{a}(value)\n"
+                f"    return update_{b}(result, {b}_config)\n"
+            )
+        cls = rng.choice(WORDS).title()
+        parts.append(f"\n\nclass {cls}Handler{i}:\n    def handle(self, request):\n"
+                     f"        return self.{rng.choice(WORDS)}_cache.get(request)\n")
+        module.write_text("".join(parts))
+    git(["add", "-A"], path)
+    git(["commit", "-q", "-m", "source"], path)
+    return path
+
+
+def make_history(length: int) -> list[str]:
+    """State-hash history without repeating patterns (worst case scan)."""
+    return [hashlib.md5(str(i).encode()).hexdigest()[:12] for i in range(length)]
+
+
+def make_hook_stream(path: Path, calls: int) -> Path:
+    """Recorded PreToolUse/PostToolUse payloads, a Stop every ~60 calls."""
+    rng = random.Random(43)
+    tools = ["Read", "Edit", "Bash", "Grep", "Write"]
+    with open(path, "w") as f:
+        for i in range(calls):
+            tool = rng.choice(tools)
+            if tool in ("Read", "Edit", "Write"):
+                tool_input = {"file_path": f"src/mod_{rng.randrange(40)}.py"}
+            else:
+                tool_input = {"command": f"step {i}"}
+            f.write(json.dumps({"hook_event_name": "PreToolUse", "tool_name": tool, "tool_input": tool_input}) + "\n")
+            f.write(json.dumps({"hook_event_name": "PostToolUse", "tool_name": tool, "tool_input": tool_input,
+                                "error": "failed" if rng.random() < 0.02 else None,
+                                "usage": {"input_tokens": rng.randrange(4000), "output_tokens": 200}}) + "\n")
+            if rng.random() < 1 / 60:
+                f.write('{"hook_event_name": "Stop"}\n')
+    return path
+
+
+def make_pilot_log(path: Path, megabytes: int) -> Path:
+    """Write an agent transcript with a pilot-signal block every ~200 lines."""
+    filler = "Agent output line with tool results and reasoning text " * 2 + "\n"
+    target = megabytes * 1024 * 1024
+    written = 0
+    line = 0
+    with open(path, "w") as f:
+        while written < target:
+            if line % 200 == 199:
+                chunk = '```pilot-signal\n{"v":2,"type":"exit","success":true,"reason":"ok"}\n```\n'
+            else:
+                chunk = filler
+            f.write(chunk)
+            written += len(chunk)
+            line += 1
+    return path
+
+
+class Fixtures:
+    """Lazily-built fixtures shared by all cases in one run."""
+
+    def __init__(self, root: Path, scale: dict):
+        self.root = root
+        self.scale = scale
+        self._cache = {}
+
+    def get(self, name: str, builder):
+        if name not in self._cache:
+            self._cache[name] = builder()
+        return self._cache[name]
+
+    @property
+    def state(self) -> Path:
+        return self.get("state", lambda: make_state(self.root / "state" / "apex-state.json",
+                                                    self.scale["edited_files"]))
+
+    @property
+    def graph(self) -> dict:
+        return self.get("graph", lambda: make_graph(self.scale["memories"]))
+
+    @property
+    def repo(self) -> Path:
+        return self.get("repo", lambda: make_repo(self.root / "repo", self.scale["workers"],
+                                                  self.scale["files_per_worker"]))
+
+    @property
+    def source(self) -> Path:
+        return self.get("source", lambda: make_source_tree(self.root / "source", self.scale["source_files"]))
+
+    @property
+    def history(self) -> list[str]:
+        return self.get("history", lambda: make_history(self.scale["history"]))
+
+    @property
+    def pilot_log(self) -> Path:
+        return self.get("pilot_log", lambda: make_pilot_log(self.root / "pilot.log", self.scale["log_mb"]))
+
+
+# ---------------------------------------------------------------------------
+# Benchmark cases
+# ---------------------------------------------------------------------------
+
+def run_hook(hook: str, payload: dict, state_path: Path):
+    env = dict(os.environ, APEX_STATE=str(state_path))
+    subprocess.run(
+        ["bash", str(HOOKS_DIR / hook)],
+        input=json.dumps(payload),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+
+def run_function(script: str, args: list[str], cwd: Path = None, stdin: str = None, check: bool = False):
+    subprocess.run(
+        [sys.executable, str(FUNCTIONS_DIR / script)] + args,
+        cwd=cwd,
+        input=stdin,
+        capture_output=True,
+        text=True,
+        check=check,
+    )
+
+
+def fresh_state_copy(fx: Fixtures) -> Path:
+    target = fx.root / "state" / "apex-state.run.json"
+    shutil.copyfile(fx.state, target)
+    return target
+
+
+@bench("hooks.metrics")
+def bench_metrics_hook(fx: Fixtures):
+    payload = {
+        "tool_name": "Edit",
+        "tool_input": {"file_path": "src/module_1/file_1.py"},
+        "usage": {"input_tokens": 1200, "output_tokens": 300},
+    }
+    state = {}
+
+    def setup():
+        state["path"] = fresh_state_copy(fx)
+
+    return setup, lambda: run_hook("apex-metrics.sh", payload, state["path"]), {
+        "edited_files": fx.scale["edited_files"]}
+
+
+@bench("hooks.circuit_breaker")
+def bench_circuit_breaker_hook(fx: Fixtures):
+    payload = {"tool_name": "Edit", "tool_input": {"file_path": "src/module_1/file_1.py"}}
+    state = {}
+
+    def setup():
+        state["path"] = fresh_state_copy(fx)
+
+    return setup, lambda: run_hook("apex-circuit-breaker.sh", payload, state["path"]), {
+        "edited_files": fx.scale["edited_files"]}
+
+
+@bench("adaptive_limits.update")
+def bench_adaptive_limits_update(fx: Fixtures):
+    import adaptive_limits
+
+    state = fresh_state_copy(fx)
+    adaptive_limits.enable(state)
+    return None, lambda: adaptive_limits.update(state), {"edited_files": fx.scale["edited_files"]}
+
+
+@bench("context_budget.hook")
+def bench_context_budget_hook(fx: Fixtures):
+    import context_budget
+
+    state = {}
+    files = sorted(fx.source.rglob("*.py"))[:50]
+
+    def setup():
+        state["path"] = fresh_state_copy(fx)
+
+    def run():
+        # Warm token cache after the first round: unchanged files are not re-read
+        for path in files:
+            context_budget.hook({"tool_name": "Read", "tool_input": {"file_path": str(path)}}, state["path"])
+
+    return setup, run, {"reads": len(files)}
+
+
+@bench("installer.reinstall")
+def bench_installer_reinstall(fx: Fixtures):
+    import installer
+
+    dest = fx.root / "install"
+    installer.install(REPO_DIR, dest, compile_py=False)
+    # Steady state: nothing changed since the last install (stat checks only)
+    return None, lambda: installer.install(REPO_DIR, dest, compile_py=False), {
+        "files": len(installer.source_files(REPO_DIR))}
+
+
+@bench("graph.query")
+def bench_graph_query(fx: Fixtures):
+    import graph_manager
+
+    graph = fx.graph
+    return None, lambda: graph_manager.query("auth", graph), {"memories": fx.scale["memories"]}
+
+
+@bench("graph.add_memory")
+def bench_graph_add_memory(fx: Fixtures):
+    import graph_manager
+
+    graph_manager.GRAPH_PATH = fx.root / "graph" / "knowledge-graph.json"
+    shared = json.dumps(fx.graph)
+    graph = {}
+    counter = iter(range(10**9))
+
+    def setup():
+        # A fresh copy each run: fx.graph is shared with the query benches
+        graph.clear()
+        graph.update(json.loads(shared))
+
+    def run():
+        graph_manager.add_memory("learning", f"Bench memory {next(counter)}", ["auth", "bench"], graph=graph)
+
+    return setup, run, {"memories": fx.scale["memories"]}
+
+
+@bench("graph.query_all")
+def bench_graph_query_all(fx: Fixtures):
+    import graph_manager
+
+    shards = 8
+    graph_manager.GRAPH_PATH = None
+    graph_manager.GRAPHS_DIR = fx.root / "graphs"
+    graph_manager.GLOBAL_PATH = graph_manager.GRAPHS_DIR / "global.json"
+    graph_manager.LEGACY_PATH = fx.root / "graphs" / "no-legacy.json"
+    memories = fx.graph["memories"]
+    per_shard = len(memories) // shards
+    for i in range(shards):
+        shard = dict(fx.graph, project=f"/bench/project-{i}",
+                     memories=memories[i * per_shard:(i + 1) * per_shard])
+        graph_manager.write_json(graph_manager.GRAPHS_DIR / f"project-{i}.json", shard)
+
+    return None, lambda: graph_manager.query_all("auth"), {"memories": len(memories), "shards": shards}
+
+
+@bench("conflict_detector.cli")
+def bench_conflict_detector(fx: Fixtures):
+    repo = fx.repo
+    workers = ",".join(str(w) for w in range(1, fx.scale["workers"] + 1))
+    return None, lambda: run_function("conflict_detector.py", ["--workers", workers, "--base", "main"], cwd=repo), {
+        "workers": fx.scale["workers"]}
+
+
+def bench_conflict_forks(fx: Fixtures, pool: bool):
+    import conflict_detector
+    import git_helper
+
+    workers = list(range(1, fx.scale["workers"] + 1))
+
+    def run():
+        # One CLI invocation: empty memo, no batch processes, counter at zero
+        git_helper.reset()
+        git_helper.POOL = pool
+        cwd = os.getcwd()
+        os.chdir(fx.repo)
+        try:
+            conflict_detector.detect_conflicts(workers, "main")
+            # Culprit attribution as the merge train does it: re-query each branch
+            for worker in workers:
+                conflict_detector.get_changed_files(f"apex-swarm-{worker}", "main")
+        finally:
+            os.chdir(cwd)
+
+    run()
+    forks = git_helper.fork_count()
+    return None, run, {"workers": len(workers), "git_forks": forks}
+
+
+@bench("conflict_detector.legacy")
+def bench_conflict_detector_legacy(fx: Fixtures):
+    return bench_conflict_forks(fx, pool=False)
+
+
+@bench("conflict_detector.pooled")
+def bench_conflict_detector_pooled(fx: Fixtures):
+    return bench_conflict_forks(fx, pool=True)
+
+
+@bench("hook_replay.sweep")
+def bench_hook_replay_sweep(fx: Fixtures):
+    import hook_replay
+
+    stream = make_hook_stream(fx.root / "hook-stream.jsonl", fx.scale["hook_events"])
+    streams = hook_replay.load_streams([str(stream)])
+    grid = hook_replay.build_grid(hook_replay.MODES["default"], [
+        "iteration_tools=25:100:25", "iteration_errors=3,5,10", "iteration_file_edits=5,10,20"])
+    return None, lambda: hook_replay.sweep(streams, grid), {"events": len(streams[str(stream)]),
+                                                            "combinations": len(grid)}
+
+
+def make_duplicate_index(path: Path, workers: int):
+    """On-disk duplicate index of a large swarm: 100 fingerprints per worker, some shared."""
+    import duplicate_detector
+
+    rng = random.Random(44)
+    common = [f"{rng.randrange(16 ** 16):016x}" for _ in range(400)]
+    for w in range(2, workers + 2):
+        hunks = {f"src/mod_{f}.py": [f"{rng.randrange(16 ** 16):016x}" for _ in range(4)] + [rng.choice(common)]
+                 for f in range(20)}
+        duplicate_detector.record(str(w), hunks, index_path=path)
+    return path
+
+
+@bench("duplicate_detector.record")
+def bench_duplicate_detector_record(fx: Fixtures):
+    import duplicate_detector
+
+    # An edit in one worker of a large swarm: 5 of its 100 fingerprints change
+    workers = fx.scale["workers"] * 16
+    index_path = fx.get("duplicate_index", lambda: make_duplicate_index(fx.root / "duplicate-index", workers))
+    rng = random.Random(45)
+    hunks = {f"src/mod_{f}.py": [f"{rng.randrange(16 ** 16):016x}" for _ in range(5)] for f in range(20)}
+    duplicate_detector.record("1", hunks, index_path=index_path)
+
+    def run():
+        hunks[f"src/mod_{rng.randrange(20)}.py"] = [f"{rng.randrange(16 ** 16):016x}" for _ in range(5)]
+        duplicate_detector.record("1", hunks, index_path=index_path)
+
+    return None, run, {"workers": workers, "fingerprints": 100, "changed_per_update": 5}
+
+
+@bench("duplicate_detector.update")
+def bench_duplicate_detector_update(fx: Fixtures):
+    import duplicate_detector
+
+    # The hook's real path: git diff of one worker worktree, then the index swap
+    workers = fx.scale["workers"] * 16
+    index_path = fx.get("duplicate_index", lambda: make_duplicate_index(fx.root / "duplicate-index", workers))
+    worktree = fx.root / "apex-worker-1"
+    if not worktree.exists():
+        git(["worktree", "add", "-q", str(worktree), "apex-swarm-1"], fx.repo)
+    (worktree / "scratch.txt").write_text("uncommitted worker edit in progress\n")
+
+    return None, lambda: duplicate_detector.update("1", str(worktree), "main", index_path=index_path), {
+        "workers": workers}
+
+
+@bench("profile_engine.add")
+def bench_profile_engine_add(fx: Fixtures):
+    import profile_engine
+
+    rng = random.Random(46)
+    vocabulary = WORDS
+    index = profile_engine.CorrectionIndex()
+    for _ in range(profile_engine.MAX_INDEXED):
+        index.add({"correction": " ".join(rng.sample(vocabulary, 6)), "learned": f"pref_{rng.randrange(40)}: on"})
+
+    def run():
+        for _ in range(10):
+            index.add({"correction": " ".join(rng.sample(vocabulary, 6)), "learned": f"pref_{rng.randrange(40)}: on"})
+
+    return None, run, {"indexed": len(index.data["entries"]), "adds": 10}
+
+
+DECOMPOSE_TASKS = [
+    "Build user management API with auth, CRUD, profile settings and integration tests",
+    "Add simple dashboard with charts, filters, export and docs",
+    "Implement full payment flow plus admin panel, user profile and e2e tests",
+]
+
+
+@bench("task_decomposer.decompose")
+def bench_task_decomposer(fx: Fixtures):
+    import task_decomposer
+
+    task_decomposer.TASK_HISTORY = fx.root / "no-task-history.jsonl"
+
+    def run():
+        for task in DECOMPOSE_TASKS:
+            task_decomposer.decompose_task(task)
+
+    return None, run, {"tasks": len(DECOMPOSE_TASKS)}
+
+
+@bench("task_decomposer.cached")
+def bench_task_decomposer_cached(fx: Fixtures):
+    import task_decomposer
+
+    task_decomposer.TASK_HISTORY = fx.root / "no-task-history.jsonl"
+    task_decomposer.DECOMPOSE_CACHE = fx.root / "decompose-cache.json"
+    for task in DECOMPOSE_TASKS:
+        task_decomposer.cached_decompose(task, cwd=str(fx.repo))
+
+    def run():
+        for task in DECOMPOSE_TASKS:
+            task_decomposer.cached_decompose(task, cwd=str(fx.repo))
+
+    return None, run, {"tasks": len(DECOMPOSE_TASKS)}
+
+
+@bench("task_decomposer.estimate")
+def bench_task_decomposer_estimate(fx: Fixtures):
+    import task_decomposer
+
+    rng = random.Random(4)
+    records = fx.scale["task_history"]
+    history = fx.root / "task-history.jsonl"
+    with open(history, "w") as f:
+        for _ in range(records):
+            words = " ".join(rng.sample(WORDS, 3))
+            f.write(json.dumps({"description": f"Implement {words}", "tool_calls": rng.randint(5, 120),
+                                "tokens": rng.randint(5000, 200000), "duration_s": rng.randint(120, 5400)}) + "\n")
+    task_decomposer.TASK_HISTORY = history
+    task_decomposer.TASK_MODEL = fx.root / "task-model.json"
+    task_decomposer.load_model()
+
+    def run():
+        for task in DECOMPOSE_TASKS:
+            task_decomposer.decompose_task(task)
+
+    return None, run, {"tasks": len(DECOMPOSE_TASKS), "history": records}
+
+
+@bench("task_decomposer.cli")
+def bench_task_decomposer_cli(fx: Fixtures):
+    task = "Build user management API with auth, CRUD, profile settings and integration tests"
+    return None, lambda: run_function("task_decomposer.py", ["--task", task, "--no-cache"]), {}
+
+
+@bench("swarm_monitor.refresh")
+def bench_swarm_monitor(fx: Fixtures):
+    import swarm_monitor
+
+    workers = fx.scale["workers"]
+    state_dir = fx.root / "swarm-workers"
+    state_dir.mkdir(exist_ok=True)
+    queue_path = fx.root / "swarm-queue.json"
+    queue = {"swarm_id": "bench", "workers": {}, "queue": [], "completed": [], "conflicts": []}
+    for w in range(1, workers + 1):
+        queue["workers"][str(w)] = {"task": f"subtask {w}", "status": "running"}
+        shutil.copy(fx.state, state_dir / f"apex-worker-{w}.json")
+    queue_path.write_text(json.dumps(queue))
+    cache = swarm_monitor.FileCache()
+    renderer = swarm_monitor.DiffRenderer(io.StringIO())
+    hot = state_dir / "apex-worker-1.json"
+
+    def run():
+        # One worker changed since the last frame
+        os.utime(hot)
+        renderer.draw(swarm_monitor.render(swarm_monitor.collect(cache, queue_path, state_dir)))
+
+    return None, run, {"workers": workers}
+
+
+@bench("exit_gate.batch_cli")
+def bench_exit_gate_batch(fx: Fixtures):
+    records = "\n".join(
+        json.dumps({"worker": str(w), "indicators": {"code_complete": True, "tests_passing": w % 2 == 0},
+                    "exit_signal": True})
+        for w in range(1, fx.scale["workers"] + 1)
+    )
+    return None, lambda: run_function("exit_gate.py", ["--batch", "-"], stdin=records), {
+        "workers": fx.scale["workers"]}
+
+
+def bench_code_index_module(fx: Fixtures):
+    import code_index
+
+    code_index.INDEX_ROOT = fx.root / "index"
+    code_index.APEX_STATE = fx.root / "state" / "no-state.json"
+    return code_index
+
+
+@bench("code_index.build")
+def bench_code_index_build(fx: Fixtures):
+    code_index = bench_code_index_module(fx)
+    root = str(fx.source)
+    return None, lambda: code_index.build(root), {"source_files": fx.scale["source_files"]}
+
+
+@bench("code_index.query")
+def bench_code_index_query(fx: Fixtures):
+    code_index = bench_code_index_module(fx)
+    root = str(fx.source)
+    code_index.build(root)
+    index = code_index.CodeIndex(root)
+    return None, lambda: index.search("handler config module", 10), {
+        "chunks": index.meta["docs"], "engine": "numpy" if index.use_numpy else "python"}
+
+
+@bench("complexity.cached")
+def bench_complexity_cached(fx: Fixtures):
+    import complexity_analyzer
+
+    complexity_analyzer.COMPLEXITY_CACHE = fx.root / "complexity-cache.json"
+    files = complexity_analyzer.select_files([str(fx.source)])
+    complexity_analyzer.analyze_files(files)
+    return None, lambda: complexity_analyzer.analyze_files(files), {"files": len(files)}
+
+
+@bench("checkpoint.create")
+def bench_checkpoint_create(fx: Fixtures):
+    import checkpoint
+
+    # Own tree: the edits below must not leak into the index/complexity cases
+    source = fx.get("checkpoint_source", lambda: make_source_tree(fx.root / "checkpoint-source",
+                                                                  fx.scale["source_files"]))
+    state = fresh_state_copy(fx)
+    counter = {"n": 0}
+
+    def run():
+        # One edited file per iteration, as at a real iteration boundary
+        counter["n"] += 1
+        (source / "src" / "pkg_0" / "mod_0.py").write_text(f"VALUE = {counter['n']}\n")
+        checkpoint.create(str(source), state_path=state, keep=5)
+
+    return None, run, {"source_files": fx.scale["source_files"]}
+
+
+@bench("session_archive.stats")
+def bench_session_archive_stats(fx: Fixtures):
+    import session_archive
+
+    archive = session_archive.Archive(fx.root / "sessions")
+    rng = random.Random(3)
+    sessions = fx.scale["sessions"]
+    archive.append([
+        {
+            "id": f"session-{i}",
+            "started": f"2026-{1 + i * 12 // sessions:02d}-{1 + i % 28:02d}T10:00:00Z",
+            "ended": f"2026-{1 + i * 12 // sessions:02d}-{1 + i % 28:02d}T11:00:00Z",
+            "final_phase": rng.choice(["EXECUTE", "REVIEW", "COMMIT"]),
+            "tool_calls": rng.randint(5, 200),
+            "outcome": rng.choice(["session_end", "complete", "tripped"]),
+        }
+        for i in range(sessions)
+    ])
+    return None, lambda: session_archive.stats(archive, "2026-03-01", "2026-06-30", "month"), {
+        "sessions": sessions}
+
+
+CLI_PROBE = ["--indicators", '["code_complete","tests_passing"]', "--exit-signal", "true"]
+
+
+@bench("cli.direct")
+def bench_cli_direct(fx: Fixtures):
+    return None, lambda: run_function("exit_gate.py", CLI_PROBE, check=True), {}
+
+
+@bench("cli.multiplexed")
+def bench_cli_multiplexed(fx: Fixtures):
+    env = dict(os.environ, APEX_NO_SERVER="1")
+
+    def run():
+        subprocess.run([sys.executable, str(FUNCTIONS_DIR / "apex.py"), "exit-gate"] + CLI_PROBE,
+                       env=env, capture_output=True, check=True)
+
+    return None, run, {}
+
+
+@bench("cli.server")
+def bench_cli_server(fx: Fixtures):
+    sock = fx.root / "apex.sock"
+    env = dict(os.environ, APEX_SERVER_SOCKET=str(sock))
+    env.pop("APEX_NO_SERVER", None)
+    server = subprocess.Popen([sys.executable, str(FUNCTIONS_DIR / "apex.py"), "serve", "--idle", "60"], env=env)
+    atexit.register(server.terminate)
+    deadline = time.time() + 5
+    while not sock.exists() and time.time() < deadline:
+        time.sleep(0.02)
+
+    def run():
+        subprocess.run([sys.executable, "-S", str(FUNCTIONS_DIR / "apex.py"), "exit-gate"] + CLI_PROBE,
+                       env=env, capture_output=True, check=True)
+
+    return None, run, {"server": sock.exists()}
+
+
+@bench("stagnation_detector.detect")
+def bench_stagnation(fx: Fixtures):
+    import stagnation_detector
+
+    history = fx.history
+    return None, lambda: stagnation_detector.detect_stagnation(history), {"history": len(history)}
+
+
+@bench("signal_parser.parse")
+def bench_signal_parser(fx: Fixtures):
+    import signal_parser
+
+    text = fx.pilot_log.read_text()
+    return None, lambda: signal_parser.parse_signals(text), {"log_mb": fx.scale["log_mb"]}
+
+
+@bench("signal_parser.stream")
+def bench_signal_parser_stream(fx: Fixtures):
+    import signal_parser
+
+    log = str(fx.pilot_log)
+    return None, lambda: sum(1 for _ in signal_parser.iter_signals(signal_parser.mmap_lines(log))), {
+        "log_mb": fx.scale["log_mb"]}
+
+
+@bench("signal_bus.pipeline")
+def bench_signal_bus(fx: Fixtures):
+    import signal_bus
+    import signal_parser
+
+    log = str(fx.pilot_log)
+
+    def run():
+        pipeline = signal_bus.LoopPipeline(signal_bus.LoopState())
+        pipeline.run(signal_parser.iter_signals(signal_parser.mmap_lines(log)))
+
+    return None, run, {"log_mb": fx.scale["log_mb"]}
+
+
+@bench("signal_parser.cli")
+def bench_signal_parser_cli(fx: Fixtures):
+    log = fx.pilot_log
+    return None, lambda: run_function("signal_parser.py", ["--file", str(log)]), {"log_mb": fx.scale["log_mb"]}
+
+
+@bench("signal_parser.stream_cli")
+def bench_signal_parser_stream_cli(fx: Fixtures):
+    log = fx.pilot_log
+    return None, lambda: run_function("signal_parser.py", ["--file", str(log), "--stream"]), {
+        "log_mb": fx.scale["log_mb"]}
+
+
+# ---------------------------------------------------------------------------
+# Runner and comparison
+# ---------------------------------------------------------------------------
+
+def time_case(setup, run, repeat: int, warmup: int = 1) -> dict:
+    samples = []
+    for i in range(warmup + repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            samples.append(elapsed)
+    return {
+        "runs": len(samples),
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.mean(samples), 3),
+        "stdev_ms": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+    }
+
+
+def select_cases(only: str = None) -> list[str]:
+    if not only:
+        return list(BENCHMARKS)
+    prefixes = [p.strip() for p in only.split(",") if p.strip()]
+    return [name for name in BENCHMARKS if any(name.startswith(p) for p in prefixes)]
+
+
+def run_benchmarks(scale_name: str, only: str = None, repeat: int = None, keep_fixtures: bool = False) -> dict:
+    """Run the selected benchmark cases and return the results document."""
+    scale = dict(SCALES[scale_name])
+    repeat = repeat or scale["repeat"]
+    root = Path(tempfile.mkdtemp(prefix="apex-bench-"))
+    fx = Fixtures(root, scale)
+    results = {}
+    cwd = os.getcwd()
+
+    try:
+        for name in select_cases(only):
+            print(f"bench: {name} ...", file=sys.stderr)
+            try:
+                setup, run, params = BENCHMARKS[name](fx)
+                result = time_case(setup, run, repeat)
+                result["params"] = params
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+            finally:
+                os.chdir(cwd)
+            results[name] = result
+    finally:
+        if keep_fixtures:
+            print(f"fixtures kept at {root}", file=sys.stderr)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        "version": 1,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "scale": scale_name,
+        "host": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2, min_delta_ms: float = 1.0) -> dict:
+    """Compare median timings; a case regresses when slower by more than threshold."""
+    rows = []
+    regressions = []
+    for name, cur in current.get("results", {}).items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "median_ms" not in base or "median_ms" not in cur:
+            continue
+        delta = cur["median_ms"] - base["median_ms"]
+        ratio = cur["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        regressed = ratio > 1 + threshold and delta > min_delta_ms
+        rows.append({
+            "name": name,
+            "baseline_ms": base["median_ms"],
+            "current_ms": cur["median_ms"],
+            "ratio": round(ratio, 3),
+            "regressed": regressed,
+        })
+        if regressed:
+            regressions.append(name)
+
+    return {
+        "threshold": threshold,
+        "compared": len(rows),
+        "regressions": regressions,
+        "passed": not regressions,
+        "cases": rows,
+    }
+
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APEX Benchmark Suite")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    # Run
+    run_parser = subparsers.add_parser("run", help="Run benchmarks")
+    run_parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    run_parser.add_argument("--only", help="Comma-separated case name prefixes")
+    run_parser.add_argument("--repeat", type=int, help="Timed repetitions per case")
+    run_parser.add_argument("--output", help="Write results JSON to this file")
+    run_parser.add_argument("--baseline", help="Compare against a previous results file")
+    run_parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown ratio (0.2 = 20%%)")
+    run_parser.add_argument("--keep-fixtures", action="store_true", help="Do not delete generated fixtures")
+
+    # Compare
+    compare_parser = subparsers.add_parser("compare", help="Compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+
+    # List
+    subparsers.add_parser("list", help="List benchmark cases")
+
+    args = parser.parse_args()
+
+    if args.action == "list":
+        print(json.dumps({"cases": list(BENCHMARKS), "scales": SCALES}, indent=2))
+        return 0
+
+    if args.action == "compare":
+        report = compare(load_results(args.baseline), load_results(args.current), args.threshold)
+        print(json.dumps(report, indent=2))
+        return 0 if report["passed"] else 1
+
+    results = run_benchmarks(args.scale, args.only, args.repeat, args.keep_fixtures)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        report = compare(load_results(args.baseline), results, args.threshold)
+        results["comparison"] = report
+        print(json.dumps(results, indent=2))
+        return 0 if report["passed"] else 1
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -211,6 +211,259 @@ test_circuit_breaker_trip() {
 
 test_circuit_breaker_trip
 
+test_redundant_read() {
+    local state="$TEST_DIR/reads/apex-state.json"
+    mkdir -p "$TEST_DIR/reads"
+    cp "$APEX_DIR/state/apex-state.json.template" "$state"
+    seq 1 100 > "$TEST_DIR/reads/file.txt"
+    local payload="{\"tool_name\":\"Read\",\"tool_input\":{\"file_path\":\"$TEST_DIR/reads/file.txt\"}}"
+
+    echo "$payload" | APEX_STATE="$state" "$APEX_DIR/hooks/apex-metrics.sh" 2>/dev/null
+    local advisory=$(echo "$payload" | APEX_STATE="$state" "$APEX_DIR/hooks/apex-circuit-breaker.sh" 2>&1)
+    echo "$payload" | APEX_STATE="$state" "$APEX_DIR/hooks/apex-metrics.sh" 2>/dev/null
+    local counters=$(jq -c '[.context_efficiency.redundant_reads, .context_efficiency.wasted_tokens]' "$state")
+
+    if [[ "$advisory" == *"unchanged since read"* && "$counters" == "[1,73]" ]]; then
+        log_pass "Repeat read of unchanged file is flagged and counted"
+    else
+        log_fail "Redundant read detection failed: counters=$counters advisory=$advisory"
+    fi
+}
+
+test_redundant_read
+
+test_session_archive() {
+    local state="$TEST_DIR/sessions/apex-state.json"
+    mkdir -p "$TEST_DIR/sessions"
+    jq '.current_session = {"id":"s-2","started":"2026-02-01T10:00:00Z","phase":"COMMIT"}
+        | .circuit_breakers.tool_calls.iteration_current = 7
+        | del(.session_summary)
+        | .session_history = [{"id":"s-1","started":"2026-01-01T10:00:00Z","ended":"2026-01-01T10:30:00Z","final_phase":"REVIEW","tool_calls":3,"outcome":"session_end"}]' \
+        "$APEX_DIR/state/apex-state.json.template" > "$state"
+
+    APEX_STATE="$state" APEX_SESSION_SEGMENT_RECORDS=1 "$APEX_DIR/hooks/apex-session.sh" >/dev/null 2>&1
+    local summary=$(jq -c '[.session_summary.sessions, .session_summary.tool_calls, has("session_history")]' "$state")
+    local january=$(python3 "$APEX_DIR/functions/session_archive.py" --archive "$TEST_DIR/sessions/sessions" \
+        stats --until 2026-01-31 2>/dev/null | jq -c '[.sessions, .segments]')
+
+    if [[ "$summary" == "[2,10,false]" && "$january" == "[1,2]" ]]; then
+        log_pass "Session hook archives history into rotating segments"
+    else
+        log_fail "Session archive unexpected: summary=$summary january=$january"
+    fi
+}
+
+test_session_archive
+
+test_session_archive_summary_from_index() {
+    local archive="$TEST_DIR/sessions-index"
+    local sa="python3 $APEX_DIR/functions/session_archive.py --archive $archive"
+    for i in 1 2 3 4 5 6 7; do
+        echo "{\"id\":\"s-$i\",\"ended\":\"2026-03-0${i}T10:00:00Z\",\"tool_calls\":$i}" \
+            | APEX_SESSION_SEGMENT_RECORDS=3 $sa append >/dev/null
+    done
+    # The summary must come from the index alone, never from sealed segments
+    mkdir -p "$archive-sealed" && mv "$archive"/sessions-*.jsonl.gz "$archive-sealed/"
+    local appended=$(echo '{"id":"s-8","ended":"2026-03-08T10:00:00Z","tool_calls":8}' \
+        | APEX_SESSION_SEGMENT_RECORDS=3 $sa append 2>/dev/null | jq -c '.summary | [.sessions, .tool_calls, [.recent[].id]]')
+    local summary=$($sa summary 2>/dev/null | jq -c '[.sessions, .tool_calls, [.recent[].id]]')
+    mv "$archive-sealed"/* "$archive/"
+
+    local expected='[8,36,["s-8","s-7","s-6","s-5","s-4"]]'
+    if [[ "$appended" == "$expected" && "$summary" == "$expected" ]]; then
+        log_pass "Session archive summary is read from running index totals"
+    else
+        log_fail "Session archive summary unexpected: append=$appended summary=$summary"
+    fi
+}
+
+test_session_archive_summary_from_index
+
+test_task_estimates() {
+    local decomposer="$APEX_DIR/functions/task_decomposer.py"
+    export APEX_STATE_DIR="$TEST_DIR/estimates"
+    local cold=$(python3 "$decomposer" --task "Add csv export and audit log" --no-cache | jq -r '.subtasks[0].estimated_cost.source')
+    for i in 1 2 3; do
+        python3 "$decomposer" --record --task "Implement csv export" --tool-calls 8 --tokens 9000 --duration 300 >/dev/null
+    done
+    local warm=$(python3 "$decomposer" --task "Add csv export and audit log" --no-cache | jq -c '.subtasks[0] | [.estimated_cost.source, .estimated_cost.tool_calls, .estimated_size]')
+    # A freshly seeded swarm worker state carries "metrics": null
+    jq '.metrics = null' "$APEX_DIR/state/apex-state.json.template" > "$TEST_DIR/estimates/worker-state.json"
+    local seeded=$(python3 "$decomposer" --record --task "Write worker docs" --duration 60 \
+        --from-state "$TEST_DIR/estimates/worker-state.json" 2>/dev/null | jq -c '[.recorded.tokens, .recorded.duration_s]' || true)
+    unset APEX_STATE_DIR
+
+    if [[ "$cold" == "keywords" && "$warm" == '["model",8,"S"]' && -f "$TEST_DIR/estimates/task-model.json" \
+        && "$seeded" == '[0,60]' ]]; then
+        log_pass "Decomposer learns subtask cost from recorded history"
+    else
+        log_fail "Task estimates unexpected: cold=$cold warm=$warm seeded=$seeded"
+    fi
+}
+
+test_task_estimates
+
+test_decompose_cache() {
+    local decomposer="$APEX_DIR/functions/task_decomposer.py"
+    export APEX_STATE_DIR="$TEST_DIR/decompose-cache"
+    local first=$(python3 "$decomposer" --task "Add auth and tests" | jq -c '.cache.hit')
+    local second=$(python3 "$decomposer" --task "  add AUTH and tests" | jq -c '.cache.hit')
+    local stats=$(python3 "$decomposer" --cache-stats | jq -c '[.entries, .hits, .misses]')
+    unset APEX_STATE_DIR
+
+    if [[ "$first" == "false" && "$second" == "true" && "$stats" == "[1,1,1]" ]]; then
+        log_pass "Repeated decomposition is served from the plan cache"
+    else
+        log_fail "Decompose cache unexpected: first=$first second=$second stats=$stats"
+    fi
+}
+
+test_decompose_cache
+
+test_swarm_monitor() {
+    local dir="$TEST_DIR/monitor"
+    mkdir -p "$dir/workers"
+    echo '{"swarm_id":"swarm-t","workers":{"1":{"task":"auth","status":"running"},"2":{"task":"tests","status":"running"}},"queue":[],"completed":[],"conflicts":[]}' > "$dir/swarm-queue.json"
+    jq '.circuit_breakers.tool_calls.cycle_current = 12 | .metrics = {"tokens":{"input":900,"output":100}}' \
+        "$APEX_DIR/state/apex-state.json.template" > "$dir/workers/apex-worker-1.json"
+    jq '.circuit_breakers.tripped = true' "$APEX_DIR/state/apex-state.json.template" > "$dir/workers/apex-worker-2.json"
+
+    local snapshot=$(APEX_STATE_DIR="$dir" python3 "$APEX_DIR/functions/swarm_monitor.py" watch --format json | \
+        jq -c '[(.workers | map(.health)), .tokens.input, .queue.in_progress]')
+    local frame=$(APEX_STATE_DIR="$dir" python3 "$APEX_DIR/functions/swarm_monitor.py" watch --once)
+
+    if [[ "$snapshot" == '[["ok","tripped"],900,1]' && "$frame" == *"TRIPPED"* ]]; then
+        log_pass "Swarm monitor aggregates worker state files"
+    else
+        log_fail "Swarm monitor unexpected: snapshot=$snapshot"
+    fi
+}
+
+test_swarm_monitor
+
+test_worker_state() {
+    local dir="$TEST_DIR/swarm-state"
+    mkdir -p "$dir/state" "$dir/apex-worker-1" "$dir/apex-worker-2"
+    jq '.completion_cycle.active = true | .circuit_breakers.tool_calls.cycle_current = 50' \
+        "$APEX_DIR/state/apex-state.json.template" > "$dir/state/apex-state.json"
+    local payload='{"tool_name":"Bash","tool_input":{"command":"ls"}}'
+
+    (cd "$dir/apex-worker-1" && echo "$payload" | APEX_STATE_DIR="$dir/state" "$APEX_DIR/hooks/apex-metrics.sh" 2>/dev/null)
+    (cd "$dir/apex-worker-2" && echo "$payload" | APEX_STATE_DIR="$dir/state" "$APEX_DIR/hooks/apex-metrics.sh" 2>/dev/null)
+    local counts=$(jq -s -c 'map(.circuit_breakers.tool_calls.cycle_current)' "$dir/state/workers/"apex-worker-*.json)
+    local shared=$(jq '.circuit_breakers.tool_calls.cycle_current' "$dir/state/apex-state.json")
+
+    # Worker 1 alone is under the cycle limit, but the swarm total is not
+    jq '.circuit_breakers.tool_calls.cycle_current = 199' "$dir/state/workers/apex-worker-1.json" > "$dir/w1.tmp" \
+        && mv "$dir/w1.tmp" "$dir/state/workers/apex-worker-1.json"
+    (cd "$dir/apex-worker-2" && echo "$payload" | APEX_STATE_DIR="$dir/state" "$APEX_DIR/hooks/apex-circuit-breaker.sh" >/dev/null 2>&1) || true
+    local tripped=$(jq -r '.circuit_breakers.trip_reason' "$dir/state/workers/apex-worker-2.json")
+
+    if [[ "$counts" == "[1,1]" && "$shared" == "50" && "$tripped" == "tool_calls_cycle" ]]; then
+        log_pass "Swarm workers keep local state with a shared cycle limit"
+    else
+        log_fail "Worker state unexpected: counts=$counts shared=$shared tripped=$tripped"
+    fi
+}
+
+test_worker_state
+
+test_complexity_analyzer() {
+    local dir="$TEST_DIR/complexity"
+    mkdir -p "$dir/src"
+    jq '.' "$APEX_DIR/state/apex-state.json.template" > "$dir/apex-state.json"
+    printf 'def nested(x):\n    if x:\n        for i in x:\n            if i:\n                while i:\n                    if i > 2 and x:\n                        i -= 1\n                    i -= 1\n    return x\n' > "$dir/src/mod.py"
+    local analyzer="$APEX_DIR/functions/complexity_analyzer.py"
+
+    local hotspot=$(APEX_STATE_DIR="$dir" python3 "$analyzer" analyze "$dir/src" | jq -c '[.hotspots[0].name, .hotspots[0].complexity, .hotspots[0].nesting]')
+    APEX_STATE_DIR="$dir" python3 "$analyzer" baseline "$dir/src" >/dev/null
+    printf 'def nested(x):\n    return x\n' > "$dir/src/mod.py"
+    APEX_STATE_DIR="$dir" python3 "$analyzer" delta >/dev/null
+    local reduced=$(jq '.simplification.total_complexity_reduced' "$dir/apex-state.json")
+
+    if [[ "$hotspot" == '["nested",7,5]' && "$reduced" == "6" ]]; then
+        log_pass "Complexity analyzer ranks hotspots and records simplify delta"
+    else
+        log_fail "Complexity analyzer unexpected: hotspot=$hotspot reduced=$reduced"
+    fi
+}
+
+test_complexity_analyzer
+
+test_checkpoint_restore() {
+    local dir="$TEST_DIR/checkpoint"
+    local ckpt="$APEX_DIR/functions/checkpoint.py"
+    mkdir -p "$dir/repo"
+    git -C "$dir/repo" init -q
+    echo "good" > "$dir/repo/app.txt"
+    echo "same" > "$dir/repo/stable.txt"
+    echo "keep" > "$dir/repo/gone.txt"
+    git -C "$dir/repo" add app.txt stable.txt gone.txt
+    git -C "$dir/repo" -c user.email=t@t -c user.name=t commit -qm init
+    jq '.circuit_breakers.tool_calls.iteration_current = 5 | .circuit_breakers.tool_calls.cycle_current = 5' \
+        "$APEX_DIR/state/apex-state.json.template" > "$dir/apex-state.json"
+
+    (cd "$dir/repo" && python3 "$ckpt" --state "$dir/apex-state.json" create >/dev/null)
+    echo "bad" > "$dir/repo/app.txt"
+    echo "junk" > "$dir/repo/junk.txt"
+    rm "$dir/repo/gone.txt"
+    # Untouched files must not be rewritten by the restore
+    touch -d "2020-01-01 00:00:00" "$dir/repo/stable.txt"
+    local stable_before=$(stat -c %Y "$dir/repo/stable.txt" 2>/dev/null || stat -f %m "$dir/repo/stable.txt")
+    jq '.circuit_breakers.tripped = true | .circuit_breakers.tool_calls.iteration_current = 50 | .circuit_breakers.tool_calls.cycle_current = 50' \
+        "$dir/apex-state.json" > "$dir/state.tmp" && mv "$dir/state.tmp" "$dir/apex-state.json"
+    (cd "$dir/repo" && python3 "$ckpt" --state "$dir/apex-state.json" restore 1 >/dev/null)
+
+    local files="$(cat "$dir/repo/app.txt"):$([[ -e "$dir/repo/junk.txt" ]] && echo junk || echo clean):$(cat "$dir/repo/gone.txt" 2>/dev/null)"
+    local stable_after=$(stat -c %Y "$dir/repo/stable.txt" 2>/dev/null || stat -f %m "$dir/repo/stable.txt")
+    local state=$(jq -c '[.circuit_breakers.tripped, .circuit_breakers.tool_calls.iteration_current, .circuit_breakers.tool_calls.cycle_current]' "$dir/apex-state.json")
+    local head=$(git -C "$dir/repo" rev-list --count HEAD)
+
+    if [[ "$files" == "good:clean:keep" && "$state" == "[false,5,50]" && "$head" == "1" \
+        && "$stable_before" == "$stable_after" ]]; then
+        log_pass "Checkpoint restore rolls back worktree and loop state"
+    else
+        log_fail "Checkpoint restore unexpected: files=$files state=$state commits=$head mtime=$stable_before->$stable_after"
+    fi
+}
+
+test_checkpoint_restore
+
+test_checkpoint_per_worktree() {
+    local dir="$TEST_DIR/checkpoint-wt"
+    local ckpt="$APEX_DIR/functions/checkpoint.py"
+    mkdir -p "$dir/repo"
+    git -C "$dir/repo" init -q
+    echo "base" > "$dir/repo/app.txt"
+    git -C "$dir/repo" add app.txt
+    git -C "$dir/repo" -c user.email=t@t -c user.name=t commit -qm init
+    git -C "$dir/repo" worktree add -q -b w1 "$dir/apex-worker-1"
+    git -C "$dir/repo" worktree add -q -b w2 "$dir/apex-worker-2"
+    cp "$APEX_DIR/state/apex-state.json.template" "$dir/s1.json"
+    cp "$APEX_DIR/state/apex-state.json.template" "$dir/s2.json"
+
+    echo "one" > "$dir/apex-worker-1/app.txt"
+    (cd "$dir/apex-worker-1" && python3 "$ckpt" --state "$dir/s1.json" create >/dev/null)
+    echo "two" > "$dir/apex-worker-2/app.txt"
+    (cd "$dir/apex-worker-2" && python3 "$ckpt" --state "$dir/s2.json" create >/dev/null)
+    echo "two-b" > "$dir/apex-worker-2/app.txt"
+    (cd "$dir/apex-worker-2" && python3 "$ckpt" --state "$dir/s2.json" create >/dev/null)
+    (cd "$dir/apex-worker-2" && python3 "$ckpt" --state "$dir/s2.json" prune --keep 1 >/dev/null)
+
+    echo "dirty" > "$dir/apex-worker-1/app.txt"
+    (cd "$dir/apex-worker-1" && python3 "$ckpt" --state "$dir/s1.json" restore latest >/dev/null)
+    local ids="$(cd "$dir/apex-worker-1" && python3 "$ckpt" list | jq -c '[.checkpoints[].id]')|$(cd "$dir/apex-worker-2" && python3 "$ckpt" list | jq -c '[.checkpoints[].id]')"
+    local restored=$(cat "$dir/apex-worker-1/app.txt")
+
+    if [[ "$ids" == '["000001","000002"]|["000002"]' && "$restored" == "one" ]]; then
+        log_pass "Checkpoints are private to each worktree"
+    else
+        log_fail "Checkpoint worktree isolation unexpected: ids=$ids restored=$restored"
+    fi
+}
+
+test_checkpoint_per_worktree
+
 echo ""
 echo "--- Test Group: Command Files ---"
 echo ""
@@ -277,6 +530,590 @@ test_state_v4_fields() {
 
 test_state_v4_fields
 
+echo ""
+echo "--- Test Group: Python Functions ---"
+echo ""
+
+test_python_syntax() {
+    local script="$1"
+    if python3 -m py_compile "$APEX_DIR/$script" 2>/dev/null; then
+        log_pass "$script compiles"
+    else
+        log_fail "$script has syntax errors"
+    fi
+}
+
+for script in "$APEX_DIR"/functions/*.py; do
+    test_python_syntax "functions/$(basename "$script")"
+done
+test_python_syntax "tests/bench_apex.py"
+
+test_bench_compare() {
+    echo '{"results":{"hooks.metrics":{"median_ms":100.0}}}' > "$TEST_DIR/bench-base.json"
+    echo '{"results":{"hooks.metrics":{"median_ms":150.0}}}' > "$TEST_DIR/bench-cur.json"
+
+    if python3 "$APEX_DIR/tests/bench_apex.py" compare "$TEST_DIR/bench-base.json" "$TEST_DIR/bench-cur.json" --threshold 0.2 >/dev/null 2>&1; then
+        log_fail "Benchmark compare should flag a 50% slowdown"
+    else
+        log_pass "Benchmark compare flags regressions past threshold"
+    fi
+}
+
+test_bench_compare
+
+test_signal_stream() {
+    printf 'log line\n```pilot-signal\n{"v":2,"type":"exit","success":true}\n```\nmore\n```pilot-signal\n{"v":2,"type":"blocked"}\n```\n' > "$TEST_DIR/pilot.log"
+
+    local types=$(python3 "$APEX_DIR/functions/signal_parser.py" --file "$TEST_DIR/pilot.log" --stream 2>/dev/null | jq -r '.type' | tr '\n' ',')
+    if [[ "$types" == "exit,blocked," ]]; then
+        log_pass "Signal parser streams one JSONL line per signal"
+    else
+        log_fail "Signal parser stream output unexpected: $types"
+    fi
+}
+
+test_signal_stream
+
+test_signal_modes_agree() {
+    local log="$TEST_DIR/pilot-inline.log" parser="$APEX_DIR/functions/signal_parser.py"
+    printf 'foo ```pilot-signal {"v":2,"type":"progress"}``` bar ```pilot-signal {"v":2,"type":"handoff"}```\n```pilot-signal {"v":2,"type":"stagnant"} ```\nnote: ```pilot-signal\n{"v":2,\n"type":"exit"}\n``` done\n' > "$log"
+    local whole=$(python3 "$parser" --file "$log" | jq -r '[.signals[].type] | join(",")')
+    local mapped=$(python3 "$parser" --file "$log" --stream | jq -r '.type' | paste -sd, -)
+    local piped=$(python3 "$parser" --stream < "$log" | jq -r '.type' | paste -sd, -)
+    # --follow on a log that does not exist yet waits for it
+    local late="$TEST_DIR/pilot-late.log"
+    rm -f "$late"
+    (sleep 0.5; cp "$log" "$late") &
+    local followed=$(timeout 3 python3 "$parser" --file "$late" --follow | head -4 | jq -r '.type' | paste -sd, - || true)
+    wait
+
+    local expected="progress,handoff,stagnant,exit"
+    if [[ "$whole" == "$expected" && "$mapped" == "$expected" && "$piped" == "$expected" && "$followed" == "$expected" ]]; then
+        log_pass "Signal parser finds inline fences in every mode"
+    else
+        log_fail "Signal parser modes disagree: whole=$whole mmap=$mapped stdin=$piped follow=$followed"
+    fi
+}
+
+test_signal_modes_agree
+
+test_signal_bus_exit() {
+    cp "$APEX_DIR/state/apex-state.json.template" "$TEST_DIR/bus-state.json"
+    printf '```pilot-signal\n{"v":2,"type":"progress","indicators":{"code_complete":true,"tests_passing":true}}\n```\n```pilot-signal\n{"v":2,"type":"exit","success":true}\n```\n' > "$TEST_DIR/bus.log"
+
+    if python3 "$APEX_DIR/functions/signal_bus.py" --file "$TEST_DIR/bus.log" --state "$TEST_DIR/bus-state.json" --format jsonl >/dev/null 2>&1; then
+        local decision=$(jq -r '.loop_mode.exit_conditions.decision' "$TEST_DIR/bus-state.json")
+        if [[ "$decision" == "exit" ]]; then
+            log_pass "Signal bus applies signals and records exit decision"
+        else
+            log_fail "Signal bus recorded decision: $decision"
+        fi
+    else
+        log_fail "Signal bus should exit 0 when gate is satisfied"
+    fi
+}
+
+test_signal_bus_exit
+
+test_signal_bus_stagnation_merge() {
+    cp "$APEX_DIR/state/apex-state.json.template" "$TEST_DIR/bus-merge.json"
+    # Hooks and /apex commands edit loop state after the bus loaded it; saving
+    # must keep their edits and write only what the bus itself changed
+    local merged=$(cd "$APEX_DIR/functions" && python3 - "$TEST_DIR/bus-merge.json" <<'PY'
+import json, sys
+from pathlib import Path
+import signal_bus
+path = Path(sys.argv[1])
+pipeline = signal_bus.LoopPipeline(signal_bus.LoopState.from_state(signal_bus.load_state(path)))
+state = signal_bus.load_state(path)
+loop = state["loop_mode"]
+loop["stagnation"]["consecutive_same"] = 2
+loop["status"]["phase"] = "VERIFY"
+loop["completion_indicators"]["tests_passing"] = True
+loop["exit_conditions"]["exit_signal"] = True
+path.write_text(json.dumps(state))
+pipeline.handle({"type": "stagnant"})
+pipeline.handle({"type": "progress", "indicators": {"code_complete": True}})
+signal_bus.save_state(path, pipeline)
+loop = signal_bus.load_state(path)["loop_mode"]
+print(json.dumps([loop["stagnation"]["consecutive_same"], loop["status"]["phase"],
+                  loop["completion_indicators"]["tests_passing"], loop["completion_indicators"]["code_complete"],
+                  loop["exit_conditions"]["decision"], pipeline.loop.stagnation], separators=(",", ":")))
+PY
+)
+    if [[ "$merged" == '[3,"VERIFY",true,true,"exit",3]' ]]; then
+        log_pass "Signal bus merges loop state edited by hooks while it runs"
+    else
+        log_fail "Signal bus merge after concurrent edits: $merged (expected [3,\"VERIFY\",true,true,\"exit\",3])"
+    fi
+}
+
+test_signal_bus_stagnation_merge
+
+test_exit_gate_batch() {
+    local result=$(printf '{"worker":"1","indicators":["a","b"],"exit_signal":true}\n{"worker":"2","indicators":["a"],"exit_signal":true}\n' \
+        | python3 "$APEX_DIR/functions/exit_gate.py" --batch - 2>/dev/null | jq -c '[.swarm.all_done, .swarm.blocking]')
+    if [[ "$result" == '[false,["2"]]' ]]; then
+        log_pass "Exit gate batch mode aggregates swarm decision"
+    else
+        log_fail "Exit gate batch aggregate unexpected: $result"
+    fi
+}
+
+test_exit_gate_batch
+
+test_exit_gate_batch_errors() {
+    local result=$(printf '{"worker":"1","indicators":["a","b"],"exit_signal":true}\n{"worker":"1","indicators":["a","b"],"exit_signal":true}\n{"worker":"2","indicators":["a","b"],"exit_signal":true,"required":"x"}\n' \
+        | python3 "$APEX_DIR/functions/exit_gate.py" --batch - 2>/dev/null | jq -c '[(.workers | keys), .workers["2"].decision, .swarm.blocking]')
+    local bad=$(printf '{"worker":"1"}\nnot json\n' \
+        | python3 "$APEX_DIR/functions/exit_gate.py" --batch - 2>/dev/null | jq -r '.error' || true)
+    if [[ "$result" == '[["1","1#2","2"],"error",["1#2","2"]]' && "$bad" == -:2:* ]]; then
+        log_pass "Exit gate batch rejects duplicate workers and bad records"
+    else
+        log_fail "Exit gate batch error handling unexpected: $result / $bad"
+    fi
+}
+
+test_exit_gate_batch_errors
+
+test_merge_train() {
+    local repo="$TEST_DIR/train-repo"
+    git init -q -b main "$repo" && cd "$repo"
+    git config user.email test@apex && git config user.name apex
+    echo base > base.txt && git add . && git commit -qm base
+    for i in 1 2 3; do
+        git checkout -qb "apex-swarm-$i" main
+        echo "$i" > "f$i.txt"
+        [[ $i == 2 ]] && echo broken > broken.txt
+        git add . && git commit -qm "worker $i"
+    done
+    git checkout -q main
+
+    local result=$(APEX_STATE_DIR="$TEST_DIR" python3 "$APEX_DIR/functions/merge_train.py" \
+        --workers 1,2,3 --verify 'test ! -f broken.txt' 2>/dev/null \
+        | jq -c '[[.landed[].branch], [.ejected[].branch]]')
+    cd "$APEX_DIR"
+
+    if [[ "$result" == '[["apex-swarm-1","apex-swarm-3"],["apex-swarm-2"]]' ]]; then
+        log_pass "Merge train lands passing prefix and ejects failing branch"
+    else
+        log_fail "Merge train result unexpected: $result"
+    fi
+}
+
+test_merge_train
+
+test_merge_train_setup_error() {
+    local repo="$TEST_DIR/train-setup"
+    git init -q -b main "$repo" && cd "$repo"
+    git config user.email test@apex && git config user.name apex
+    echo base > base.txt && git add . && git commit -qm base
+    for i in 1 2; do
+        git checkout -qb "apex-swarm-$i" main
+        echo "$i" > "f$i.txt" && git add . && git commit -qm "worker $i"
+    done
+    git checkout -q main
+    # A failing post-checkout hook makes every scratch `git worktree add` fail
+    printf '#!/bin/sh\nexit 1\n' > .git/hooks/post-checkout && chmod +x .git/hooks/post-checkout
+    local broken=$(APEX_STATE_DIR="$TEST_DIR" python3 "$APEX_DIR/functions/merge_train.py" \
+        --branches apex-swarm-1,apex-swarm-2 --jobs 1 2>/dev/null \
+        | jq -c '[.success, (.error | test("could not be set up")), (.ejected | length), (.landed | length)]' || true)
+    # Fails once, then works: the retry must hide it
+    printf '#!/bin/sh\n[ -f "%s/failed-once" ] && exit 0\ntouch "%s/failed-once"\nexit 1\n' "$repo/.git" "$repo/.git" > .git/hooks/post-checkout
+    local flaky=$(APEX_STATE_DIR="$TEST_DIR" python3 "$APEX_DIR/functions/merge_train.py" \
+        --branches apex-swarm-1,apex-swarm-2 --jobs 1 2>/dev/null \
+        | jq -c '[.success, [.landed[].branch], (.ejected | length)]' || true)
+    cd "$APEX_DIR"
+
+    if [[ "$broken" == '[false,true,0,0]' && "$flaky" == '[true,["apex-swarm-1","apex-swarm-2"],0]' ]]; then
+        log_pass "Merge train treats setup failures as train errors, not branch failures"
+    else
+        log_fail "Merge train setup failure unexpected: broken=$broken flaky=$flaky"
+    fi
+}
+
+test_merge_train_setup_error
+
+test_read_cache_worker() {
+    local state_dir="$TEST_DIR/read-cache-worker"
+    mkdir -p "$state_dir/workers" "$TEST_DIR/rc/apex-worker-3/src"
+    echo '{"seq":1,"entries":{"a":{"path":"/w3/a.py","reads":2,"tokens":10}}}' > "$state_dir/workers/read-cache-3.json"
+    echo '{"seq":0,"entries":{}}' > "$state_dir/read-cache.json"
+    # Same resolution as the hooks: APEX_WORKER, or a cwd inside apex-worker-N
+    local by_env=$(cd "$TEST_DIR" && APEX_STATE_DIR="$state_dir" APEX_WORKER=3 \
+        python3 "$APEX_DIR/functions/read_cache.py" stats | jq -c '[.entries, .wasted_tokens]')
+    local by_cwd=$(cd "$TEST_DIR/rc/apex-worker-3/src" && env -u APEX_WORKER APEX_STATE_DIR="$state_dir" \
+        python3 "$APEX_DIR/functions/read_cache.py" stats | jq -c '[.entries, .wasted_tokens]')
+    if [[ "$by_env" == '[1,10]' && "$by_cwd" == '[1,10]' ]]; then
+        log_pass "Read cache CLI uses the swarm worker's cache"
+    else
+        log_fail "Read cache worker resolution unexpected: env=$by_env cwd=$by_cwd"
+    fi
+}
+
+test_read_cache_worker
+
+test_git_helper() {
+    local repo="$TEST_DIR/train-repo"
+    local helper="$APEX_DIR/functions/git_helper.py"
+    # Memoized root + one long-running cat-file for every ref, vs root + rev-parse per ref
+    local pooled=$(cd "$repo" && python3 "$helper" resolve main apex-swarm-1 apex-swarm-3 missing | jq -c '[.forks, .refs.missing]')
+    local legacy=$(cd "$repo" && APEX_GIT_POOL=0 python3 "$helper" resolve main apex-swarm-1 apex-swarm-3 missing | jq -c '[.forks, .refs.missing]')
+    local conflicts=$(cd "$repo" && python3 "$APEX_DIR/functions/conflict_detector.py" --workers 1,2,3 --base main | jq -c .summary.workers_with_changes)
+
+    if [[ "$pooled" == "[2,null]" && "$legacy" == "[8,null]" && "$conflicts" == '{"1":0,"2":2,"3":0}' ]]; then
+        log_pass "Git helper resolves refs over one cat-file process"
+    else
+        log_fail "Git helper unexpected: pooled=$pooled legacy=$legacy conflicts=$conflicts"
+    fi
+}
+
+test_git_helper
+
+test_hook_replay() {
+    local dir="$TEST_DIR/replay"
+    mkdir -p "$dir"
+    jq '.mode = "default"' "$APEX_DIR/state/apex-state.json.template" > "$dir/apex-state.json"
+    : > "$dir/stream.jsonl"
+    # Record through the live hooks until the breaker blocks a repeated call
+    local live=0
+    for i in 1 2 3 4 5 6; do
+        local payload='{"tool_name":"Bash","tool_input":{"command":"make test"},"usage":{"input_tokens":90,"output_tokens":10}}'
+        if ! echo "$payload" | APEX_STATE="$dir/apex-state.json" APEX_HOOK_RECORD="$dir/stream.jsonl" \
+            bash "$APEX_DIR/hooks/apex-circuit-breaker.sh" 2>/dev/null; then
+            live=$i
+            break
+        fi
+        echo "$payload" | APEX_STATE="$dir/apex-state.json" APEX_HOOK_RECORD="$dir/stream.jsonl" \
+            bash "$APEX_DIR/hooks/apex-metrics.sh"
+    done
+    # ...and the calls the session went on to make after /apex/resume
+    for i in 1 2 3; do
+        echo '{"hook_event_name":"PreToolUse","tool_name":"Bash","tool_input":{"command":"make test"}}' >> "$dir/stream.jsonl"
+        echo '{"hook_event_name":"PostToolUse","tool_name":"Bash","tool_input":{"command":"make test"},"usage":{"input_tokens":90,"output_tokens":10}}' >> "$dir/stream.jsonl"
+    done
+
+    local result=$(python3 "$APEX_DIR/functions/hook_replay.py" replay "$dir/stream.jsonl" \
+        | jq -c '.modes | map_values(.sessions[] | .trip | [.reason, .call, .saved_calls, .saved_tokens])')
+    local expected='{"safe":["stuck_loop",3,4,400],"default":["stuck_loop",4,3,300],"fast":["cycle_pattern",5,2,200]}'
+
+    if [[ "$live" == "4" && "$result" == "$expected" ]]; then
+        log_pass "Hook replay matches the live breaker and reports per-mode savings"
+    else
+        log_fail "Hook replay unexpected: live trip=$live replay=$result"
+    fi
+}
+
+test_hook_replay
+
+test_duplicate_detector() {
+    local dir="$TEST_DIR/duplicates"
+    git init -q -b main "$dir/repo"
+    for f in a b c d; do printf 'def %s():\n    return 1\n' "$f" > "$dir/repo/$f.py"; done
+    git -C "$dir/repo" add . && git -C "$dir/repo" -c user.email=t@t -c user.name=t commit -qm base
+    for w in 1 2 3; do git -C "$dir/repo" worktree add -q "$dir/apex-worker-$w" -b "apex-swarm-$w"; done
+    # Workers 1 and 2 make the same three edits; worker 3 does something else
+    for w in 1 2; do
+        for f in a b c; do printf 'def %s():\n    return compute_%s(cached=True)\n' "$f" "$f" > "$dir/apex-worker-$w/$f.py"; done
+    done
+    echo "def extra_helper(): return 'unrelated'" >> "$dir/apex-worker-3/d.py"
+
+    local result=$(cd "$dir/repo" && APEX_STATE_DIR="$dir/state" python3 "$APEX_DIR/functions/duplicate_detector.py" \
+        scan --workers 1,2,3 | jq -c '[.scanned, [.duplicates[] | [.workers, .shared_hunks, .suggest_cancel]]]')
+
+    # A master-based swarm whose workers committed their edits: the base comes
+    # from the main worktree, and committed hunks still count
+    git init -q -b master "$dir/m/repo"
+    for f in a b c; do printf 'def %s():\n    return 1\n' "$f" > "$dir/m/repo/$f.py"; done
+    git -C "$dir/m/repo" add . && git -C "$dir/m/repo" -c user.email=t@t -c user.name=t commit -qm base
+    mkdir -p "$dir/m"
+    for w in 1 2; do
+        git -C "$dir/m/repo" worktree add -q "$dir/m/apex-worker-$w" -b "apex-swarm-$w"
+        for f in a b c; do printf 'def %s():\n    return compute_%s(cached=True)\n' "$f" "$f" > "$dir/m/apex-worker-$w/$f.py"; done
+        git -C "$dir/m/apex-worker-$w" -c user.email=t@t -c user.name=t commit -qam "worker $w"
+    done
+    local committed=$(cd "$dir/m/repo" && APEX_STATE_DIR="$dir/mstate" python3 "$APEX_DIR/functions/duplicate_detector.py" \
+        scan --workers 1,2 | jq -c '[.scanned, .has_duplicates]')
+    local bad_base=$(cd "$dir/m/repo" && APEX_STATE_DIR="$dir/mstate" python3 "$APEX_DIR/functions/duplicate_detector.py" \
+        update --worker 1 --path "$dir/m/apex-worker-1" --base main | jq -c '[.success, (.error | test("main"))]' || true)
+
+    if [[ "$result" == '[{"1":3,"2":3,"3":1},[[["1","2"],3,"1"]]]' && "$committed" == '[{"1":3,"2":3},true]' \
+        && "$bad_base" == '[false,true]' ]]; then
+        log_pass "Duplicate detector flags workers making the same edits"
+    else
+        log_fail "Duplicate detector unexpected: $result committed=$committed bad_base=$bad_base"
+    fi
+}
+
+test_duplicate_detector
+
+test_adaptive_limits() {
+    local state="$TEST_DIR/adaptive-state.json"
+    cp "$APEX_DIR/state/apex-state.json.template" "$state"
+    APEX_STATE="$state" python3 "$APEX_DIR/functions/adaptive_limits.py" enable >/dev/null
+    # Productive window: every call touches a new file
+    for i in $(seq 1 10); do
+        echo "{\"tool_name\":\"Edit\",\"tool_input\":{\"file_path\":\"/tmp/apex-adaptive/f$i.py\"}}" \
+            | APEX_STATE="$state" bash "$APEX_DIR/hooks/apex-metrics.sh"
+    done
+    local raised=$(jq -c '.circuit_breakers.adaptive.limits' "$state")
+    # Unproductive window: failing calls, nothing new
+    for i in $(seq 1 10); do
+        echo '{"tool_name":"Bash","tool_input":{"command":"make"},"error":"exit 2"}' \
+            | APEX_STATE="$state" bash "$APEX_DIR/hooks/apex-metrics.sh"
+    done
+    local lowered=$(jq -c '.circuit_breakers.adaptive.limits' "$state")
+    # The breaker enforces the stored budget, not the mode's 50
+    jq '.circuit_breakers.errors.iteration_current = 0 | .circuit_breakers.adaptive.limits.tool_calls = 20' "$state" > "$state.tmp" && mv "$state.tmp" "$state"
+    echo '{"tool_name":"Read","tool_input":{"file_path":"/tmp/x"}}' | APEX_STATE="$state" bash "$APEX_DIR/hooks/apex-circuit-breaker.sh" 2>/dev/null || true
+    local reason=$(jq -r '.circuit_breakers.trip_reason // "none"' "$state")
+
+    if [[ "$raised" == '{"tool_calls":63,"errors":5}' && "$lowered" == '{"tool_calls":50,"errors":4}' && "$reason" == "tool_calls_iteration" ]]; then
+        log_pass "Adaptive limits follow progress and the breaker reads them"
+    else
+        log_fail "Adaptive limits unexpected: raised=$raised lowered=$lowered trip=$reason"
+    fi
+}
+
+test_adaptive_limits
+
+test_context_budget() {
+    local state="$TEST_DIR/context/apex-state.json"
+    local budget="python3 $APEX_DIR/functions/context_budget.py --state $state"
+    mkdir -p "$TEST_DIR/context"
+    cp "$APEX_DIR/state/apex-state.json.template" "$state"
+    seq 1 1000 | sed 's/^/value_/' > "$TEST_DIR/context/big.py"
+    local size=$($budget estimate "$TEST_DIR/context/big.py" | jq '.total')
+    # Second read of the file lands between the warning and critical thresholds
+    jq --argjson total $(( (5000 + 2 * size) * 100 / 80 )) '.context_budget.total = $total' "$state" > "$state.tmp" && mv "$state.tmp" "$state"
+    local read_payload="{\"tool_name\":\"Read\",\"tool_input\":{\"file_path\":\"$TEST_DIR/context/big.py\"}}"
+    echo "$read_payload" | APEX_STATE="$state" bash "$APEX_DIR/hooks/apex-metrics.sh" 2>/dev/null
+    local first=$(jq -r '.context_budget.level' "$state")
+    local warning=$(echo "$read_payload" | APEX_STATE="$state" bash "$APEX_DIR/hooks/apex-metrics.sh" 2>&1 >/dev/null)
+    local counted=$(jq -c --argjson size "$size" '[.context_budget.breakdown.working_memory == 2 * $size, .context_budget.level]' "$state")
+    local suggested=$($budget status --suggest | jq -r '.evict[0].action')
+    jq '.current_session = {"id": "ctx-test"}' "$state" > "$state.tmp" && mv "$state.tmp" "$state"
+    APEX_STATE="$state" bash "$APEX_DIR/hooks/apex-session.sh" >/dev/null 2>&1 || true
+    local cleared=$(jq -c '[.context_budget.used, (.context_budget.files_loaded | length)]' "$state")
+
+    if [[ "$first" == "ok" && "$warning" == *"WARNING"* && "$counted" == '[true,"warning"]' \
+        && "$suggested" == "drop_copies" && "$cleared" == "[0,0]" ]]; then
+        log_pass "Context budget tracks loads, warns at the threshold and resets per session"
+    else
+        log_fail "Context budget unexpected: first=$first counted=$counted suggested=$suggested cleared=$cleared warning=$warning"
+    fi
+}
+
+test_context_budget
+
+test_installer() {
+    local src="$TEST_DIR/installer/src" dest="$TEST_DIR/installer/dest"
+    local installer="python3 $APEX_DIR/functions/installer.py --dest $dest"
+    mkdir -p "$src"
+    cp -r "$APEX_DIR"/*.md "$APEX_DIR"/commands "$APEX_DIR"/hooks "$APEX_DIR"/functions "$APEX_DIR"/state \
+        "$APEX_DIR"/skills "$APEX_DIR"/update-apex.sh "$src/"
+    rm -rf "$src/functions/__pycache__"
+    $installer install --source "$src" >/dev/null
+    local again=$($installer install --source "$src" | jq -c '[(.copied | length), (.unchanged > 0)]')
+    # An older state file: missing a section, with a user value to keep
+    jq 'del(.context_budget) | .mode = "fast"' "$dest/state/apex-state.json" > "$dest/state/s.tmp" \
+        && mv "$dest/state/s.tmp" "$dest/state/apex-state.json"
+    echo "<!-- local -->" >> "$src/commands/help.md"
+    rm "$src/skills/apex-profile.md"
+    local update=$($installer install | jq -c '[[.copied[].path], .removed, (.state[0].added // [])]')
+    local state=$(jq -c '[.mode, .context_budget.total]' "$dest/state/apex-state.json")
+    local compiled=$(ls "$dest/functions/__pycache__" 2>/dev/null | grep -c '^installer\.')
+
+    if [[ "$again" == '[0,true]' && "$update" == '[["commands/help.md"],["skills/apex-profile.md"],["context_budget"]]' \
+        && "$state" == '["fast",200000]' && "$compiled" == "1" && -x "$dest/hooks/apex-metrics.sh" ]]; then
+        log_pass "Installer copies only changes, removes dropped files and migrates state"
+    else
+        log_fail "Installer unexpected: again=$again update=$update state=$state compiled=$compiled"
+    fi
+}
+
+test_installer
+
+test_installer_keeps_local_edits() {
+    local src="$TEST_DIR/installer-edit/src" dest="$TEST_DIR/installer-edit/dest"
+    local installer="python3 $APEX_DIR/functions/installer.py --dest $dest"
+    mkdir -p "$src/commands"
+    echo "v1" > "$src/commands/help.md"
+    echo "v1" > "$src/commands/status.md"
+    $installer install --source "$src" >/dev/null
+    echo "mine" > "$dest/commands/help.md"
+    echo "mine" > "$dest/commands/status.md"
+    echo "v2" > "$src/commands/help.md"
+    local first=$($installer install | jq -c '[.copied, .conflicts]')
+    local kept="$(cat "$dest/commands/help.md") $(cat "$dest/commands/help.md.apex-new") $(cat "$dest/commands/status.md")"
+    local forced=$($installer install --force | jq -c '[[.copied[].reason], .conflicts]')
+    local after="$(cat "$dest/commands/help.md") $(cat "$dest/commands/status.md")"
+
+    if [[ "$first" == '[[],[{"path":"commands/help.md","new":"commands/help.md.apex-new"},{"path":"commands/status.md","new":null}]]' \
+        && "$kept" == "mine v2 mine" && "$forced" == '[["modified_locally","modified_locally"],[]]' && "$after" == "v2 v1" \
+        && ! -e "$dest/commands/help.md.apex-new" ]]; then
+        log_pass "Installer keeps locally edited files unless forced"
+    else
+        log_fail "Installer local edits unexpected: first=$first kept=$kept forced=$forced after=$after"
+    fi
+}
+
+test_installer_keeps_local_edits
+
+test_profile_engine() {
+    local profile="$TEST_DIR/profile/apex-profile.json"
+    local engine="python3 $APEX_DIR/functions/profile_engine.py --profile $profile"
+    mkdir -p "$(dirname "$profile")"
+    cp "$APEX_DIR/state/apex-profile.json.template" "$profile"
+    $engine add --correction "Just show the code, skip the explanation" --learned "explanation_depth: minimal" >/dev/null
+    $engine add --correction "Write the failing test first" --learned "test_style: tdd" >/dev/null
+    local second=$($engine add --correction "Too much explanation, just show me the code" --learned "explanation_depth: minimal" \
+        | jq -c '[.cluster, .cluster_size, .promoted]')
+    for i in $(seq 1 55); do
+        $engine add --correction "filler$i entry$i" >/dev/null
+    done
+    local profile_state=$(jq -c '[.user_profile.communication.explanation_depth, (.user_profile.preferences_learned | length), (.user_profile.corrections | length)]' "$profile")
+
+    if [[ "$second" == '["1",2,true]' && "$profile_state" == '["minimal",1,50]' ]]; then
+        log_pass "Profile engine clusters similar corrections and caps the log"
+    else
+        log_fail "Profile engine unexpected: second=$second profile=$profile_state"
+    fi
+}
+
+test_profile_engine
+
+test_profile_engine_learned_match() {
+    local profile="$TEST_DIR/profile-learned/apex-profile.json"
+    local engine="python3 $APEX_DIR/functions/profile_engine.py --profile $profile"
+    mkdir -p "$(dirname "$profile")"
+    cp "$APEX_DIR/state/apex-profile.json.template" "$profile"
+    $engine add --correction "too verbose, shorten your answers" --learned "verbosity: concise" >/dev/null
+    $engine add --correction "less text please, summaries only" --learned "verbosity: concise" >/dev/null
+    # Worded too differently for MinHash alone; the shared preference must still join it
+    local third=$($engine add --correction "stop writing so much, be brief" --learned "Verbosity:  concise" \
+        | jq -c '[.cluster, .cluster_size, .drift]')
+    if [[ "$third" == '["1",3,true]' ]]; then
+        log_pass "Profile engine clusters corrections with the same learned preference"
+    else
+        log_fail "Profile engine learned-preference match unexpected: $third"
+    fi
+}
+
+test_profile_engine_learned_match
+
+test_profile_engine_empty_features() {
+    local profile="$TEST_DIR/profile-empty/apex-profile.json"
+    local engine="python3 $APEX_DIR/functions/profile_engine.py --profile $profile"
+    mkdir -p "$(dirname "$profile")"
+    cp "$APEX_DIR/state/apex-profile.json.template" "$profile"
+    # Nothing but stopwords: no features, so no basis for calling these similar
+    $engine add --correction "too much" >/dev/null
+    local second=$($engine add --correction "you do that" | jq -c '[.cluster_size, (.promoted // false)]')
+    local learned=$(jq '.user_profile.preferences_learned | length' "$profile")
+    if [[ "$second" == '[1,false]' && "$learned" == "0" ]]; then
+        log_pass "Profile engine does not cluster feature-less corrections"
+    else
+        log_fail "Profile engine clustered feature-less corrections: $second learned=$learned"
+    fi
+}
+
+test_profile_engine_empty_features
+
+test_code_index() {
+    local repo="$TEST_DIR/index-repo"
+    mkdir -p "$repo" && git -C "$repo" init -q
+    printf 'def refresh_token(session):\n    return session.renew()\n\n\ndef load_config(path):\n    return open(path).read()\n' > "$repo/auth.py"
+
+    local first=$(APEX_STATE_DIR="$TEST_DIR" python3 "$APEX_DIR/functions/code_index.py" --repo "$repo" \
+        query "refresh token" 2>/dev/null | jq -r '.results[0].name')
+    printf '\ndef rotate_signing_keys():\n    pass\n' >> "$repo/auth.py"
+    local updated=$(APEX_STATE_DIR="$TEST_DIR" python3 "$APEX_DIR/functions/code_index.py" --repo "$repo" \
+        query "rotate signing keys" 2>/dev/null | jq -r '.results[0].name')
+
+    if [[ "$first" == "refresh_token" && "$updated" == "rotate_signing_keys" ]]; then
+        log_pass "Code index finds chunks and picks up working tree edits"
+    else
+        log_fail "Code index results unexpected: first=$first updated=$updated"
+    fi
+}
+
+test_code_index
+
+test_graph_shards() {
+    local apex="$TEST_DIR/graph-apex"
+    mkdir -p "$TEST_DIR/proj-a" "$TEST_DIR/proj-b"
+    git -C "$TEST_DIR/proj-a" init -q && git -C "$TEST_DIR/proj-b" init -q
+
+    (cd "$TEST_DIR/proj-a" && APEX_DIR="$apex" python3 "$APEX_DIR/functions/graph_manager.py" memory \
+        --type pitfall --summary "Shared cache pitfall" --concepts cache >/dev/null 2>&1)
+    (cd "$TEST_DIR/proj-a" && APEX_DIR="$apex" python3 "$APEX_DIR/functions/graph_manager.py" memory \
+        --type decision --summary "Local cache decision" --concepts cache >/dev/null 2>&1)
+    local seen=$(cd "$TEST_DIR/proj-b" && APEX_DIR="$apex" python3 "$APEX_DIR/functions/graph_manager.py" init >/dev/null 2>&1 \
+        && APEX_DIR="$apex" python3 "$APEX_DIR/functions/graph_manager.py" query cache 2>/dev/null | jq -c '[.memories[].summary]')
+    local shards=$(ls "$apex/state/graphs" | grep -vc '^global')
+
+    if [[ "$seen" == '["Shared cache pitfall"]' && "$shards" -ge 2 ]]; then
+        log_pass "Graph shards per project and shares pitfalls globally"
+    else
+        log_fail "Graph sharding unexpected: seen=$seen shards=$shards"
+    fi
+}
+
+test_graph_shards
+
+test_apex_cli() {
+    local local_decision=$(APEX_NO_SERVER=1 python3 "$APEX_DIR/functions/apex.py" exit-gate --indicators '["a","b"]' --exit-signal true 2>/dev/null | jq -r '.decision')
+
+    export APEX_SERVER_SOCKET="$TEST_DIR/apex.sock"
+    python3 "$APEX_DIR/functions/apex.py" serve --daemon --idle 20 >/dev/null 2>&1
+    for _ in 1 2 3 4 5 6 7 8 9 10; do
+        [[ -S "$APEX_SERVER_SOCKET" ]] && break
+        sleep 0.2
+    done
+    local server_decision=$(python3 "$APEX_DIR/functions/apex.py" exit-gate --indicators '["a","b"]' --exit-signal true 2>/dev/null | jq -r '.decision')
+    python3 "$APEX_DIR/functions/apex.py" stop >/dev/null 2>&1 || true
+    unset APEX_SERVER_SOCKET
+
+    if [[ "$local_decision" == "exit" && "$server_decision" == "exit" ]]; then
+        log_pass "Multiplexed CLI runs subcommands locally and via fork-server"
+    else
+        log_fail "Multiplexed CLI failed: local=$local_decision server=$server_decision"
+    fi
+}
+
+test_apex_cli
+
+test_apex_cli_send_failure() {
+    # The server is listening, but handing over the stdio fds fails (closed fd,
+    # peer gone): the client must fall back to running the command itself
+    local fallback=$(cd "$APEX_DIR/functions" && APEX_SERVER_SOCKET="$TEST_DIR/apex-broken.sock" python3 - <<'PY'
+import _socket, os, socket
+import apex
+path = os.environ["APEX_SERVER_SOCKET"]
+if os.path.exists(path):
+    os.unlink(path)
+listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+listener.bind(path)
+listener.listen(1)
+
+class BrokenSocket(_socket.socket):
+    def sendmsg(self, *args):
+        raise BrokenPipeError(32, "Broken pipe")
+
+_socket.socket = BrokenSocket
+print(apex.run_remote("exit-gate", ["--indicators", "[]"]))
+PY
+)
+    if [[ "$fallback" == "None" ]]; then
+        log_pass "Multiplexed CLI falls back when the fd handoff fails"
+    else
+        log_fail "Multiplexed CLI send failure returned: $fallback"
+    fi
+}
+
+test_apex_cli_send_failure
+
 echo ""
 echo "================================"
 echo "Test Results"
@@ -2,6 +2,7 @@
 # APEX Updater v4.0 - Pull latest from upstream sources and regenerate
 # Usage: ./update-apex.sh [component]
 # Components: prism, planning, aidd, ralph, grepai, graph-code, navigator, pilot, all
+#             self [checkout]  - re-install APEX from a checkout (changed files only)
 
 set -e
 
@@ -130,6 +131,29 @@ update_navigator() {
     fi
 }
 
+update_self() {
+    local source="${1:-$APEX_SOURCE}"
+    local installer="$APEX_DIR/functions/installer.py"
+    if [[ -n "$source" && -f "$source/functions/installer.py" ]]; then
+        installer="$source/functions/installer.py"
+    fi
+    echo -e "${YELLOW}Re-installing APEX${source:+ from $source}...${NC}"
+    # Without a checkout argument the installer reuses the one recorded at install time
+    local result
+    if result=$(python3 "$installer" --dest "$APEX_DIR" install ${source:+--source "$source"} \
+        --link "${APEX_INSTALL_LINK:-auto}"); then
+        echo "$result" | jq -r '"\(.copied | length) updated, \(.unchanged) unchanged, \(.removed | length) removed",
+            (.copied[] | "  \(.reason): \(.path)"),
+            (.conflicts[]? | "  kept local edit: \(.path)\(if .new then " (new version in \(.new))" else "" end)"),
+            (.state[] | select(.action == "migrated") | "Migrated \(.path): added \(.added | join(", "))")'
+        echo -e "${GREEN}✓ APEX installed files are current${NC}"
+    else
+        echo "$result"
+        echo -e "${RED}✗ Re-install failed${NC}"
+        return 1
+    fi
+}
+
 update_pilot() {
     if clone_repo "pilot" "https://github.com/alekspetrov/pilot.git"; then
         echo ""
@@ -164,6 +188,11 @@ case "$COMPONENT" in
     pilot)
         update_pilot
         ;;
+    self)
+        update_self "$2"
+        rm -rf "$TEMP_DIR"
+        exit 0
+        ;;
     all)
         update_prism
         echo ""
@@ -183,7 +212,7 @@ case "$COMPONENT" in
         ;;
     *)
         echo "Unknown component: $COMPONENT"
-        echo "Usage: $0 [prism|planning|aidd|ralph|grepai|graph-code|navigator|pilot|all]"
+        echo "Usage: $0 [prism|planning|aidd|ralph|grepai|graph-code|navigator|pilot|all|self [checkout]]"
         exit 1
         ;;
 esac